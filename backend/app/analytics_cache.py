@@ -0,0 +1,184 @@
+"""
+Кеш ответов аналитики (по пользователям).
+
+Ключ записи — пользователь, версия его данных, текущая дата, запрос и его
+параметры. Дата в ключе — как в ETag: ответы вроде топа товаров за последние
+N дней зависят от сегодняшнего дня, а не только от данных.
+Версия — models.UserDataVersion.version из базы (та же, что в ETag, см.
+check_not_modified): она увеличивается в одной транзакции с любым изменением
+агрегатов пользователя (app/rollups.py), поэтому ее видят все процессы (API,
+бот, воркеры загрузки) сразу после коммита. Записи старых версий больше не
+читаются и вытесняются по LRU/TTL, отдельного сброса кеша не нужно.
+
+Бэкенды (ANALYTICS_CACHE_BACKEND):
+    memory — LRU в памяти процесса (по умолчанию).
+    redis  — общий кеш в Redis (REDIS_URL) для всех процессов.
+    off    — без кеша.
+
+Example:
+    >>> return await analytics_cache.cached(
+    ...     user.id, data_version, "total-sums", schemas.TotalSums,
+    ...     lambda: db.run(services.get_user_total_sum, user.id),
+    ... )
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import date
+from functools import lru_cache
+from typing import Any, Awaitable, Callable
+
+from pydantic import TypeAdapter
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_BACKEND = os.getenv("ANALYTICS_CACHE_BACKEND", "memory")
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "10000"))
+ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class InMemoryAnalyticsBackend:
+    """Ответы в LRU-кеше процесса"""
+
+    blocking = False
+
+    def __init__(self, maxsize: int = ANALYTICS_CACHE_SIZE):
+        self._entries = TTLCache("analytics_responses", maxsize, ANALYTICS_CACHE_TTL)
+
+    def get(self, key: str, adapter: TypeAdapter) -> Any:
+        # Храним готовые объекты: ответы только читаются
+        return self._entries.get(key)
+
+    def set(self, key: str, value: Any, adapter: TypeAdapter):
+        self._entries.set(key, value)
+
+
+class RedisAnalyticsBackend:
+    """
+    Ответы (JSON с TTL) в Redis.
+
+    Клиент синхронный (redis.Redis), вызовы идут через asyncio.to_thread
+    (см. cached).
+
+    Args:
+        client: Клиент с интерфейсом redis.Redis (get/set). В тестах —
+            заглушка tests/fakes.py.
+        prefix (str): Префикс ключей.
+    """
+
+    blocking = True
+
+    def __init__(self, client, prefix: str = "analytics"):
+        self._redis = client
+        self._prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisAnalyticsBackend":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "ANALYTICS_CACHE_BACKEND=redis требует пакет redis (pip install redis)"
+            ) from e
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str, adapter: TypeAdapter) -> Any:
+        raw = self._redis.get(f"{self._prefix}:{key}")
+        return None if raw is None else adapter.validate_json(raw)
+
+    def set(self, key: str, value: Any, adapter: TypeAdapter):
+        self._redis.set(
+            f"{self._prefix}:{key}", adapter.dump_json(value), ex=ANALYTICS_CACHE_TTL
+        )
+
+
+def make_backend():
+    if ANALYTICS_CACHE_BACKEND == "memory":
+        return InMemoryAnalyticsBackend()
+    if ANALYTICS_CACHE_BACKEND == "redis":
+        return RedisAnalyticsBackend.from_url(REDIS_URL)
+    if ANALYTICS_CACHE_BACKEND == "off":
+        return None
+    raise RuntimeError(f"Unknown ANALYTICS_CACHE_BACKEND: {ANALYTICS_CACHE_BACKEND}")
+
+
+backend = make_backend()
+
+# Счетчики на уровне процесса (для любого бэкенда)
+_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+def stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        "backend": ANALYTICS_CACHE_BACKEND,
+        **_stats,
+        "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else None,
+    }
+
+
+@lru_cache
+def _adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+async def _call(fn: Callable, *args):
+    if backend.blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def cached(
+    user_id: int,
+    version: int,
+    query: str,
+    schema: Any,
+    compute: Callable[[], Awaitable[Any]],
+    **params,
+) -> Any:
+    """
+    Возвращает ответ query для пользователя из кеша или вычисляет его.
+
+    Args:
+        user_id (int): Чьи данные считаются.
+        version (int): Версия данных пользователя (UserDataVersion.version),
+            прочитанная до вычисления: если данные изменятся во время
+            расчета, ответ ляжет под старой версией и не будет прочитан.
+        query (str): Имя запроса (часть ключа).
+        schema: Тип ответа (например, List[schemas.StoreStat]). Результат
+            compute() приводится к нему, поэтому из кеша и без него
+            возвращаются одинаковые объекты.
+        compute: Асинхронная функция без аргументов, считающая ответ.
+        **params: Параметры запроса (часть ключа).
+    """
+    adapter = _adapter(schema)
+    if backend is None:
+        return adapter.validate_python(await compute(), from_attributes=True)
+
+    params_key = json.dumps(params, sort_keys=True, default=str)
+    key = f"{user_id}:{version}:{date.today():%Y%m%d}:{query}:{params_key}"
+    try:
+        value = await _call(backend.get, key, adapter)
+    except Exception:
+        # Недоступный кеш не должен ломать аналитику
+        logger.warning("analytics cache read failed", exc_info=True)
+        _stats["errors"] += 1
+        value = None
+
+    if value is not None:
+        _stats["hits"] += 1
+        return value
+
+    _stats["misses"] += 1
+    value = adapter.validate_python(await compute(), from_attributes=True)
+    try:
+        await _call(backend.set, key, value, adapter)
+    except Exception:
+        logger.warning("analytics cache write failed", exc_info=True)
+        _stats["errors"] += 1
+    return value
@@ -1,10 +1,11 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import bcrypt  # Прямой импорт вместо passlib
 from dotenv import load_dotenv
-from jose import JWTError, jwt
 
 load_dotenv()
 
@@ -12,6 +13,16 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 3000
 
+# Стоимость bcrypt (log2 числа раундов). При изменении старые хэши
+# пересчитываются при следующем успешном входе (см. needs_rehash)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Сколько хэшей считается одновременно. bcrypt отпускает GIL, но упирается
+# в CPU, поэтому больше потоков, чем ядер, смысла не имеет
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))
+)
+
 # Мы убираем pwd_context = CryptContext(...), так как он вызывает ошибку в 2026 году
 
 
@@ -28,11 +39,40 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     """Хеширование пароля через прямой вызов bcrypt"""
     # Генерируем соль и хешируем (в 2026 это работает быстрее и без ошибок длины)
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
     return hashed.decode("utf-8")
 
 
+def needs_rehash(hashed_password: str) -> bool:
+    """Хэш посчитан с другой стоимостью, чем BCRYPT_ROUNDS"""
+    # Формат: $2b$<rounds>$<соль и хэш>
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+# --- НЕБЛОКИРУЮЩЕЕ ХЕШИРОВАНИЕ ---
+# Отдельный ограниченный пул: всплеск логинов занимает только его потоки,
+# а пул FastAPI и цикл событий продолжают обслуживать остальные запросы
+_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _hash_executor, verify_password, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     now = datetime.now(timezone.utc)
@@ -43,11 +83,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
+    from jose import jwt  # Ленивый импорт: jose тянет cryptography (~50 мс)
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 def decode_token(token: str) -> Optional[int]:
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id_str: str = payload.get("sub")
@@ -0,0 +1,63 @@
+"""
+Неблокирующий доступ к БД для бота.
+
+crud и services синхронные, поэтому хэндлеры не вызывают их напрямую в цикле
+событий aiogram, а отправляют в отдельный пул потоков со своим пулом соединений.
+Медленный запрос одного пользователя занимает один поток пула,
+а остальные апдейты продолжают обрабатываться.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from app.database import DATABASE_URL
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+T = TypeVar("T")
+
+# Сколько запросов бота может одновременно ждать БД
+BOT_DB_WORKERS = int(os.getenv("BOT_DB_WORKERS", "8"))
+
+
+class BotDatabase:
+    """
+    Пул потоков и соединений для запросов из хэндлеров.
+
+    Example:
+        >>> stats = await db.run(services.get_user_total_sum, user.id)
+    """
+
+    def __init__(self, url: str = DATABASE_URL, workers: int = BOT_DB_WORKERS):
+        self.workers = workers
+        # По соединению на поток: поток пула не ждет свободного соединения
+        self.engine = create_engine(
+            url, pool_pre_ping=True, pool_size=workers, max_overflow=0
+        )
+        self.session_factory = sessionmaker(
+            autocommit=False, autoflush=False, bind=self.engine
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bot-db"
+        )
+
+    def _call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        with self.session_factory() as db:
+            return fn(db, *args, **kwargs)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполняет fn(db, *args, **kwargs) в пуле потоков с отдельной сессией"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(self._call, fn, *args, **kwargs)
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.engine.dispose()
+
+
+database = BotDatabase()
@@ -1,11 +1,12 @@
-import json
+import asyncio
 import logging
+from typing import List, Optional
 
 from aiogram import Bot, F, Router, types
 from aiogram.filters import Command
-from app import crud, services
-from app.models import User
-from sqlalchemy.orm import Session
+from app import analytics_cache, crud, ingestion, jobs, schemas, services
+from app.bot.db import BotDatabase
+from sqlalchemy import Row
 
 # Настраиваем роутер
 router = Router()
@@ -18,9 +19,7 @@ async def get_my_id(message: types.Message):
 
 
 @router.message(F.document.file_name.endswith(".json"))
-async def handle_receipt_json(
-    message: types.Message, bot: Bot, db: Session, user: User
-):
+async def handle_receipt_json(message: types.Message, bot: Bot, user: Optional[Row]):
     """
     Аналог эндпоинта @router.post("/upload-json") для Telegram.
     Принимает JSON-файл чека, парсит и сохраняет в БД.
@@ -39,48 +38,66 @@ async def handle_receipt_json(
     await message.bot.send_chat_action(message.chat.id, "upload_document")
 
     try:
-        # 3. Скачиваем файл в память (в буфер)
+        # 3. Скачиваем файл потоком во временный файл, не собирая его в памяти
         file_info = await bot.get_file(document.file_id)
-        file_content = await bot.download_file(file_info.file_path)
+        chunks = bot.session.stream_content(
+            url=bot.session.api.file_url(bot.token, file_info.file_path),
+            chunk_size=ingestion.CHUNK_SIZE,
+        )
+        path = await ingestion.spool_upload(chunks)
 
-        # 4. Декодируем и парсим JSON
-        # Мы используем .read(), так как download_file возвращает BytesIO
-        data = json.load(file_content)
+        # 4. Ставим файл в очередь; результат пришлем, когда воркер его разберет
+        job = await jobs.queue.submit(user.id, path, filename=document.file_name)
+        await message.reply("⏳ Файл принят, обрабатываю...")
 
-        # 5. Логика обработки списка или одиночного объекта (как в твоем коде)
-        if isinstance(data, list):
-            # Берем первый чек из списка
-            receipt_json = data[0] if len(data) > 0 else None
-        else:
-            receipt_json = data
+        task = asyncio.create_task(_report_job(message, job.id))
+        _report_tasks.add(task)
+        task.add_done_callback(_report_tasks.discard)
 
-        if not receipt_json:
-            return await message.reply("⚠️ Файл пуст или содержит некорректные данные.")
+    except Exception as e:
+        logger.error(f"Error processing TG receipt: {e}", exc_info=True)
+        await message.reply(f"❌ Произошла ошибка при обработке чека: {str(e)}")
 
-        # 6. Вызываем твой CRUD метод
-        # Передаем db и user.id, которые прокинула мидлварь
-        receipt = crud.create_receipt_full(db, receipt_json, user_id=user.id)
 
-        # 7. Извлекаем данные для красивого ответа (как в твоем API)
-        ticket_data = (
-            receipt_json.get("ticket", {}).get("document", {}).get("receipt", {})
-        )
-        items_count = len(ticket_data.get("items", []))
+# Ссылки на фоновые задачи отчетов, чтобы их не собрал сборщик мусора
+_report_tasks: set[asyncio.Task] = set()
+
+
+async def _report_job(message: types.Message, job_id: str):
+    """Дожидается фоновой загрузки и отвечает пользователю итогом"""
+    job = await jobs.queue.wait(job_id)
+
+    if job is None or job.status == "failed":
+        error = job.error if job else "задача потеряна"
+        if error == "Invalid JSON format":
+            return await message.reply("❌ Ошибка: Файл не является валидным JSON.")
+        return await message.reply(f"❌ Произошла ошибка при обработке чека: {error}")
 
-        await message.reply(
+    if not job.results:
+        return await message.reply("⚠️ Файл пуст или содержит некорректные данные.")
+
+    # Одиночный чек — отвечаем подробно (как в твоем API)
+    if len(job.results) == 1:
+        result = job.results[0]
+        if result.status == "failed":
+            return await message.reply("⚠️ Файл пуст или содержит некорректные данные.")
+        return await message.reply(
             f"✅ **Чек успешно загружен!**\n\n"
-            f"🔹 ID чека: `{receipt.id}`\n"
-            f"🔹 Внешний ID: `{receipt.external_id}`\n"
-            f"🔹 Позиций обработано: {len(receipt.items)}\n"
-            f"🔹 Позиций в файле: {items_count}\n\n"
+            f"🔹 ID чека: `{result.receipt_id}`\n"
+            f"🔹 Внешний ID: `{result.external_id}`\n"
+            f"🔹 Позиций обработано: {result.items_count}\n\n"
             f"📊 Чек доступен в вашем личном кабинете."
         )
 
-    except json.JSONDecodeError:
-        await message.reply("❌ Ошибка: Файл не является валидным JSON.")
-    except Exception as e:
-        logger.error(f"Error processing TG receipt: {e}", exc_info=True)
-        await message.reply(f"❌ Произошла ошибка при обработке чека: {str(e)}")
+    # Список чеков — отвечаем сводкой по всему файлу
+    await message.reply(
+        f"✅ **Файл обработан!**\n\n"
+        f"🔹 Чеков в файле: {job.processed}\n"
+        f"🔹 Загружено: {job.created}\n"
+        f"🔹 Уже были загружены: {job.duplicates}\n"
+        f"🔹 С ошибками: {job.failed}\n\n"
+        f"📊 Чеки доступны в вашем личном кабинете."
+    )
 
 
 @router.message(F.document)
@@ -90,13 +107,19 @@ async def handle_wrong_file_type(message: types.Message):
 
 
 @router.message(Command("shops"))
-async def cmd_shops(message: types.Message, db: Session, user: User):
+async def cmd_shops(message: types.Message, db: BotDatabase, user: Optional[Row]):
     if not user:
         return await message.answer("❌ Сначала привяжите аккаунт.")
 
     # Вызываем твой сервис
-    shops_stats = services.get_spending_by_retail_shops(
-        db, user.id, page=0, page_size=8
+    shops_stats = await analytics_cache.cached(
+        user.id,
+        await db.run(crud.get_data_version_number, user.id),
+        "bot-shops",
+        List[schemas.StoreStat],
+        lambda: db.run(
+            services.get_spending_by_retail_shops, user.id, page=0, page_size=8
+        ),
     )
 
     if not shops_stats:
@@ -112,11 +135,17 @@ async def cmd_shops(message: types.Message, db: Session, user: User):
 
 # --- Команда /stats: Общая статистика ---
 @router.message(Command("stats"))
-async def cmd_stats(message: types.Message, db: Session, user: User):
+async def cmd_stats(message: types.Message, db: BotDatabase, user: Optional[Row]):
     if not user:
         return await message.answer("❌ Сначала привяжите аккаунт.")
 
-    stats = services.get_user_total_sum(db, user.id)
+    stats = await analytics_cache.cached(
+        user.id,
+        await db.run(crud.get_data_version_number, user.id),
+        "total-sums",
+        schemas.TotalSums,
+        lambda: db.run(services.get_user_total_sum, user.id),
+    )
 
     if stats.receipts_count == 0:
         return await message.answer("📊 У вас пока нет чеков для статистики.")
@@ -133,12 +162,18 @@ async def cmd_stats(message: types.Message, db: Session, user: User):
 
 # --- Команда /top: Топ-5 трат ---
 @router.message(Command("top"))
-async def cmd_top(message: types.Message, db: Session, user: User):
+async def cmd_top(message: types.Message, db: BotDatabase, user: Optional[Row]):
     if not user:
         return await message.answer("❌ Сначала привяжите аккаунт.")
 
     # Используем твой метод (берем топ-5 для компактности в ТГ)
-    top_items = services.get_top_products(db, user.id, limit=5)
+    top_items = await analytics_cache.cached(
+        user.id,
+        await db.run(crud.get_data_version_number, user.id),
+        "bot-top",
+        List[schemas.ProductTop],
+        lambda: db.run(services.get_top_products, user.id, limit=5),
+    )
 
     if not top_items:
         return await message.answer("🛒 Список товаров пока пуст.")
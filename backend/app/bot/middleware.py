@@ -1,21 +1,84 @@
 import logging
+import time
 from typing import Any, Awaitable, Callable, Dict
 
 from aiogram import BaseMiddleware
-from aiogram.types import Message, TelegramObject
-from app.database import SessionLocal  # Твой импорт сессии
-from app.models import User  # Твоя модель пользователя
-from sqlalchemy.orm import Session
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Message, TelegramObject, Update
+from app import cache, crud, metrics
+from app.bot.db import BotDatabase, database
 
 # Настраиваем логирование, если еще не настроено
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Отличает "нет в кеше" от закешированного None (аккаунт не привязан)
+_NOT_CACHED = object()
+
+
 class DbSessionMiddleware(BaseMiddleware):
     """
-    Мидлварь для обеспечения хэндлеров сессией БД
+    Мидлварь для обеспечения хэндлеров доступом к БД
     и автоматического поиска пользователя.
+
+    Хэндлер получает в data["db"] объект BotDatabase: запросы выполняются
+    в отдельном пуле потоков и не блокируют цикл событий, а сессия открывается
+    только на время вызова db.run().
+
+    Регистрируется как внутренняя мидлварь (dp.message.middleware): хэндлер к
+    этому моменту уже выбран, и пользователь ищется, только если хэндлер
+    принимает параметр user (/id, например, в БД не ходит). Результат поиска
+    кешируется по telegram_id (cache.telegram_users). В data["user"] попадает
+    Row(id, is_active) или None; деактивированному пользователю хэндлер
+    не вызывается.
+    """
+
+    def __init__(self, db: BotDatabase = database):
+        self.db = db
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        data["db"] = self.db
+        data["user"] = None
+
+        # При регистрации как outer_middleware хэндлер еще неизвестен
+        handler_object = data.get("handler")
+        wants_user = handler_object is None or "user" in handler_object.params
+
+        # Проверяем, что событие — это сообщение
+        if wants_user and isinstance(event, Message) and event.from_user:
+            # Ищем юзера по telegram_id (преобразуем в str, как в модели)
+            user = await self.get_user(str(event.from_user.id))
+            # Как get_current_user в API: деактивированный аккаунт не обслуживаем
+            if user is not None and not user.is_active:
+                return await event.answer("⛔ Аккаунт деактивирован.")
+            data["user"] = user
+
+        # Выполняем хэндлер
+        return await handler(event, data)
+
+    async def get_user(self, telegram_id: str):
+        """Row(id, is_active) пользователя или None, сначала из кеша"""
+        user = cache.telegram_users.get(telegram_id, _NOT_CACHED)
+        if user is _NOT_CACHED:
+            user = await self.db.run(crud.get_telegram_user, telegram_id)
+            ttl = None if user is not None else cache.TELEGRAM_CACHE_MISS_TTL
+            cache.telegram_users.set(telegram_id, user, ttl=ttl)
+        return user
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Время обработки апдейта (metrics.BOT_UPDATE_DURATION) по типу события
+    и результату: ok, unhandled (ни один хэндлер не подошел) или error.
+
+    Регистрируется как внешняя мидлварь апдейтов (dp.update.outer_middleware),
+    чтобы учитывать фильтры, остальные мидлвари и сам хэндлер.
     """
 
     async def __call__(
@@ -24,25 +87,14 @@ class DbSessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        # 1. Открываем сессию базы данных
-        with SessionLocal() as db:
-            db: Session  # Вот здесь мы явно использовали импорт
-            # 2. Проверяем, что событие — это сообщение
-            if isinstance(event, Message) and event.from_user:
-                # Ищем юзера по telegram_id (преобразуем в str, как в модели)
-                user = (
-                    db.query(User)
-                    .filter(User.telegram_id == str(event.from_user.id))
-                    .first()
-                )
-
-                # Прокидываем данные в хэндлер через словарь data
-                data["db"] = db
-                data["user"] = user
-            else:
-                data["db"] = db
-                data["user"] = None
-
-            # 3. Выполняем хэндлер
-            return await handler(event, data)
-            # Сессия закроется автоматически при выходе из with
+        event_type = event.event_type if isinstance(event, Update) else "unknown"
+        status = "error"
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            status = "unhandled" if result is UNHANDLED else "ok"
+            return result
+        finally:
+            metrics.BOT_UPDATE_DURATION.labels(event_type, status).observe(
+                time.perf_counter() - started
+            )
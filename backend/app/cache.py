@@ -0,0 +1,200 @@
+"""
+Внутрипроцессные кеши (на один worker).
+
+TTLCache — ограниченный по размеру LRU-кеш со сроком жизни записей и счетчиками
+попаданий/промахов. Все созданные кеши регистрируются по имени, их статистика
+доступна через cache_stats().
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Dict, Hashable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from . import models
+
+_registry: Dict[str, "TTLCache"] = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кеш с TTL.
+
+    Args:
+        name (str): Имя кеша для статистики.
+        maxsize (int): Максимальное количество записей; при переполнении
+            вытесняется давно не использованная запись.
+        ttl (float): Время жизни записи в секундах.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        with self._lock:
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]):
+        """Удаляет все записи, для которых predicate(key, value) истинно"""
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(k, v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def cache_stats() -> dict:
+    """Статистика всех кешей процесса"""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+# --- ОТЛОЖЕННАЯ ЗАПИСЬ ДО КОММИТА ---
+# ID, полученные внутри транзакции, попадают в кеш только после ее коммита:
+# иначе после отката в кеше остался бы ID несуществующей строки.
+_PENDING_KEY = "pending_cache_writes"
+
+
+def on_commit(db: Session, fn: Callable[[], Any]):
+    """Выполняет fn() после коммита текущей транзакции (при откате — отбрасывает)"""
+    db.info.setdefault(_PENDING_KEY, []).append(fn)
+
+
+def set_on_commit(db: Session, cache: TTLCache, key: Hashable, value: Any):
+    on_commit(db, partial(cache.set, key, value))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_writes(session: Session):
+    for fn in session.info.pop(_PENDING_KEY, ()):
+        fn()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_pending_writes(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+# --- КЕШИ ИДЕНТИФИКАТОРОВ МАГАЗИНОВ, КАССИРОВ И ТОВАРОВ ---
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "3600"))
+# Магазин можно удалить через API, а forget_shop сбрасывает кеш только в том
+# процессе, который обработал запрос: воркеры uvicorn и бот (run_bot.py со своей
+# очередью загрузки) держат старый ID до истечения TTL. Поэтому у магазинов TTL
+# короче; вставка чека со ссылкой на удаленный магазин в crud.create_receipts_bulk
+# при ошибке внешнего ключа сбрасывает ID пакета и повторяется (SQLite без
+# PRAGMA foreign_keys внешние ключи не проверяет — там остается только TTL).
+SHOP_ID_CACHE_TTL = float(os.getenv("SHOP_ID_CACHE_TTL", "300"))
+
+# ИНН -> shop_id
+shop_ids = TTLCache("shop_ids", IDENTITY_CACHE_SIZE, SHOP_ID_CACHE_TTL)
+# ("inn", ИНН) или ("name", ФИО) -> cashier_id
+cashier_ids = TTLCache("cashier_ids", IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+# Ключ товара (crud.product_key) -> product_id
+product_ids = TTLCache("product_ids", IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+
+
+def forget_shop(shop_id: int):
+    """
+    Сбрасывает закешированный ID магазина (после изменения или удаления).
+    Только в текущем процессе — см. SHOP_ID_CACHE_TTL.
+    """
+    shop_ids.pop_where(lambda _inn, cached_id: cached_id == shop_id)
+
+
+# --- КЕШ ПОЛЬЗОВАТЕЛЕЙ ДЛЯ АУТЕНТИФИКАЦИИ ---
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+# user_id -> schemas.User: снимок пользователя для get_current_user.
+# Короткий TTL ограничивает устаревание, если запись изменили в обход ORM.
+auth_users = TTLCache("auth_users", AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+# --- КЕШ ПОЛЬЗОВАТЕЛЕЙ TELEGRAM ---
+TELEGRAM_CACHE_TTL = float(os.getenv("TELEGRAM_CACHE_TTL", "60"))
+# Для непривязанных telegram_id: после привязки аккаунта через API (другой
+# процесс) бот должен узнать пользователя быстро
+TELEGRAM_CACHE_MISS_TTL = float(os.getenv("TELEGRAM_CACHE_MISS_TTL", "5"))
+
+# telegram_id -> Row(id, is_active) или None, если аккаунт не привязан
+telegram_users = TTLCache("telegram_users", AUTH_CACHE_SIZE, TELEGRAM_CACHE_TTL)
+
+# Поля, при изменении которых снимок в кеше становится неверным
+_AUTH_FIELDS = ("is_active", "telegram_id", "email", "full_name")
+
+
+def forget_user(user_id: int, telegram_ids: tuple = ()):
+    auth_users.pop(user_id)
+    for telegram_id in telegram_ids:
+        telegram_users.pop(telegram_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_changed_users(session: Session, flush_context):
+    # Ловим любые изменения пользователя через ORM (создание, деактивация,
+    # crud.set_user_telegram_id и т.д.); сбрасываем кеши после коммита
+    for obj in session.new | session.dirty | session.deleted:
+        if not isinstance(obj, models.User):
+            continue
+        state = inspect(obj)
+        if obj in session.dirty and not any(
+            state.attrs[field].history.has_changes() for field in _AUTH_FIELDS
+        ):
+            continue
+        # Старый и новый telegram_id: оба могли быть закешированы
+        history = state.attrs.telegram_id.history
+        telegram_ids = tuple(
+            {v for v in (*history.sum(), obj.telegram_id) if v is not None}
+        )
+        on_commit(session, partial(forget_user, obj.id, telegram_ids))
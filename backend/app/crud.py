@@ -1,16 +1,22 @@
 from datetime import datetime
+from functools import lru_cache
 
 from fastapi import HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
 
-from . import models, schemas
+from . import cache, metrics, models, rollups, schemas
 from .auth import get_password_hash
+from .database import dialect_insert
 
 
 # --- USER CRUD ---
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(
+    db: Session, user: schemas.UserCreate, password_hash: str | None = None
+):
+    # Хэш можно посчитать заранее вне сессии (bcrypt медленный)
+    hashed_password = password_hash or get_password_hash(user.password)
 
     # Извлекаем все данные кроме пароля в виде обычного словаря
     user_data = user.model_dump(exclude={"password"})
@@ -23,7 +29,7 @@ def create_user(db: Session, user: schemas.UserCreate):
 
 
 def set_user_telegram_id(
-    db: Session, user: models.User, telegram_id: str
+    db: Session, user: schemas.User, telegram_id: str
 ) -> models.User:
     # 1. Ищем юзера в базе
     query = select(models.User).where(models.User.id == user.id)
@@ -42,6 +48,35 @@ def set_user_telegram_id(
     return db_user
 
 
+def set_user_password_hash(db: Session, user_id: int, password_hash: str):
+    """Сохраняет пересчитанный хэш пароля (смена стоимости bcrypt)"""
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(password_hash=password_hash)
+    )
+    db.commit()
+
+
+def get_user(db: Session, user_id: int):
+    return db.get(models.User, user_id)
+
+
+def get_user_by_telegram_id(db: Session, telegram_id: str):
+    return db.execute(
+        select(models.User).where(models.User.telegram_id == telegram_id)
+    ).scalar_one_or_none()
+
+
+def get_telegram_user(db: Session, telegram_id: str):
+    """Легкий поиск для бота: Row(id, is_active) или None"""
+    return db.execute(
+        select(models.User.id, models.User.is_active).where(
+            models.User.telegram_id == telegram_id
+        )
+    ).first()
+
+
 def get_user_by_email(db: Session, email: str):
     # В SQLAlchemy 2.0 рекомендуется использовать select()
     return db.execute(
@@ -49,75 +84,287 @@ def get_user_by_email(db: Session, email: str):
     ).scalar_one_or_none()
 
 
-# --- SHOP CRUD (с логикой уникальности по ИНН) ---
-def get_or_create_shop(db: Session, shop_data: schemas.ShopCreate):
-    shop = db.execute(
-        select(models.Shop).where(models.Shop.inn == shop_data.inn)
-    ).scalar_one_or_none()
+def get_data_version(db: Session, user_id: int):
+    """Версия данных пользователя: Row(version, updated_at) или None"""
+    return db.execute(
+        select(models.UserDataVersion.version, models.UserDataVersion.updated_at).where(
+            models.UserDataVersion.user_id == user_id
+        )
+    ).first()
 
-    if not shop:
-        shop = models.Shop(**shop_data.model_dump())
-        db.add(shop)
-        db.flush()  # Получаем ID, но не фиксируем транзакцию окончательно
-    return shop
 
+def get_data_version_number(db: Session, user_id: int) -> int:
+    """Только номер версии данных пользователя (0, если данных еще не было)"""
+    version = db.scalar(
+        select(models.UserDataVersion.version).where(
+            models.UserDataVersion.user_id == user_id
+        )
+    )
+    return version or 0
+
+
+# --- МАГАЗИНЫ, ЗАВЕДЕННЫЕ ВРУЧНУЮ ---
+def create_manual_shop(db: Session, store_data: dict) -> models.Shop:
+    new_shop = models.Shop(
+        retail_name=store_data.get("name"),
+        legal_name=store_data.get("chain_name", "Unknown"),
+        address=store_data.get("address"),
+        category=store_data.get("category"),
+        is_favorite=store_data.get("is_favorite", False),
+        notes=store_data.get("notes"),
+        inn=models.MANUAL_SHOP_INN,  # Заглушка, если ИНН не пришел с фронта
+    )
+    db.add(new_shop)
+    db.commit()
+    db.refresh(new_shop)
+    return new_shop
 
-# --- CASHIER CRUD (с логикой уникальности по ИНН/Имени) ---
-def get_or_create_cashier(db: Session, cashier_data: schemas.CashierCreate):
-    if not cashier_data.name and not cashier_data.inn:
+
+def update_shop(db: Session, shop_id: int, store_data: dict) -> models.Shop | None:
+    # 1. Ищем магазин в базе
+    db_shop = db.get(models.Shop, shop_id)
+    if not db_shop:
         return None
 
-    query = select(models.Cashier)
+    # 2. Обновляем поля, сопоставляя имена фронтенда с именами бэкенда
+    for field in ("category", "is_favorite", "notes"):
+        if field in store_data:
+            setattr(db_shop, field, store_data[field])
+    # Поля магазина входят в списки магазинов его покупателей (ETag)
+    rollups.touch_shop_users(db, shop_id)
+
+    # 3. Сохраняем изменения
+    db.commit()
+    db.refresh(db_shop)
+    return db_shop
+
+
+def delete_shop(db: Session, shop_id: int) -> bool:
+    db_shop = db.get(models.Shop, shop_id)
+    if not db_shop:
+        return False
+
+    rollups.forget_shop(db, shop_id)
+    db.delete(db_shop)
+    db.commit()
+    return True
+
+
+# --- SHOP CRUD (с логикой уникальности по ИНН) ---
+@lru_cache
+def _shop_upsert_stmt(dialect_name: str):
+    stmt = dialect_insert(dialect_name)(models.Shop)
+    return stmt.on_conflict_do_update(
+        index_elements=[models.Shop.inn],
+        index_where=text(f"inn <> '{models.MANUAL_SHOP_INN}'"),
+        set_={"inn": stmt.excluded.inn},
+    ).returning(models.Shop.id, models.Shop.inn)
+
+
+def upsert_shops(db: Session, shops: list[schemas.ShopCreate]) -> dict[str, int]:
+    """
+    Возвращает словарь ИНН -> shop_id, создавая недостающие магазины.
+
+    INSERT ... ON CONFLICT (inn) DO UPDATE ... RETURNING id: один запрос на весь
+    список, без гонок между параллельными загрузками и без отдельного SELECT.
+    Данные уже существующих магазинов не перезаписываются.
+    Известные ID берутся из cache.shop_ids, в базу уходят только промахи.
+    """
+    shop_ids: dict[str, int] = {}
+    missing: dict[str, dict] = {}
+    for shop in shops:
+        if shop.inn in shop_ids or shop.inn in missing:
+            continue
+        shop_id = cache.shop_ids.get(shop.inn)
+        if shop_id is not None:
+            shop_ids[shop.inn] = shop_id
+        else:
+            missing[shop.inn] = shop.model_dump()
+
+    if missing:
+        stmt = _shop_upsert_stmt(db.get_bind().dialect.name)
+        # Одинаковый порядок вставки — без взаимных блокировок параллельных загрузок
+        rows = [missing[inn] for inn in sorted(missing)]
+        for shop_id, inn in db.execute(stmt, rows).all():
+            shop_ids[inn] = shop_id
+            cache.set_on_commit(db, cache.shop_ids, inn, shop_id)
+
+    return shop_ids
+
+
+def upsert_shop(db: Session, shop_data: schemas.ShopCreate) -> int:
+    return upsert_shops(db, [shop_data])[shop_data.inn]
+
+
+# --- CASHIER CRUD (с логикой уникальности по ИНН/Имени) ---
+def _cashier_key(cashier_data: schemas.CashierCreate) -> tuple[str, str] | None:
+    """Ключ уникальности кассира: ИНН, а если его нет — имя"""
     if cashier_data.inn:
-        query = query.where(models.Cashier.inn == cashier_data.inn)
+        return ("inn", cashier_data.inn)
+    if cashier_data.name:
+        return ("name", cashier_data.name)
+    return None
+
+
+@lru_cache
+def _cashier_upsert_stmt(dialect_name: str, kind: str):
+    # Кассиры с ИНН и без него попадают под разные частичные уникальные индексы
+    if kind == "inn":
+        column, index_where = models.Cashier.inn, models.Cashier.inn.is_not(None)
     else:
-        query = query.where(models.Cashier.name == cashier_data.name)
+        column, index_where = models.Cashier.name, models.Cashier.inn.is_(None)
 
-    cashier = db.execute(query).scalar_one_or_none()
+    stmt = dialect_insert(dialect_name)(models.Cashier)
+    return stmt.on_conflict_do_update(
+        index_elements=[column],
+        index_where=index_where,
+        set_={column.key: stmt.excluded[column.key]},
+    ).returning(models.Cashier.id, column)
 
-    if not cashier:
-        cashier = models.Cashier(**cashier_data.model_dump())
-        db.add(cashier)
-        db.flush()
-    return cashier
 
+def upsert_cashiers(
+    db: Session, cashiers: list[schemas.CashierCreate]
+) -> dict[tuple[str, str], int]:
+    """
+    Возвращает словарь ключ кассира (см. _cashier_key) -> cashier_id.
 
-# --- RECEIPT CRUD (ГЛАВНАЯ ЛОГИКА) ---
-def create_receipt_full(db: Session, receipt_data: dict, user_id: int):
+    На кассиров с ИНН и без него уходит по одному INSERT ... ON CONFLICT ... RETURNING id.
+    Известные ID берутся из cache.cashier_ids, в базу уходят только промахи.
     """
-    Принимает сырой словарь (parsed JSON) или схему и сохраняет все связи.
+    cashier_ids: dict[tuple[str, str], int] = {}
+    missing: dict[tuple[str, str], dict] = {}
+    for cashier in cashiers:
+        key = _cashier_key(cashier)
+        if key is None or key in cashier_ids or key in missing:
+            continue
+        cashier_id = cache.cashier_ids.get(key)
+        if cashier_id is not None:
+            cashier_ids[key] = cashier_id
+        else:
+            missing[key] = cashier.model_dump()
+
+    for kind in ("inn", "name"):
+        # Сортировка по ключу — как в upsert_shops
+        rows = [missing[key] for key in sorted(missing) if key[0] == kind]
+        if not rows:
+            continue
+
+        stmt = _cashier_upsert_stmt(db.get_bind().dialect.name, kind)
+        for cashier_id, value in db.execute(stmt, rows).all():
+            cashier_ids[(kind, value)] = cashier_id
+            cache.set_on_commit(db, cache.cashier_ids, (kind, value), cashier_id)
+
+    return cashier_ids
+
+
+def upsert_cashier(db: Session, cashier_data: schemas.CashierCreate) -> int | None:
+    key = _cashier_key(cashier_data)
+    if key is None:
+        return None
+    return upsert_cashiers(db, [cashier_data])[key]
+
+
+# --- СПРАВОЧНИК ТОВАРОВ ---
+def product_key(name: str, gtin: str | None) -> str:
+    """Ключ товара: GTIN, а без него — название без учета регистра и пробелов"""
+    if gtin:
+        return f"gtin:{gtin}"
+    return "name:" + " ".join(name.lower().split())[:500]
+
+
+@lru_cache
+def _product_upsert_stmt(dialect_name: str):
+    stmt = dialect_insert(dialect_name)(models.Product)
+    return stmt.on_conflict_do_update(
+        index_elements=[models.Product.key],
+        set_={"key": stmt.excluded.key},
+    ).returning(models.Product.id, models.Product.key)
+
+
+def upsert_products(db: Session, items: list[dict]) -> dict[str, int]:
     """
-    # 1. Проверяем, не существует ли уже такой чек (по external_id)
-    existing_receipt = db.execute(
-        select(models.Receipt).where(models.Receipt.external_id == receipt_data["_id"])
-    ).scalar_one_or_none()
+    Возвращает словарь ключ товара -> product_id, создавая недостающие товары.
 
-    if existing_receipt:
-        return existing_receipt
+    Как upsert_shops: один INSERT ... ON CONFLICT (key) ... RETURNING на все
+    промахи cache.product_ids; название существующего товара не меняется.
 
-    ticket: dict = receipt_data["ticket"]["document"]["receipt"]
+    Args:
+        items: Словари с name, gtin и measure (формат _item_values).
+    """
+    product_ids: dict[str, int] = {}
+    missing: dict[str, dict] = {}
+    for item in items:
+        key = product_key(item["name"], item["gtin"])
+        if key in product_ids or key in missing:
+            continue
+        product_id = cache.product_ids.get(key)
+        if product_id is not None:
+            product_ids[key] = product_id
+        else:
+            missing[key] = {
+                "key": key,
+                "name": item["name"],
+                "gtin": item["gtin"],
+                "measure": item["measure"],
+            }
+
+    if missing:
+        stmt = _product_upsert_stmt(db.get_bind().dialect.name)
+        # Одинаковый порядок вставки — без взаимных блокировок параллельных загрузок
+        rows = [missing[key] for key in sorted(missing)]
+        for product_id, key in db.execute(stmt, rows).all():
+            product_ids[key] = product_id
+            cache.set_on_commit(db, cache.product_ids, key, product_id)
+
+    return product_ids
+
+
+def _item_rows(db: Session, items: list[dict], receipt_ids: list[int]) -> list[dict]:
+    """Строки receipt_items: название и GTIN позиции заменяются на product_id"""
+    product_ids = upsert_products(db, items)
+    rows = []
+    for item, receipt_id in zip(items, receipt_ids):
+        row = {k: v for k, v in item.items() if k not in ("name", "gtin")}
+        row["product_id"] = product_ids[product_key(item["name"], item["gtin"])]
+        row["receipt_id"] = receipt_id
+        rows.append(row)
+    return rows
 
-    # 2. Обрабатываем магазин
-    shop = get_or_create_shop(
-        db,
-        schemas.ShopCreate(
-            legal_name=ticket["user"],
-            inn=ticket["userInn"].strip(),
-            retail_name=ticket.get("retailPlace"),
-            address=ticket.get("retailPlaceAddress"),
-        ),
+
+# --- RECEIPT CRUD (ГЛАВНАЯ ЛОГИКА) ---
+def _get_ticket(receipt_data: dict) -> dict:
+    """Достает тело чека из выгрузки ФНС"""
+    return receipt_data["ticket"]["document"]["receipt"]
+
+
+def _shop_data(ticket: dict) -> schemas.ShopCreate:
+    return schemas.ShopCreate(
+        legal_name=ticket["user"],
+        inn=ticket["userInn"].strip(),
+        retail_name=ticket.get("retailPlace"),
+        address=ticket.get("retailPlaceAddress"),
     )
 
-    # 3. Обрабатываем кассира
-    cashier = get_or_create_cashier(
-        db,
-        schemas.CashierCreate(
-            name=ticket.get("operator"), inn=ticket.get("operatorInn")
-        ),
+
+def _cashier_data(ticket: dict) -> schemas.CashierCreate:
+    return schemas.CashierCreate(
+        name=ticket.get("operator") or None,
+        inn=(ticket.get("operatorInn") or "").strip() or None,
     )
 
-    # 4. Создаем чек
-    db_receipt = models.Receipt(
+
+def _receipt_values(
+    receipt_data: dict,
+    ticket: dict,
+    user_id: int,
+    shop_id: int | None,
+    cashier_id: int | None,
+) -> dict:
+    """
+    Значения колонок заголовка чека. Поля NOT NULL-колонок обязательны:
+    без них KeyError, а не IntegrityError на весь пакет при INSERT.
+    """
+    return dict(
         external_id=receipt_data["_id"],
         created_at=datetime.fromisoformat(receipt_data["createdAt"]),
         date_time=datetime.fromisoformat(ticket["dateTime"]),
@@ -131,23 +378,24 @@ def create_receipt_full(db: Session, receipt_data: dict, user_id: int):
         fiscal_document_number=ticket["fiscalDocumentNumber"],
         fiscal_sign=ticket["fiscalSign"],
         shift_number=ticket.get("shiftNumber"),
-        prepaid_sum=ticket.get("prepaidSum"),
-        provision_sum=ticket.get("provisionSum"),
-        kkt_reg_id=ticket.get("kktRegId"),
+        prepaid_sum=ticket["prepaidSum"],
+        provision_sum=ticket["provisionSum"],
+        kkt_reg_id=ticket["kktRegId"],
         nds_10=ticket.get("nds10"),
         nds_18=ticket.get("nds18"),
-        operation_type=ticket.get("operationType"),
-        request_number=ticket.get("requestNumber"),
+        operation_type=ticket["operationType"],
+        request_number=ticket["requestNumber"],
         taxation_type=ticket.get("taxationType"),
         applied_taxation_type=ticket.get("appliedTaxationType"),
         user_id=user_id,
-        shop_id=shop.id,
-        cashier_id=cashier.id if cashier else None,
+        shop_id=shop_id,
+        cashier_id=cashier_id,
     )
-    db.add(db_receipt)
-    db.flush()
 
-    # 5. Добавляем позиции (Items)
+
+def _item_values(ticket: dict) -> list[dict]:
+    """Значения позиций чека (без receipt_id) вместе с name и gtin товара"""
+    items = []
     for item in ticket["items"]:
         # Логика определения единицы измерения (кг vs шт)
         quantity = item["quantity"]
@@ -156,34 +404,327 @@ def create_receipt_full(db: Session, receipt_data: dict, user_id: int):
             if (not float(quantity).is_integer() or "кг" in item["name"].lower())
             else "шт"
         )
+        product_code = item.get("productCodeData", {})
+        gtin = product_code.get("gtin")
+
+        items.append(
+            dict(
+                name=item["name"],
+                price=item["price"],
+                quantity=quantity,
+                sum=item["sum"],
+                measure=measure,
+                product_type=item.get("productType"),
+                gtin=str(gtin) if gtin is not None else None,
+                raw_product_code=product_code.get("rawProductCode"),
+            )
+        )
+    return items
+
 
-        db_item = models.ReceiptItem(
-            receipt_id=db_receipt.id,
-            name=item["name"],
-            price=item["price"],
-            quantity=quantity,
-            sum=item["sum"],
-            measure=measure,
-            product_type=item.get("productType"),
-            gtin=item.get("productCodeData", {}).get("gtin"),
-            raw_product_code=item.get("productCodeData", {}).get("rawProductCode"),
+def create_receipt_full(db: Session, receipt_data: dict, user_id: int):
+    """
+    Принимает сырой словарь (parsed JSON) или схему и сохраняет все связи.
+    """
+    # 1. Проверяем, не существует ли уже такой чек (по external_id)
+    existing_receipt = db.execute(
+        select(models.Receipt).where(models.Receipt.external_id == receipt_data["_id"])
+    ).scalar_one_or_none()
+
+    if existing_receipt:
+        metrics.RECEIPTS_INGESTED.labels("duplicate").inc()
+        return existing_receipt
+
+    ticket = _get_ticket(receipt_data)
+
+    # 2. Обрабатываем магазин
+    shop_id = upsert_shop(db, _shop_data(ticket))
+
+    # 3. Обрабатываем кассира
+    cashier_id = upsert_cashier(db, _cashier_data(ticket))
+
+    # 4. Создаем чек и учитываем его в агрегатах аналитики
+    receipt_values = _receipt_values(
+        receipt_data,
+        ticket,
+        user_id=user_id,
+        shop_id=shop_id,
+        cashier_id=cashier_id,
+    )
+    db_receipt = models.Receipt(**receipt_values)
+    db.add(db_receipt)
+    db.flush()
+    rollups.apply_receipts(db, [receipt_values])
+
+    # 5. Добавляем позиции (Items)
+    items = _item_values(ticket)
+    if items:
+        db.execute(
+            insert(models.ReceiptItem),
+            _item_rows(db, items, [db_receipt.id] * len(items)),
         )
-        db.add(db_item)
 
     db.commit()
+    metrics.RECEIPTS_INGESTED.labels("created").inc()
+    metrics.RECEIPT_ITEMS_INGESTED.inc(len(items))
     db.refresh(db_receipt)
     return db_receipt
 
 
-def get_user_receipts(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return (
+# --- ПАКЕТНАЯ ЗАГРУЗКА ЧЕКОВ ---
+def _insert_receipt_headers(
+    db: Session, to_create: list[tuple]
+) -> tuple[list[dict], list[int]]:
+    """Резолвит магазины и кассиров пакета и вставляет заголовки его чеков"""
+    shop_ids = upsert_shops(db, [entry[2] for entry in to_create])
+    cashier_ids = upsert_cashiers(db, [entry[3] for entry in to_create])
+
+    receipt_rows = []
+    for _result, values, shop, cashier, _items in to_create:
+        cashier_key = _cashier_key(cashier)
+        values["shop_id"] = shop_ids[shop.inn]
+        values["cashier_id"] = cashier_ids[cashier_key] if cashier_key else None
+        receipt_rows.append(values)
+    receipt_ids = (
         db.execute(
-            select(models.Receipt)
-            .where(models.Receipt.user_id == user_id)
-            .offset(skip)
-            .limit(limit)
-            .order_by(models.Receipt.date_time.desc())
+            insert(models.Receipt).returning(models.Receipt.id),
+            receipt_rows,
+            execution_options={"sort_by_parameter_order": True},
         )
         .scalars()
         .all()
     )
+    return receipt_rows, receipt_ids
+
+
+def create_receipts_bulk(
+    db: Session, receipts_data: list[dict], user_id: int
+) -> list[dict]:
+    """
+    Пакетная загрузка чеков из выгрузки ФНС (список чеков) одной транзакцией.
+
+    Магазины и кассиры резолвятся один раз на весь пакет, заголовки чеков и позиции
+    вставляются множественными INSERT вместо db.add на каждую строку.
+
+    Returns:
+        List[dict]: Результат по каждому чеку в порядке входного списка:
+            - index (int): Позиция чека во входном списке.
+            - external_id (str|None): Внешний ID чека (_id).
+            - status (str): "created", "duplicate" или "failed".
+            - receipt_id (int|None): ID чека в БД (для created и duplicate).
+            - items_count (int): Количество сохраненных позиций.
+            - error (str|None): Причина ошибки для failed.
+    """
+    results: list[dict] = [
+        {
+            "index": index,
+            "external_id": None,
+            "status": "failed",
+            "receipt_id": None,
+            "items_count": 0,
+            "error": None,
+        }
+        for index in range(len(receipts_data))
+    ]
+
+    # 1. Разбираем чеки и отбрасываем битые до обращения к БД: заголовок
+    # собирается здесь же, ID магазина и кассира подставляются в шаге 4
+    parsed = []
+    for result, receipt_data in zip(results, receipts_data):
+        try:
+            external_id = receipt_data["_id"]
+            result["external_id"] = external_id
+            ticket = _get_ticket(receipt_data)
+            parsed.append(
+                (
+                    result,
+                    _receipt_values(
+                        receipt_data,
+                        ticket,
+                        user_id=user_id,
+                        shop_id=None,
+                        cashier_id=None,
+                    ),
+                    _shop_data(ticket),
+                    _cashier_data(ticket),
+                    _item_values(ticket),
+                )
+            )
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            result["error"] = f"Invalid receipt data: {e!r}"
+
+    # 2. Дубликаты: одним запросом по БД и внутри самого пакета
+    external_ids = {entry[0]["external_id"] for entry in parsed}
+    existing = (
+        dict(
+            db.execute(
+                select(models.Receipt.external_id, models.Receipt.id).where(
+                    models.Receipt.external_id.in_(external_ids)
+                )
+            ).all()
+        )
+        if external_ids
+        else {}
+    )
+
+    to_create = []
+    seen: set[str] = set()
+    for entry in parsed:
+        result = entry[0]
+        external_id = result["external_id"]
+        if external_id in existing:
+            result["status"] = "duplicate"
+            result["receipt_id"] = existing[external_id]
+        elif external_id in seen:
+            result["status"] = "duplicate"
+        else:
+            seen.add(external_id)
+            to_create.append(entry)
+
+    if not to_create:
+        metrics.count_ingested(results)
+        return results
+
+    # 3-4. Магазины и кассиры — один раз на пакет, заголовки чеков — одним
+    # множественным INSERT ... RETURNING
+    try:
+        with db.begin_nested():
+            receipt_rows, receipt_ids = _insert_receipt_headers(db, to_create)
+    except IntegrityError:
+        # ID из кеша мог устареть: магазин удалили в другом процессе, а кеш
+        # сбрасывается только там, где обработан DELETE. Забываем ID пакета
+        # и повторяем вставку один раз с ID, полученными через ON CONFLICT
+        for _result, _values, shop, cashier, _items in to_create:
+            cache.shop_ids.pop(shop.inn)
+            cache.cashier_ids.pop(_cashier_key(cashier))
+        receipt_rows, receipt_ids = _insert_receipt_headers(db, to_create)
+
+    rollups.apply_receipts(db, receipt_rows)
+
+    # 5. Товары и позиции всех чеков — по одному множественному INSERT
+    all_items, item_receipt_ids = [], []
+    for (result, *_rest, items), receipt_id in zip(to_create, receipt_ids):
+        result["status"] = "created"
+        result["receipt_id"] = receipt_id
+        result["items_count"] = len(items)
+        all_items.extend(items)
+        item_receipt_ids.extend([receipt_id] * len(items))
+    if all_items:
+        db.execute(
+            insert(models.ReceiptItem), _item_rows(db, all_items, item_receipt_ids)
+        )
+
+    db.commit()
+
+    # Дубликаты внутри пакета ссылаются на только что созданный чек
+    created_ids = {
+        r["external_id"]: r["receipt_id"] for r in results if r["status"] == "created"
+    }
+    for result in results:
+        if result["status"] == "duplicate" and result["receipt_id"] is None:
+            result["receipt_id"] = created_ids.get(result["external_id"])
+
+    metrics.count_ingested(results)
+    return results
+
+
+def delete_receipt(db: Session, receipt_id: int, user_id: int) -> bool:
+    """Удаляет чек пользователя вместе с позициями и вычитает его из агрегатов"""
+    db_receipt = db.execute(
+        select(models.Receipt).where(
+            models.Receipt.id == receipt_id, models.Receipt.user_id == user_id
+        )
+    ).scalar_one_or_none()
+    if not db_receipt:
+        return False
+
+    receipt_values = {
+        field: getattr(db_receipt, field)
+        for field in ("user_id", "shop_id", "date_time", *rollups.SUM_FIELDS)
+    }
+    db.delete(db_receipt)
+    db.flush()
+    rollups.remove_receipts(db, [receipt_values])
+    db.commit()
+    return True
+
+
+def _user_receipts_page(
+    stmt, user_id: int, skip: int, limit: int, after: tuple[datetime, int] | None
+):
+    """Чеки пользователя от новых к старым: фильтр, порядок и страница"""
+    stmt = (
+        stmt.where(models.Receipt.user_id == user_id)
+        .order_by(models.Receipt.date_time.desc(), models.Receipt.id.desc())
+        .limit(limit)
+    )
+    if after is not None:
+        return stmt.where(
+            tuple_(models.Receipt.date_time, models.Receipt.id) < tuple_(*after)
+        )
+    if skip:
+        return stmt.offset(skip)
+    return stmt
+
+
+def get_user_receipts(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[datetime, int] | None = None,
+):
+    """
+    Чеки пользователя от новых к старым.
+
+    Магазин и кассир подгружаются тем же запросом (JOIN), позиции — одним
+    дополнительным запросом на всю страницу (SELECT ... WHERE receipt_id IN),
+    а не по запросу на каждый чек.
+
+    Args:
+        after: Ключ (date_time, id) последнего чека предыдущей страницы —
+            курсорная пагинация по индексу. skip (OFFSET) оставлен для
+            обратной совместимости и на глубоких страницах медленный.
+    """
+    stmt = select(models.Receipt).options(
+        joinedload(models.Receipt.shop),
+        joinedload(models.Receipt.cashier),
+        # Товары позиций подгружаются в том же запросе (lazy="joined")
+        selectinload(models.Receipt.items),
+    )
+    stmt = _user_receipts_page(stmt, user_id, skip, limit, after)
+    return db.execute(stmt).scalars().all()
+
+
+def get_user_receipt_summaries(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[datetime, int] | None = None,
+):
+    """
+    Краткий список чеков (см. schemas.ReceiptSummary) одним запросом:
+    заголовок чека, магазин, кассир и количество позиций без самих позиций.
+    Параметры — как у get_user_receipts.
+    """
+    Receipt = models.Receipt
+    header = ("id", "shop_id", *schemas.ReceiptBase.model_fields)
+    items_count = (
+        select(func.count(models.ReceiptItem.id))
+        .where(models.ReceiptItem.receipt_id == Receipt.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            *(Receipt.__table__.c[name] for name in header),
+            models.Shop.retail_name.label("shop_name"),
+            models.Shop.legal_name.label("shop_legal_name"),
+            models.Cashier.name.label("cashier_name"),
+            items_count.label("items_count"),
+        )
+        .join(models.Shop, models.Shop.id == Receipt.shop_id)
+        .outerjoin(models.Cashier, models.Cashier.id == Receipt.cashier_id)
+    )
+    stmt = _user_receipts_page(stmt, user_id, skip, limit, after)
+    return db.execute(stmt).all()
@@ -1,17 +1,17 @@
-from fastapi import Depends, HTTPException, status
+from datetime import date, timezone
+from email.utils import format_datetime
+
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from . import auth
-from .database import get_db
-from .models import User
+from . import auth, cache, crud, schemas
+from .database import Database, get_db
 
 security = HTTPBearer()
 
 
-def get_current_user(
+async def get_current_user(
         credentials: HTTPAuthorizationCredentials = Depends(security),
-        db: Session = Depends(get_db)
+        db: Database = Depends(get_db)
 ):
     token = credentials.credentials
 
@@ -26,16 +26,22 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # 2. Ищем пользователя.
-    query = select(User).where(User.id == int(user_id))
-    user = db.execute(query).scalar_one_or_none()
-
-    # 3. Проверка существования и активности
+    # 2. Ищем пользователя: сначала в кеше процесса, затем в БД.
+    # В кеше лежит снимок (schemas.User), он сбрасывается при изменении
+    # пользователя через ORM (см. cache.auth_users)
+    user = cache.auth_users.get(user_id)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-        )
+        db_user = await db.run(crud.get_user, int(user_id))
+
+        # 3. Проверка существования и активности
+        if db_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+            )
+
+        user = schemas.User.model_validate(db_user)
+        cache.auth_users.set(user_id, user)
 
     if not user.is_active:
         raise HTTPException(
@@ -44,3 +50,51 @@ def get_current_user(
         )
 
     return user
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Слабое сравнение: W/"x" и "x" считаются одинаковыми
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+async def check_not_modified(
+        request: Request,
+        response: Response,
+        current_user: schemas.User = Depends(get_current_user),
+        db: Database = Depends(get_db)
+):
+    """
+    Условный GET для данных пользователя (списки и аналитика).
+
+    ETag строится из версии данных пользователя (models.UserDataVersion) и
+    текущей даты: периоды вида "последние N месяцев" сдвигаются каждый день.
+    Если он совпал с If-None-Match, запрос завершается ответом 304 до
+    выполнения эндпоинта, т.е. без запросов к чекам и агрегатам.
+
+    Возвращает версию: эндпоинт получает ее через Depends(check_not_modified)
+    без повторного запроса и передает в analytics_cache.cached.
+    """
+    row = await db.run(crud.get_data_version, current_user.id)
+    version = row.version if row else 0
+    etag = f'W/"{current_user.id}-{version}-{date.today():%Y%m%d}"'
+
+    # no-cache: браузер хранит ответ, но каждый раз перепроверяет его по ETag
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if row is not None:
+        # SQLite возвращает дату без часового пояса, записывается она в UTC
+        updated_at = row.updated_at
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(
+            updated_at.astimezone(timezone.utc), usegmt=True
+        )
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return version
@@ -0,0 +1,225 @@
+"""
+Потоковый разбор выгрузок ФНС и загрузка чеков пачками.
+
+Выгрузка — это либо один чек ({...}), либо список чеков ([{...}, {...}]).
+Парсер получает файл кусками и отдает чеки по одному, как только очередной
+элемент списка прочитан целиком, поэтому в памяти одновременно находится
+не больше одного куска файла и одного чека.
+"""
+
+import codecs
+import json
+import tempfile
+from typing import AsyncIterable, BinaryIO, Iterable, Iterator, List
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import crud
+
+CHUNK_SIZE = 64 * 1024  # Размер куска при чтении файла
+BATCH_SIZE = 100  # Сколько чеков коммитим за одну транзакцию
+
+_WHITESPACE = " \t\n\r"
+
+
+class ReceiptStreamParser:
+    """
+    Инкрементальный парсер JSON-выгрузки.
+
+    Куски байтов подаются через feed(), готовые чеки возвращаются списком.
+    После последнего куска нужно вызвать close() — он проверит, что документ
+    закончился корректно. Ошибки формата выбрасываются как json.JSONDecodeError
+    с позицией от начала файла (в символах), независимо от размера кусков.
+
+    Example:
+        >>> parser = ReceiptStreamParser()
+        >>> for chunk in chunks:
+        >>>     for receipt in parser.feed(chunk):
+        >>>         ...
+        >>> parser.close()
+    """
+
+    # Состояния разбора
+    _START = "start"  # Ждем "[" или "{"
+    _FIRST = "first"  # После "[": ждем первый чек или "]"
+    _VALUE = "value"  # После ",": ждем очередной чек
+    _DELIMITER = "delimiter"  # После чека: ждем "," или "]"
+    _END = "end"  # Документ закончился
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        # Сколько символов файла уже отброшено из буфера, сколько в них строк
+        # и где начинается текущая строка — для позиций в ошибках
+        self._offset = 0
+        self._lineno = 1
+        self._line_start = 0
+        self._state = self._START
+        # None — еще не знаем, True — список чеков, False — одиночный чек
+        self.is_array: bool | None = None
+        self.count = 0
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        self._buffer += self._utf8.decode(chunk)
+        return self._drain(final=False)
+
+    def close(self) -> List[dict]:
+        self._buffer += self._utf8.decode(b"", final=True)
+        receipts = self._drain(final=True)
+
+        if self._state == self._START:
+            self._fail("Expecting value", 0)
+        if self._state != self._END:
+            self._fail("Unexpected end of file", len(self._buffer))
+        return receipts
+
+    def _error(self, message: str, pos: int) -> json.JSONDecodeError:
+        """Ошибка в позиции pos буфера с координатами от начала файла"""
+        buffer = self._buffer
+        error = json.JSONDecodeError(message, buffer, pos)
+        newlines = buffer.count("\n", 0, pos)
+        error.pos = self._offset + pos
+        error.lineno = self._lineno + newlines
+        if newlines:
+            error.colno = pos - buffer.rfind("\n", 0, pos)
+        else:
+            error.colno = error.pos - self._line_start + 1
+        error.args = (
+            f"{message}: line {error.lineno} column {error.colno} (char {error.pos})",
+        )
+        return error
+
+    def _fail(self, message: str, pos: int):
+        raise self._error(message, pos)
+
+    def _consume(self, pos: int):
+        """Отбрасывает разобранные pos символов буфера"""
+        buffer = self._buffer
+        newlines = buffer.count("\n", 0, pos)
+        if newlines:
+            self._lineno += newlines
+            self._line_start = self._offset + buffer.rfind("\n", 0, pos) + 1
+        self._offset += pos
+        self._buffer = buffer[pos:]
+
+    def _drain(self, final: bool) -> List[dict]:
+        receipts = []
+        buffer = self._buffer
+        pos = 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                break
+
+            char = buffer[pos]
+            if self._state == self._END:
+                self._fail("Extra data", pos)
+
+            # 1. Определяем вид документа по первому символу
+            if self._state == self._START:
+                if char == "[":
+                    self.is_array = True
+                    self._state = self._FIRST
+                    pos += 1
+                    continue
+                if char != "{":
+                    self._fail("Expecting '[' or '{'", pos)
+                self.is_array = False
+
+            # 2. Разделители между элементами списка
+            elif self._state == self._DELIMITER or (
+                self._state == self._FIRST and char == "]"
+            ):
+                if char == "]":
+                    self._state = self._END
+                elif char == ",":
+                    self._state = self._VALUE
+                else:
+                    self._fail("Expecting ',' delimiter", pos)
+                pos += 1
+                continue
+
+            # 3. Пробуем разобрать очередной чек целиком
+            try:
+                receipt, pos = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if final:
+                    raise self._error(e.msg, e.pos) from None
+                break  # Элемент еще не дочитан
+
+            receipts.append(receipt)
+            self.count += 1
+            self._state = self._DELIMITER if self.is_array else self._END
+
+        # Отбрасываем уже разобранную часть буфера
+        self._consume(pos)
+        return receipts
+
+
+def iter_receipts(
+    fileobj: BinaryIO,
+    parser: ReceiptStreamParser | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[dict]:
+    """Отдает чеки из файлового объекта, читая его кусками"""
+    parser = parser or ReceiptStreamParser()
+    while chunk := fileobj.read(chunk_size):
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def aiter_upload_chunks(file, chunk_size: int = CHUNK_SIZE):
+    """Читает UploadFile (или любой объект с async read) кусками"""
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+async def spool_upload(chunks: AsyncIterable[bytes]) -> str:
+    """
+    Сохраняет поток кусков во временный файл и возвращает путь к нему.
+    Файл удаляет тот, кто его обработал.
+    """
+    with tempfile.NamedTemporaryFile(
+        prefix="receipts-", suffix=".json", delete=False
+    ) as f:
+        async for chunk in chunks:
+            f.write(chunk)
+        return f.name
+
+
+def iter_batches(receipts: Iterable[dict], batch_size: int = BATCH_SIZE):
+    """Группирует поток чеков в пачки по batch_size"""
+    batch: List[dict] = []
+    for receipt in receipts:
+        batch.append(receipt)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_batch(
+    db: Session, batch: List[dict], user_id: int, start_index: int = 0
+) -> List[dict]:
+    """
+    Сохраняет пачку чеков отдельной транзакцией через crud.create_receipts_bulk,
+    поэтому первые чеки оказываются в базе еще до того, как дочитан весь файл.
+    start_index делает индексы в результатах сквозными по всему файлу.
+
+    Если параллельная загрузка успела вставить те же чеки после проверки
+    дубликатов, пачка откатывается и сохраняется заново: такие чеки получают
+    статус duplicate, а уже сохраненные пачки и задача целиком не теряются.
+    """
+    try:
+        results = crud.create_receipts_bulk(db, batch, user_id=user_id)
+    except IntegrityError:
+        db.rollback()
+        results = crud.create_receipts_bulk(db, batch, user_id=user_id)
+    for result in results:
+        result["index"] += start_index
+    return results
@@ -0,0 +1,284 @@
+"""
+Фоновая загрузка файлов с чеками.
+
+Загрузка (API или Telegram) сохраняет файл во временный каталог и ставит задачу
+в очередь, а пул воркеров разбирает файлы потоково и сохраняет чеки пачками.
+Состояние задачи (прогресс и результаты) доступно по ее ID.
+
+Очередь по умолчанию живет в памяти процесса: задачу видит только тот
+процесс, который ее принял. При нескольких воркерах uvicorn (--workers N,
+WEB_CONCURRENCY) опрос GET /receipts/jobs/{id} попадает в другой воркер и
+получает 404, поэтому там нужен RedisJobBackend (INGEST_QUEUE_BACKEND=redis)
+с общим для всех воркеров каталогом временных файлов. С WEB_CONCURRENCY > 1
+очередь в памяти не запускается.
+
+Результаты по чекам хранятся отдельно от состояния задачи и только
+дописываются (add_results), так что запись в хранилище на каждую пачку
+не растет с размером файла.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from . import ingestion, schemas
+from .cache import TTLCache
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_BACKEND = os.getenv("INGEST_QUEUE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+JOB_TTL = int(os.getenv("INGEST_JOB_TTL", str(24 * 3600)))  # Сколько хранить задачи
+
+
+class Job(schemas.IngestJob):
+    """Задача вместе со служебными полями, которые не отдаются в API"""
+
+    user_id: int
+    path: str
+
+
+class InMemoryJobBackend:
+    """Очередь и хранилище задач в памяти процесса"""
+
+    def __init__(self, max_jobs: int = 10000):
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._jobs = TTLCache("ingest_jobs", maxsize=max_jobs, ttl=JOB_TTL)
+
+    async def save(self, job: Job):
+        # Храним сам объект: его меняет только воркер в цикле событий
+        self._jobs.set(job.id, job)
+
+    async def add_results(self, job: Job, results: list[schemas.ReceiptUploadResult]):
+        job.results.extend(results)
+
+    async def load(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def push(self, job_id: str):
+        await self._queue.put(job_id)
+
+    async def pop(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RedisJobBackend:
+    """
+    Очередь (список) и задачи в Redis: состояние задачи — JSON-строка без
+    результатов, результаты — список JSON-строк, который только дописывается
+    (RPUSH). Ключи живут JOB_TTL.
+
+    Args:
+        client: Асинхронный клиент с интерфейсом redis.asyncio.Redis
+            (set/get/rpush/expire/lrange/blpop). В тестах — заглушка
+            tests/fakes.py.
+        prefix (str): Префикс ключей.
+    """
+
+    def __init__(self, client, prefix: str = "ingest"):
+        self._redis = client
+        self._queue_key = f"{prefix}:queue"
+        self._job_prefix = f"{prefix}:job:"
+        self._results_prefix = f"{prefix}:results:"
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisJobBackend":
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError(
+                "INGEST_QUEUE_BACKEND=redis требует пакет redis (pip install redis)"
+            ) from e
+        return cls(redis.from_url(url))
+
+    async def save(self, job: Job):
+        await self._redis.set(
+            self._job_prefix + job.id,
+            job.model_dump_json(exclude={"results"}),
+            ex=JOB_TTL,
+        )
+
+    async def add_results(self, job: Job, results: list[schemas.ReceiptUploadResult]):
+        if not results:
+            return
+        key = self._results_prefix + job.id
+        await self._redis.rpush(key, *(result.model_dump_json() for result in results))
+        await self._redis.expire(key, JOB_TTL)
+
+    async def load(self, job_id: str) -> Optional[Job]:
+        raw = await self._redis.get(self._job_prefix + job_id)
+        if not raw:
+            return None
+        job = Job.model_validate_json(raw)
+        job.results = [
+            schemas.ReceiptUploadResult.model_validate_json(result)
+            for result in await self._redis.lrange(self._results_prefix + job_id, 0, -1)
+        ]
+        return job
+
+    async def push(self, job_id: str):
+        await self._redis.rpush(self._queue_key, job_id)
+
+    async def pop(self, timeout: float) -> Optional[str]:
+        item = await self._redis.blpop([self._queue_key], timeout=timeout)
+        if item is None:
+            return None
+        value = item[1]
+        return value.decode() if isinstance(value, bytes) else value
+
+
+def make_backend():
+    if INGEST_QUEUE_BACKEND == "redis":
+        return RedisJobBackend.from_url(REDIS_URL)
+    if INGEST_QUEUE_BACKEND == "memory":
+        if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            raise RuntimeError(
+                "INGEST_QUEUE_BACKEND=memory works with a single uvicorn worker: "
+                "set INGEST_QUEUE_BACKEND=redis for WEB_CONCURRENCY > 1"
+            )
+        return InMemoryJobBackend()
+    raise RuntimeError(f"Unknown INGEST_QUEUE_BACKEND: {INGEST_QUEUE_BACKEND}")
+
+
+class JobQueue:
+    """
+    Очередь задач загрузки и пул воркеров.
+
+    Каждый воркер обрабатывает одну задачу за раз, поэтому workers ограничивает
+    число одновременных загрузок (и занятых ими соединений с БД).
+
+    Example:
+        >>> await queue.start()
+        >>> job = await queue.submit(user_id=1, path="/tmp/receipts.json")
+        >>> job = await queue.wait(job.id)
+        >>> await queue.stop()
+    """
+
+    POLL_TIMEOUT = 1.0  # Как часто воркер проверяет, не пора ли остановиться
+
+    def __init__(
+        self,
+        backend=None,
+        workers: int = INGEST_WORKERS,
+        batch_size: int = ingestion.BATCH_SIZE,
+    ):
+        self._backend = backend
+        self.workers = workers
+        self.batch_size = batch_size
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    @property
+    def backend(self):
+        # Создаем лениво: asyncio.Queue и клиент Redis привязываются к циклу событий
+        if self._backend is None:
+            self._backend = make_backend()
+        return self._backend
+
+    async def start(self):
+        self.backend  # Ошибка настройки — при старте, а не при первой загрузке
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"ingest-worker-{n}")
+            for n in range(self.workers)
+        ]
+
+    async def stop(self):
+        self._stopping = True
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: int, path: str, filename: str | None = None) -> Job:
+        job = Job(
+            id=uuid.uuid4().hex,
+            filename=filename,
+            created_at=datetime.now(timezone.utc),
+            user_id=user_id,
+            path=path,
+        )
+        await self.backend.save(job)
+        await self.backend.push(job.id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.backend.load(job_id)
+
+    async def wait(self, job_id: str, poll_interval: float = 0.5) -> Optional[Job]:
+        """Ждет завершения задачи и возвращает ее итоговое состояние"""
+        while True:
+            job = await self.get(job_id)
+            if job is None or job.status in ("done", "failed"):
+                return job
+            await asyncio.sleep(poll_interval)
+
+    async def _worker(self, n: int):
+        while not self._stopping:
+            job_id = await self.backend.pop(self.POLL_TIMEOUT)
+            if job_id is None:
+                continue
+            job = await self.get(job_id)
+            if job is None:
+                continue
+            try:
+                await self._process(job)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Ingest job {job.id}: invalid JSON: {e}")
+                job.status = "failed"
+                job.error = "Invalid JSON format"
+            except Exception as e:
+                logger.error(f"Ingest job {job.id} failed: {e}", exc_info=True)
+                job.status = "failed"
+                job.error = f"Error processing receipt: {e}"
+            finally:
+                job.finished_at = datetime.now(timezone.utc)
+                await self.backend.save(job)
+                try:
+                    os.remove(job.path)
+                except OSError:
+                    pass
+
+    async def _process(self, job: Job):
+        """
+        Разбирает файл и сохраняет чеки пачками.
+        Синхронные чтение и запросы к БД выполняются в отдельном потоке,
+        а прогресс сохраняется после каждой пачки.
+        """
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        await self.backend.save(job)
+
+        with SessionLocal() as db, open(job.path, "rb") as f:
+            batches = ingestion.iter_batches(
+                ingestion.iter_receipts(f), self.batch_size
+            )
+            while batch := await asyncio.to_thread(next, batches, None):
+                results = await asyncio.to_thread(
+                    ingestion.ingest_batch, db, batch, job.user_id, job.processed
+                )
+                job.processed += len(results)
+                for result in results:
+                    if result["status"] == "created":
+                        job.created += 1
+                    elif result["status"] == "duplicate":
+                        job.duplicates += 1
+                    else:
+                        job.failed += 1
+                await self.backend.add_results(
+                    job, [schemas.ReceiptUploadResult(**result) for result in results]
+                )
+                await self.backend.save(job)
+
+        job.status = "done"
+
+
+# Очередь процесса: воркеры запускаются при старте API (main.py) и бота (run_bot.py)
+queue = JobQueue()
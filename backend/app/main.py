@@ -1,16 +1,32 @@
-from fastapi import FastAPI
+import hmac
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from .database import Base, engine
+from . import analytics_cache, cache, jobs, metrics, profiler, schemas
 from .routers import analytics, auth, receipts, stores, users
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Схема базы создается и обновляется миграциями до старта API
+# (из каталога backend: alembic upgrade head, см. migrations/). При импорте
+# приложение к базе не подключается: воркер стартует и без доступной БД,
+# соединения открываются первыми запросами (pool_pre_ping).
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Пул воркеров фоновой загрузки чеков
+    await jobs.queue.start()
+    yield
+    await jobs.queue.stop()
+
 
 app = FastAPI(
     title="Receipt Analyzer API",
     description="API for analyzing shopping receipts",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -20,8 +36,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Курсор следующей страницы списков (app/pagination.py)
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Метрики запросов (GET /metrics); добавлена последней — внешняя мидлварь,
+# поэтому учитывает и время CORS
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(receipts.router)
@@ -38,3 +60,39 @@ def read_root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/health/caches")
+async def caches_stats():
+    """Размер и счетчики попаданий/промахов внутрипроцессных кешей"""
+    return {**cache.cache_stats(), "analytics": analytics_cache.stats()}
+
+
+# Токен для /health/slow-queries; не задан — эндпоинты выключены
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+
+
+def check_profiler_token(x_profiler_token: str = Header("")):
+    if not PROFILER_TOKEN or not hmac.compare_digest(x_profiler_token, PROFILER_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/health/slow-queries", dependencies=[Depends(check_profiler_token)])
+async def slow_queries(recent: int = Query(20, ge=0, le=profiler.SLOW_QUERY_KEEP)):
+    """Настройки журнала медленных запросов и последние записи (app/profiler.py)"""
+    return profiler.status(recent=recent)
+
+
+@app.put("/health/slow-queries", dependencies=[Depends(check_profiler_token)])
+async def toggle_slow_queries(settings: schemas.SlowQueryLogSettings):
+    if settings.enabled:
+        profiler.enable(threshold_ms=settings.threshold_ms, explain=settings.explain)
+    else:
+        profiler.disable()
+    return profiler.status()
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Метрики процесса в формате Prometheus (см. app/metrics.py)"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
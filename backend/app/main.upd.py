@@ -3,10 +3,11 @@ from contextlib import asynccontextmanager
 
 from aiogram import Bot, Dispatcher, types
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 
+from app import jobs, metrics
 from app.bot.handlers import router as bot_router
-from app.bot.middleware import DbSessionMiddleware
+from app.bot.middleware import DbSessionMiddleware, UpdateMetricsMiddleware
 
 load_dotenv("./..")
 
@@ -20,7 +21,8 @@ bot = Bot(token=TOKEN)
 dp = Dispatcher()
 
 # Регистрация той самой мидлвари и роутера
-dp.message.outer_middleware(DbSessionMiddleware())
+dp.message.middleware(DbSessionMiddleware())
+dp.update.outer_middleware(UpdateMetricsMiddleware())
 dp.include_router(bot_router)
 
 
@@ -31,12 +33,20 @@ async def lifespan(app: FastAPI):
     await bot.set_webhook(
         url=webhook_url, secret_token=SECRET_TOKEN, allowed_updates=["message"]
     )
+    await jobs.queue.start()
     yield
     # Удаление вебхука при остановке
+    await jobs.queue.stop()
     await bot.delete_webhook()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.post(f"/bot/{TOKEN}")
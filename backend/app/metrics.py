@@ -0,0 +1,231 @@
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Метрики — prometheus_client в реестре по умолчанию (вместе с метриками
+процесса и GC). Значения хранятся в памяти процесса: при нескольких воркерах
+uvicorn каждый отдает свои, а Prometheus собирает их как отдельные цели.
+Запись — прибавление под блокировкой, текст собирается только при опросе
+/metrics.
+
+Что собирается:
+    - http_request_duration_seconds{method, route, status} — гистограмма по
+      шаблону маршрута (/receipts/{receipt_id}), а не по фактическому пути;
+    - http_requests_in_flight — запросы в обработке;
+    - http_request_db_queries{route} — SQL-запросов на один HTTP-запрос;
+    - db_queries_total — все SQL-запросы процесса (события engine);
+    - db_pool_checkout_wait_seconds{engine} — получение соединения из пула
+      (ожидание свободного и pre-ping);
+    - db_pool_checkouts_total{engine} (событие пула checkout) и
+      db_pool_connections{engine, state} — выдачи соединений и загрузка пула;
+    - receipts_ingested_total{status}, receipt_items_ingested_total — загрузка
+      чеков (см. crud.create_receipts_bulk);
+    - bot_update_duration_seconds{event, status} — обработка апдейтов бота.
+
+Example:
+    >>> RECEIPTS_INGESTED.labels("created").inc(10)
+    >>> with BOT_UPDATE_DURATION.labels("message", "ok").time(): ...
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Iterable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    return generate_latest(REGISTRY).decode()
+
+
+# --- HTTP ---
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP-запросы в обработке")
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL-запросов на один HTTP-запрос",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+
+# --- БАЗА ДАННЫХ ---
+DB_QUERIES = Counter("db_queries_total", "Выполненные SQL-запросы")
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Ожидание соединения из пула",
+    ("engine",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total", "Выданные пулом соединения", ("engine",)
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Соединения пула: checked_out — выданы, idle — свободны, overflow — сверх размера",
+    ("engine", "state"),
+)
+
+# --- ЗАГРУЗКА ЧЕКОВ ---
+RECEIPTS_INGESTED = Counter(
+    "receipts_ingested_total",
+    "Обработанные при загрузке чеки: created, duplicate, failed",
+    ("status",),
+)
+RECEIPT_ITEMS_INGESTED = Counter(
+    "receipt_items_ingested_total", "Сохраненные позиции чеков"
+)
+
+# --- БОТ ---
+BOT_UPDATE_DURATION = Histogram(
+    "bot_update_duration_seconds",
+    "Время обработки апдейта Telegram",
+    ("event", "status"),
+)
+
+
+# --- SQL-ЗАПРОСЫ ---
+# Счетчик запросов текущего HTTP-запроса. Список, а не число: db.run выполняет
+# функции в пуле потоков с копией контекста, и прибавлять нужно к общему объекту
+_request_queries: ContextVar[list | None] = ContextVar("request_queries", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+# --- ПУЛ СОЕДИНЕНИЙ ---
+class _TimedConnect:
+    """
+    Примесь к пулу: время Pool.connect() — ожидание свободного соединения
+    и pre-ping. У пула нет события до выдачи соединения (checkout вызывается
+    уже после), поэтому замер — вокруг публичного connect().
+    """
+
+    metrics_engine = ""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.metrics_engine).observe(
+                time.perf_counter() - started
+            )
+
+
+class TimedQueuePool(_TimedConnect, QueuePool):
+    metrics_engine = "sync"
+
+
+class TimedAsyncQueuePool(_TimedConnect, AsyncAdaptedQueuePool):
+    metrics_engine = "async"
+
+
+def watch_pool(engine: Engine, name: str):
+    """Выдачи соединений (событие checkout) и загрузка пула engine"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return
+    checkouts = DB_POOL_CHECKOUTS.labels(name)
+    event.listen(pool, "checkout", lambda *_: checkouts.inc())
+    # Загрузка читается из пула при опросе /metrics, а не на каждой выдаче
+    DB_POOL_CONNECTIONS.labels(name, "checked_out").set_function(pool.checkedout)
+    DB_POOL_CONNECTIONS.labels(name, "idle").set_function(pool.checkedin)
+    DB_POOL_CONNECTIONS.labels(name, "overflow").set_function(
+        lambda: max(pool.overflow(), 0)
+    )
+
+
+# --- ЗАГРУЗКА ЧЕКОВ ---
+def count_ingested(results: Iterable[dict]):
+    """Учитывает результаты crud.create_receipts_bulk (после коммита)"""
+    statuses: dict[str, int] = {}
+    items = 0
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+        items += result["items_count"]
+    for status, count in statuses.items():
+        RECEIPTS_INGESTED.labels(status).inc(count)
+    RECEIPT_ITEMS_INGESTED.inc(items)
+
+
+async def serve(host: str, port: int):
+    """
+    Отдельный HTTP-сервер с /metrics — для процессов без API (бот в режиме
+    polling). Возвращает aiohttp AppRunner; остановка — await runner.cleanup().
+    """
+    from aiohttp import web  # Зависимость aiogram, в API не нужна
+
+    async def handle(request):
+        return web.Response(
+            body=render().encode(), headers={"Content-Type": CONTENT_TYPE}
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# --- HTTP MIDDLEWARE ---
+class MetricsMiddleware:
+    """
+    ASGI-мидлварь: время, статус и число SQL-запросов каждого HTTP-запроса.
+    Маршрут берется из scope["route"], который FastAPI заполняет при роутинге;
+    запросы без маршрута (404) собираются под route="<unmatched>".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        queries = [0]
+        token = _request_queries.set(queries)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            _request_queries.reset(token)
+            route = scope.get("route")
+            route = getattr(route, "path", "<unmatched>")
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, status).observe(
+                elapsed
+            )
+            HTTP_REQUEST_DB_QUERIES.labels(route).observe(queries[0])
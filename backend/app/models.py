@@ -7,14 +7,19 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     func,
+    text,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
 
+# ИНН-заглушка для магазинов, созданных вручную (их может быть сколько угодно)
+MANUAL_SHOP_INN = "0000000000"
+
 
 class User(Base):
     """Пользователь системы (владелец чеков)"""
@@ -26,7 +31,7 @@ class User(Base):
         String(255), unique=True, index=True, nullable=False
     )
     password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
-    telegram_id: Mapped[str] = mapped_column(String(100), nullable=True)
+    telegram_id: Mapped[str] = mapped_column(String(100), nullable=True, index=True)
     full_name: Mapped[Optional[str]] = mapped_column(String(255))
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(
@@ -40,6 +45,16 @@ class Shop(Base):
     """Магазин и Юр.лицо (владелец сети)"""
 
     __tablename__ = "shops"
+    __table_args__ = (
+        # Один магазин на ИНН — ключ для INSERT ... ON CONFLICT при загрузке чеков
+        Index(
+            "uq_shops_inn",
+            "inn",
+            unique=True,
+            postgresql_where=text(f"inn <> '{MANUAL_SHOP_INN}'"),
+            sqlite_where=text(f"inn <> '{MANUAL_SHOP_INN}'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     legal_name: Mapped[str] = mapped_column(String(255))  # Напр: ООО "Агроторг"
@@ -57,6 +72,23 @@ class Cashier(Base):
     """Информация о кассире"""
 
     __tablename__ = "cashiers"
+    __table_args__ = (
+        # Кассир уникален по ИНН, а если ИНН нет — по имени
+        Index(
+            "uq_cashiers_inn",
+            "inn",
+            unique=True,
+            postgresql_where=text("inn IS NOT NULL"),
+            sqlite_where=text("inn IS NOT NULL"),
+        ),
+        Index(
+            "uq_cashiers_name",
+            "name",
+            unique=True,
+            postgresql_where=text("inn IS NULL"),
+            sqlite_where=text("inn IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[Optional[str]] = mapped_column(String(255))  # ФИО
@@ -69,6 +101,11 @@ class Receipt(Base):
     """Заголовок чека"""
 
     __tablename__ = "receipts"
+    __table_args__ = (
+        # Выборки чеков пользователя за период (date_time >= from AND < to)
+        # и курсорная пагинация по (date_time, id)
+        Index("ix_receipts_user_date", "user_id", "date_time", "id"),
+    )
 
     # id'шники и время создания самого чека
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -115,15 +152,36 @@ class Receipt(Base):
     )
 
 
+class Product(Base):
+    """
+    Товар из справочника. Позиции чеков ссылаются на него, а не хранят
+    название сами: аналитика группирует по целому product_id.
+    Ключ — GTIN (штрихкод), а если его нет — нормализованное название
+    (см. crud.product_key).
+    """
+
+    __tablename__ = "products"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(String(520), unique=True)
+
+    # Название из первого чека с этим товаром
+    name: Mapped[str] = mapped_column(String(500))
+    gtin: Mapped[Optional[str]] = mapped_column(String(20))
+    measure: Mapped[Optional[str]] = mapped_column(String(20), default="шт")
+
+
 class ReceiptItem(Base):
     """Позиция товара в чеке"""
 
     __tablename__ = "receipt_items"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    receipt_id: Mapped[int] = mapped_column(ForeignKey("receipts.id"))
+    # Индекс — для подгрузки позиций списка чеков (IN по receipt_id) и их подсчета
+    receipt_id: Mapped[int] = mapped_column(ForeignKey("receipts.id"), index=True)
+    # Название и GTIN — в справочнике товаров
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), index=True)
 
-    name: Mapped[str] = mapped_column(String(500))
     price: Mapped[int] = mapped_column(BigInteger)
     quantity: Mapped[float] = mapped_column(Float)
     sum: Mapped[int] = mapped_column(BigInteger)
@@ -137,7 +195,70 @@ class ReceiptItem(Base):
     product_type: Mapped[Optional[int]] = mapped_column(
         Integer
     )  # Напр. 1 - товар, 33 - маркированный
-    gtin: Mapped[Optional[str]] = mapped_column(String(20))
     raw_product_code: Mapped[Optional[str]] = mapped_column(String(500))
 
     receipt: Mapped["Receipt"] = relationship(back_populates="items")
+    # Позиции почти всегда нужны с названием — подгружаем товар тем же запросом
+    product: Mapped["Product"] = relationship(lazy="joined", innerjoin=True)
+
+    @property
+    def name(self) -> str:
+        return self.product.name
+
+    @property
+    def gtin(self) -> Optional[str]:
+        return self.product.gtin
+
+
+class MonthlySpending(Base):
+    """
+    Траты пользователя за месяц (rollup по чекам).
+    Обновляется инкрементально при загрузке/удалении чеков (см. app/rollups.py)
+    """
+
+    __tablename__ = "monthly_spending"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    receipts_count: Mapped[int] = mapped_column(Integer, default=0)
+    total_sum: Mapped[int] = mapped_column(BigInteger, default=0)  # В копейках
+    cash_total_sum: Mapped[int] = mapped_column(BigInteger, default=0)  # В копейках
+    ecash_total_sum: Mapped[int] = mapped_column(BigInteger, default=0)  # В копейках
+
+
+class ShopSpending(Base):
+    """
+    Траты пользователя в магазине (rollup по чекам) для статистики магазинов.
+    Обновляется инкрементально при загрузке/удалении чеков (см. app/rollups.py)
+    """
+
+    __tablename__ = "shop_spending"
+    __table_args__ = (
+        # Сортировка и курсорная пагинация статистики магазинов без GROUP BY
+        Index("ix_shop_spending_user_total", "user_id", "total_amount", "shop_id"),
+        Index("ix_shop_spending_user_count", "user_id", "receipts_count", "shop_id"),
+    )
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    shop_id: Mapped[int] = mapped_column(ForeignKey("shops.id"), primary_key=True)
+
+    total_amount: Mapped[int] = mapped_column(BigInteger, default=0)  # В копейках
+    receipts_count: Mapped[int] = mapped_column(Integer, default=0)
+    first_visit: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_visit: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+
+class UserDataVersion(Base):
+    """
+    Версия данных пользователя: растет при каждом изменении его чеков и
+    статистики магазинов (в той же транзакции, см. app/rollups.py).
+    Из нее строятся ETag/Last-Modified списков и аналитики.
+    """
+
+    __tablename__ = "user_data_versions"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,46 @@
+"""
+Курсорная (keyset) пагинация.
+
+Курсор — непрозрачная для клиента строка (base64 от JSON) с ключом сортировки
+последней записи страницы. Следующая страница выбирается условием
+(ключ) < (ключ курсора) по индексу, поэтому ее стоимость не зависит от
+глубины, в отличие от OFFSET.
+
+Списки по-прежнему отдаются массивом, а курсор следующей страницы — в заголовке
+X-Next-Cursor (нет заголовка — страница последняя).
+"""
+
+import base64
+import json
+from typing import Any, Callable
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *converters: Callable[[Any], Any]) -> list:
+    """
+    Разбирает курсор и приводит значения к нужным типам.
+
+    Example:
+        >>> date_time, receipt_id = decode_cursor(cursor, datetime.fromisoformat, int)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(converters):
+            raise ValueError(cursor)
+        return [convert(value) for convert, value in zip(converters, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def set_next_cursor(response: Response, cursor: str | None):
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
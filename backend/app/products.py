@@ -0,0 +1,143 @@
+"""
+Перенос существующих позиций чеков в справочник товаров (products).
+
+Раньше название и GTIN хранились в каждой строке receipt_items. Команда
+(из каталога backend) запускается один раз после обновления, до старта API:
+    python -m app.products
+
+1. добавляет колонку receipt_items.product_id, если ее нет;
+2. порциями заводит товары по старым name/gtin и проставляет product_id;
+3. удаляет колонки name и gtin и старый поисковый индекс по позициям;
+4. строит поисковый индекс по товарам (app/search.py).
+
+Повторный запуск безопасен: обрабатываются только позиции без product_id.
+В SQLite место, освобожденное колонками, вернет VACUUM.
+
+После переноса таблицы совпадают с первой миграцией — базу помечают ею,
+а недостающие индексы создает следующая ревизия (см. migrations/env.py):
+    python -m app.upgrade
+    alembic stamp 0001 && alembic upgrade head
+"""
+
+import argparse
+
+from sqlalchemy import Connection, Engine, inspect, text
+from sqlalchemy.orm import Session
+
+from . import crud
+from .database import Base, engine
+from .search import ensure_search_index
+
+BACKFILL_CHUNK = 5000
+
+# Поисковые индексы по receipt_items.name до появления справочника
+_LEGACY_SQLITE_DDL = (
+    "DROP TRIGGER IF EXISTS receipt_items_fts_ai",
+    "DROP TRIGGER IF EXISTS receipt_items_fts_ad",
+    "DROP TRIGGER IF EXISTS receipt_items_fts_au",
+    "DROP TABLE IF EXISTS receipt_items_fts",
+)
+_LEGACY_POSTGRES_DDL = (
+    "DROP INDEX IF EXISTS ix_receipt_items_name_fts",
+    "DROP INDEX IF EXISTS ix_receipt_items_name_trgm",
+    "ALTER TABLE receipt_items ALTER COLUMN product_id SET NOT NULL",
+)
+
+
+def _item_columns(connection: Connection) -> set[str]:
+    return {c["name"] for c in inspect(connection).get_columns("receipt_items")}
+
+
+def _add_product_column(connection: Connection):
+    connection.exec_driver_sql(
+        "ALTER TABLE receipt_items ADD COLUMN product_id INTEGER "
+        "REFERENCES products (id)"
+    )
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_receipt_items_product_id "
+        "ON receipt_items (product_id)"
+    )
+
+
+def _backfill_chunk(db: Session, chunk: int) -> int:
+    """Проставляет product_id следующим chunk позициям, возвращает их число"""
+    rows = (
+        db.execute(
+            text(
+                "SELECT id, name, gtin, measure FROM receipt_items "
+                "WHERE product_id IS NULL ORDER BY id LIMIT :chunk"
+            ),
+            {"chunk": chunk},
+        )
+        .mappings()
+        .all()
+    )
+    if rows:
+        product_ids = crud.upsert_products(db, rows)
+        db.execute(
+            text("UPDATE receipt_items SET product_id = :product_id WHERE id = :id"),
+            [
+                {
+                    "id": row["id"],
+                    "product_id": product_ids[
+                        crud.product_key(row["name"], row["gtin"])
+                    ],
+                }
+                for row in rows
+            ],
+        )
+        db.commit()
+    return len(rows)
+
+
+def migrate(engine: Engine, chunk: int = BACKFILL_CHUNK) -> int:
+    """
+    Переводит receipt_items на справочник товаров.
+
+    Returns:
+        int: Сколько позиций получили product_id.
+    """
+    Base.metadata.create_all(engine)  # products
+
+    with engine.begin() as connection:
+        columns = _item_columns(connection)
+        if "name" not in columns:
+            # Схема уже новая
+            ensure_search_index(connection)
+            return 0
+        if "product_id" not in columns:
+            _add_product_column(connection)
+
+    done = 0
+    with Session(engine) as db:
+        # Каждая порция — своя транзакция: прерванный перенос продолжится
+        while count := _backfill_chunk(db, chunk):
+            done += count
+            print(f"  {done} items linked to products")
+
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            legacy_ddl = _LEGACY_POSTGRES_DDL
+        else:
+            legacy_ddl = _LEGACY_SQLITE_DDL
+        for statement in legacy_ddl:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql("ALTER TABLE receipt_items DROP COLUMN name")
+        connection.exec_driver_sql("ALTER TABLE receipt_items DROP COLUMN gtin")
+        ensure_search_index(connection)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Перенос позиций чеков в справочник товаров"
+    )
+    parser.add_argument("--chunk", type=int, default=BACKFILL_CHUNK)
+    args = parser.parse_args()
+
+    done = migrate(engine, args.chunk)
+    print(f"receipt_items migrated to products ({done} items backfilled)")
+
+
+if __name__ == "__main__":
+    main()
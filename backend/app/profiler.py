@@ -0,0 +1,295 @@
+"""
+Журнал медленных SQL-запросов.
+
+Когда журнал включен, каждый SQL-запрос процесса замеряется событиями
+engine (before/after_cursor_execute). Запросы дольше порога записываются
+вместе с параметрами, вызвавшей их функцией приложения (crud/services/...)
+и планом:
+    PostgreSQL — EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), только для SELECT:
+        ANALYZE выполняет запрос повторно (в READ ONLY транзакции с
+        statement_timeout);
+    SQLite — EXPLAIN QUERY PLAN.
+
+План снимается и записи пишутся в фоновом потоке на отдельном соединении,
+так что на запрос приходится только замер времени. Выключенный журнал
+снимает слушатели событий и ничего не стоит.
+
+Записи: журнал (logger app.profiler), последние SLOW_QUERY_KEEP в памяти и,
+если задан SLOW_QUERY_LOG_FILE, JSONL-файл — по строке на запрос.
+Значения параметров с именами вроде password_hash или token в записи
+заменяются на "***", а для таких запросов план не снимается: EXPLAIN ANALYZE
+показывает значения в условиях фильтра.
+
+Настройки окружения (при старте процесса):
+    SLOW_QUERY_LOG=1           — включить сразу;
+    SLOW_QUERY_MS=200          — порог, мс;
+    SLOW_QUERY_LOG_FILE=path   — JSONL-файл;
+    SLOW_QUERY_EXPLAIN=1       — снимать планы.
+Во время работы — enable()/disable() или PUT /health/slow-queries
+(заголовок X-Profiler-Token, см. app/main.py). Настройки действуют на один
+процесс: при нескольких воркерах uvicorn — на тот, что принял запрос.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE") or None
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1") == "1"
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "100"))
+
+# Параметров executemany в записи — не больше
+MAX_PARAMETER_SETS = 5
+# Параметры, значения которых не попадают в журнал (по имени bind-параметра)
+_SENSITIVE = re.compile(r"password|secret|token", re.IGNORECASE)
+REDACTED = "***"
+# Модули, которые не считаются "вызвавшей функцией"
+_SKIP_MODULES = ("app.profiler", "app.database", "app.metrics", "app.cache")
+
+_settings = {
+    "enabled": False,
+    "threshold_ms": SLOW_QUERY_MS,
+    "log_file": SLOW_QUERY_LOG_FILE,
+    "explain": SLOW_QUERY_EXPLAIN,
+}
+_recent: deque = deque(maxlen=SLOW_QUERY_KEEP)
+_stats = {"recorded": 0, "dropped": 0, "explain_errors": 0}
+_lock = threading.Lock()
+# enable/disable могут вызвать одновременно (PUT /health/slow-queries из
+# потоков пула): слушатели и фоновый поток не должны появиться дважды
+_control_lock = threading.Lock()
+
+# Очередь фонового потока: записи, для которых нужно снять план и сохранить
+_queue: "queue.Queue[dict]" = queue.Queue(maxsize=1000)
+_worker: Optional[threading.Thread] = None
+
+
+# --- ЗАМЕР ---
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profiler_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    # Нет отметки — журнал включили, пока запрос уже выполнялся
+    started = getattr(context, "_profiler_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < _settings["threshold_ms"] or conn.info.get("profiler_explain"):
+        return
+    if executemany:
+        parameters = list(parameters[:MAX_PARAMETER_SETS])
+    record = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(elapsed_ms, 2),
+        "caller": _caller(),
+        "dialect": conn.dialect.name,
+        "statement": statement,
+        "parameters": parameters,
+        "executemany": executemany,
+        "paramstyle": conn.dialect.paramstyle,
+        "redact": _sensitive_parameters(context, parameters, executemany),
+        "plan": None,
+    }
+    try:
+        _queue.put_nowait(record)
+    except queue.Full:
+        _stats["dropped"] += 1
+
+
+def _sensitive_parameters(context, parameters, executemany):
+    """
+    Что скрыть в параметрах: ключи (dict) или позиции (кортеж) секретных
+    значений, "all" — если позиции не сопоставить с именами, None — нечего.
+    """
+    compiled = getattr(context, "compiled", None)
+    if compiled is None:
+        return None
+    names = [name for name in compiled.binds if _SENSITIVE.search(name)]
+    if not names:
+        return None
+    first = parameters[0] if executemany and parameters else parameters
+    if isinstance(first, dict):
+        return [key for key in first if _SENSITIVE.search(key)]
+    positions = compiled.positiontup or []
+    # IN (...) раскрывается в несколько параметров — позиции сдвигаются
+    if len(positions) != len(first):
+        return "all"
+    return [i for i, name in enumerate(positions) if _SENSITIVE.search(name)]
+
+
+def _redact(parameters, redact, executemany):
+    if redact == "all":
+        return REDACTED
+
+    def mask(values):
+        if isinstance(values, dict):
+            return {k: REDACTED if k in redact else v for k, v in values.items()}
+        return [REDACTED if i in redact else v for i, v in enumerate(values)]
+
+    if executemany:
+        return [mask(values) for values in parameters]
+    return mask(parameters)
+
+
+def _caller() -> Optional[str]:
+    """Ближайшая функция приложения в стеке вызова (crud, services, ...)"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and not module.startswith(_SKIP_MODULES):
+            code = frame.f_code
+            return f"{module}.{code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+# --- ПЛАНЫ ---
+def _to_pyformat(statement: str, parameters) -> tuple[str, tuple]:
+    """Запрос asyncpg ($1, $2) в формат psycopg2 (%s) для синхронного engine"""
+    statement = statement.replace("%", "%%")
+    values = []
+
+    def replace(match: re.Match) -> str:
+        values.append(parameters[int(match.group(1)) - 1])
+        return "%s"
+
+    return re.sub(r"\$(\d+)", replace, statement), tuple(values)
+
+
+def _explain(record: dict) -> Optional[object]:
+    from .database import engine  # Планы снимаются синхронным engine процесса
+
+    statement, parameters = record["statement"], record["parameters"]
+    if record["executemany"] or engine.dialect.name != record["dialect"]:
+        return None
+    if record["redact"]:
+        return None
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    if record["paramstyle"] == "numeric_dollar":
+        statement, parameters = _to_pyformat(statement, parameters)
+
+    with engine.connect() as connection:
+        connection.info["profiler_explain"] = True
+        try:
+            if engine.dialect.name == "postgresql":
+                # Повтор запроса не дольше 10 порогов и без изменений данных
+                timeout = int(max(_settings["threshold_ms"] * 10, 1000))
+                connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+                connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout}")
+                return connection.exec_driver_sql(
+                    "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters
+                ).scalar()
+            if engine.dialect.name == "sqlite":
+                rows = connection.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN " + statement, parameters
+                ).all()
+                return [row[-1] for row in rows]
+            return None
+        finally:
+            connection.info.pop("profiler_explain", None)
+            connection.rollback()
+
+
+def _write(record: dict):
+    redact = record["redact"]
+    record = {k: v for k, v in record.items() if k not in ("paramstyle", "redact")}
+    if redact:
+        record["parameters"] = _redact(
+            record["parameters"], redact, record["executemany"]
+        )
+    logger.warning(
+        "slow query %.1f ms in %s: %s",
+        record["duration_ms"],
+        record["caller"],
+        " ".join(record["statement"].split())[:500],
+    )
+    with _lock:
+        _recent.append(record)
+        _stats["recorded"] += 1
+        path = _settings["log_file"]
+        if path:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def _work():
+    while True:
+        record = _queue.get()
+        try:
+            if _settings["explain"]:
+                try:
+                    record["plan"] = _explain(record)
+                except Exception as e:
+                    _stats["explain_errors"] += 1
+                    record["plan"] = f"EXPLAIN failed: {e!r}"
+            _write(record)
+        except Exception:
+            logger.exception("slow query log write failed")
+        finally:
+            _queue.task_done()
+
+
+# --- УПРАВЛЕНИЕ ---
+def enable(
+    threshold_ms: Optional[float] = None,
+    log_file: Optional[str] = None,
+    explain: Optional[bool] = None,
+):
+    """Включает журнал (повторный вызов меняет только переданные настройки)"""
+    global _worker
+    with _control_lock:
+        if threshold_ms is not None:
+            _settings["threshold_ms"] = threshold_ms
+        if log_file is not None:
+            _settings["log_file"] = log_file or None
+        if explain is not None:
+            _settings["explain"] = explain
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name="slow-query-log", daemon=True)
+            _worker.start()
+        if not _settings["enabled"]:
+            event.listen(Engine, "before_cursor_execute", _before_execute)
+            event.listen(Engine, "after_cursor_execute", _after_execute)
+            _settings["enabled"] = True
+
+
+def disable():
+    with _control_lock:
+        if _settings["enabled"]:
+            event.remove(Engine, "before_cursor_execute", _before_execute)
+            event.remove(Engine, "after_cursor_execute", _after_execute)
+            _settings["enabled"] = False
+
+
+def flush():
+    """Ждет, пока фоновый поток запишет все накопленные записи"""
+    if _worker is not None:
+        _queue.join()
+
+
+def status(recent: int = 0) -> dict:
+    """Настройки, счетчики и последние recent записей"""
+    with _lock:
+        records = list(_recent)[-recent:] if recent else []
+    return {**_settings, **_stats, "queued": _queue.qsize(), "recent": records}
+
+
+if SLOW_QUERY_LOG:
+    enable()
@@ -0,0 +1,312 @@
+"""
+Предагрегированные траты (rollup-таблицы) для аналитики.
+
+Аналитика читает готовые суммы вместо пересчета всех чеков пользователя.
+Таблицы обновляются инкрементально в той же транзакции, что и сами чеки
+(apply_receipts / remove_receipts), а rebuild_* пересчитывают их с нуля — после ручных правок
+в БД или при первом развертывании на существующих данных.
+Любое изменение агрегатов увеличивает версию данных пользователя
+(models.UserDataVersion) — по ней строятся ETag и ключи кеша аналитики
+(app/analytics_cache.py).
+
+Пересчет (из каталога backend):
+    python -m app.rollups               # все пользователи
+    python -m app.rollups --user-id 42  # один пользователь
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Iterable, Mapping
+
+from sqlalchemy import case, delete, extract, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, dialect_insert
+
+# Суммы чека, которые накапливаются в rollup-таблицах
+SUM_FIELDS = ("total_sum", "cash_total_sum", "ecash_total_sum")
+
+
+# --- ТРАТЫ ПО МЕСЯЦАМ ---
+@lru_cache
+def _monthly_upsert_stmt(dialect_name: str):
+    table = models.MonthlySpending.__table__
+    stmt = dialect_insert(dialect_name)(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.year, table.c.month],
+        set_={
+            field: table.c[field] + stmt.excluded[field]
+            for field in ("receipts_count", *SUM_FIELDS)
+        },
+    )
+
+
+def _apply_monthly(db: Session, receipts: Iterable[Mapping], sign: int):
+    monthly: dict[tuple, dict] = defaultdict(
+        lambda: dict.fromkeys(("receipts_count", *SUM_FIELDS), 0)
+    )
+    for receipt in receipts:
+        date_time = receipt["date_time"]
+        row = monthly[(receipt["user_id"], date_time.year, date_time.month)]
+        row["receipts_count"] += sign
+        for field in SUM_FIELDS:
+            row[field] += sign * (receipt[field] or 0)
+
+    if monthly:
+        # Строки по порядку ключа: параллельные загрузки блокируют их в одном
+        # порядке и не попадают во взаимную блокировку (как crud.upsert_*)
+        db.execute(
+            _monthly_upsert_stmt(db.get_bind().dialect.name),
+            [
+                {"user_id": user_id, "year": year, "month": month, **sums}
+                for (user_id, year, month), sums in sorted(monthly.items())
+            ],
+        )
+
+
+# --- ТРАТЫ ПО МАГАЗИНАМ ---
+@lru_cache
+def _shop_upsert_stmt(dialect_name: str):
+    table = models.ShopSpending.__table__
+    stmt = dialect_insert(dialect_name)(table)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.shop_id],
+        set_={
+            "total_amount": table.c.total_amount + excluded.total_amount,
+            "receipts_count": table.c.receipts_count + excluded.receipts_count,
+            # min/max двух значений (LEAST/GREATEST есть не во всех СУБД)
+            "first_visit": case(
+                (table.c.first_visit <= excluded.first_visit, table.c.first_visit),
+                else_=excluded.first_visit,
+            ),
+            "last_visit": case(
+                (table.c.last_visit >= excluded.last_visit, table.c.last_visit),
+                else_=excluded.last_visit,
+            ),
+        },
+    )
+
+
+def _apply_shops(db: Session, receipts: Iterable[Mapping], sign: int):
+    shops: dict[tuple, dict] = {}
+    for receipt in receipts:
+        if receipt["shop_id"] is None:
+            continue
+        date_time = receipt["date_time"]
+        row = shops.setdefault(
+            (receipt["user_id"], receipt["shop_id"]),
+            {
+                "total_amount": 0,
+                "receipts_count": 0,
+                "first_visit": date_time,
+                "last_visit": date_time,
+            },
+        )
+        row["total_amount"] += sign * (receipt["total_sum"] or 0)
+        row["receipts_count"] += sign
+        row["first_visit"] = min(row["first_visit"], date_time)
+        row["last_visit"] = max(row["last_visit"], date_time)
+
+    if not shops:
+        return
+    db.execute(
+        _shop_upsert_stmt(db.get_bind().dialect.name),
+        [
+            {"user_id": user_id, "shop_id": shop_id, **values}
+            for (user_id, shop_id), values in sorted(shops.items())
+        ],
+    )
+    if sign < 0:
+        # Даты визитов нельзя "вычесть" — пересчитываем их по оставшимся чекам
+        for user_id, shop_id in shops:
+            _refresh_shop_visits(db, user_id, shop_id)
+
+
+def _refresh_shop_visits(db: Session, user_id: int, shop_id: int):
+    Receipt = models.Receipt
+
+    def visit(aggregate):
+        return (
+            select(aggregate(Receipt.date_time))
+            .where(Receipt.user_id == user_id, Receipt.shop_id == shop_id)
+            .scalar_subquery()
+        )
+
+    db.execute(
+        update(models.ShopSpending)
+        .where(
+            models.ShopSpending.user_id == user_id,
+            models.ShopSpending.shop_id == shop_id,
+        )
+        .values(first_visit=visit(func.min), last_visit=visit(func.max))
+    )
+
+
+def forget_shop(db: Session, shop_id: int):
+    """Удаляет агрегаты магазина (перед удалением самого магазина)"""
+    touch_shop_users(db, shop_id)
+    db.execute(
+        delete(models.ShopSpending).where(models.ShopSpending.shop_id == shop_id)
+    )
+
+
+# --- ВЕРСИИ ДАННЫХ ПОЛЬЗОВАТЕЛЕЙ ---
+@lru_cache
+def _version_upsert_stmt(dialect_name: str):
+    table = models.UserDataVersion.__table__
+    stmt = dialect_insert(dialect_name)(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            "version": table.c.version + 1,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+
+def _touch_users(db: Session, user_ids: Iterable[int]):
+    """Увеличивает версии данных пользователей (ETag и кеш аналитики)"""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    now = datetime.now(timezone.utc)
+    db.execute(
+        _version_upsert_stmt(db.get_bind().dialect.name),
+        [{"user_id": user_id, "version": 1, "updated_at": now} for user_id in user_ids],
+    )
+
+
+def touch_shop_users(db: Session, shop_id: int):
+    """Отмечает изменение у всех пользователей со статистикой по магазину"""
+    _touch_users(
+        db,
+        db.scalars(
+            select(models.ShopSpending.user_id).where(
+                models.ShopSpending.shop_id == shop_id
+            )
+        ),
+    )
+
+
+# --- ОБНОВЛЕНИЕ ВМЕСТЕ С ЧЕКАМИ ---
+def apply_receipts(db: Session, receipts: Iterable[Mapping]):
+    """
+    Добавляет новые чеки во все rollup-таблицы.
+
+    Вызывается внутри транзакции, которая создает чеки: суммы меняются
+    атомарным UPSERT (x = x + delta), поэтому параллельные загрузки
+    не теряют обновления.
+
+    Args:
+        receipts: Значения чеков (user_id, shop_id, date_time и суммы) —
+            словари в формате crud._receipt_values.
+    """
+    receipts = list(receipts)
+    _apply_monthly(db, receipts, sign=1)
+    _apply_shops(db, receipts, sign=1)
+    _touch_users(db, (r["user_id"] for r in receipts))
+
+
+def remove_receipts(db: Session, receipts: Iterable[Mapping]):
+    """
+    Вычитает удаленные чеки из rollup-таблиц.
+    Вызывается после удаления чеков (flush), в той же транзакции.
+    """
+    receipts = list(receipts)
+    _apply_monthly(db, receipts, sign=-1)
+    _apply_shops(db, receipts, sign=-1)
+    _touch_users(db, (r["user_id"] for r in receipts))
+
+
+# --- ПЕРЕСЧЕТ С НУЛЯ ---
+def rebuild_monthly_spending(db: Session, user_id: int | None = None):
+    """Пересчитывает траты по месяцам с нуля (для всех или одного пользователя)"""
+    Receipt = models.Receipt
+    MonthlySpending = models.MonthlySpending
+
+    cleanup = delete(MonthlySpending)
+    source = select(
+        Receipt.user_id,
+        extract("year", Receipt.date_time).label("year"),
+        extract("month", Receipt.date_time).label("month"),
+        func.count(Receipt.id),
+        *(func.coalesce(func.sum(getattr(Receipt, f)), 0) for f in SUM_FIELDS),
+    ).group_by(Receipt.user_id, "year", "month")
+    if user_id is not None:
+        cleanup = cleanup.where(MonthlySpending.user_id == user_id)
+        source = source.where(Receipt.user_id == user_id)
+    _invalidate_rebuilt(db, user_id)
+
+    db.execute(cleanup)
+    db.execute(
+        insert(MonthlySpending).from_select(
+            ["user_id", "year", "month", "receipts_count", *SUM_FIELDS], source
+        )
+    )
+    db.commit()
+
+
+def rebuild_shop_spending(db: Session, user_id: int | None = None):
+    """Пересчитывает траты по магазинам с нуля (для всех или одного пользователя)"""
+    Receipt = models.Receipt
+    ShopSpending = models.ShopSpending
+
+    cleanup = delete(ShopSpending)
+    source = (
+        select(
+            Receipt.user_id,
+            Receipt.shop_id,
+            func.coalesce(func.sum(Receipt.total_sum), 0),
+            func.count(Receipt.id),
+            func.min(Receipt.date_time),
+            func.max(Receipt.date_time),
+        )
+        .where(Receipt.shop_id.is_not(None))
+        .group_by(Receipt.user_id, Receipt.shop_id)
+    )
+    if user_id is not None:
+        cleanup = cleanup.where(ShopSpending.user_id == user_id)
+        source = source.where(Receipt.user_id == user_id)
+    _invalidate_rebuilt(db, user_id)
+
+    db.execute(cleanup)
+    db.execute(
+        insert(ShopSpending).from_select(
+            [
+                "user_id",
+                "shop_id",
+                "total_amount",
+                "receipts_count",
+                "first_visit",
+                "last_visit",
+            ],
+            source,
+        )
+    )
+    db.commit()
+
+
+def _invalidate_rebuilt(db: Session, user_id: int | None):
+    if user_id is None:
+        _touch_users(db, db.scalars(select(models.User.id)))
+    else:
+        _touch_users(db, [user_id])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересчет rollup-таблиц аналитики")
+    parser.add_argument("--user-id", type=int, help="только этот пользователь")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        rebuild_monthly_spending(db, user_id=args.user_id)
+        rebuild_shop_spending(db, user_id=args.user_id)
+    print("monthly_spending, shop_spending rebuilt")
+
+
+if __name__ == "__main__":
+    main()
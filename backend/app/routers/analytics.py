@@ -1,77 +1,171 @@
-from typing import List
+from datetime import date, timedelta
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from dateutil.relativedelta import relativedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
 
-from .. import schemas, services
-from ..database import get_db
-from ..dependencies import get_current_user
-from ..models import User
+from .. import analytics_cache, schemas, services
+from ..database import Database, get_db
+from ..dependencies import check_not_modified, get_current_user
+from ..schemas import User
 
-router = APIRouter(prefix="/analytics", tags=["analytics"])
+# Все ответы зависят только от данных пользователя: ETag и 304 (см. check_not_modified)
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"],
+    dependencies=[Depends(check_not_modified)],
+)
 
 
 @router.get("/total-sums", response_model=schemas.TotalSums)
-def get_total_sum(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+async def get_total_sum(
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_db),
+    data_version: int = Depends(check_not_modified),
 ):
-    return services.get_user_total_sum(db, user_id=current_user.id)
+    return await analytics_cache.cached(
+        current_user.id,
+        data_version,
+        "total-sums",
+        schemas.TotalSums,
+        lambda: db.run(services.get_user_total_sum, user_id=current_user.id),
+    )
+
+
+@router.get("/dashboard", response_model=schemas.Dashboard)
+async def get_dashboard(
+    receipts_limit: int = Query(50, ge=0, le=100, description="Последних чеков"),
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_db),
+    data_version: int = Depends(check_not_modified),
+):
+    """
+    Все данные главной страницы одним запросом: итоги за все время, текущий
+    месяц, динамика за текущий год и последние чеки (как view=summary).
+    """
+    today = date.today()
+    return await analytics_cache.cached(
+        current_user.id,
+        data_version,
+        "dashboard",
+        schemas.Dashboard,
+        lambda: db.run(
+            services.get_dashboard,
+            user_id=current_user.id,
+            year=today.year,
+            month=today.month,
+            receipts_limit=receipts_limit,
+        ),
+        year=today.year,
+        month=today.month,
+        receipts_limit=receipts_limit,
+    )
 
 
 @router.get("/monthly-dynamics", response_model=List[schemas.MonthlyDynamics])
-def get_monthly_dynamics(
+async def get_monthly_dynamics(
     year: int = Query(2026, description="Год для анализа"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_db),
+    data_version: int = Depends(check_not_modified),
+):
+    return await analytics_cache.cached(
+        current_user.id,
+        data_version,
+        "monthly-dynamics",
+        List[schemas.MonthlyDynamics],
+        lambda: db.run(
+            services.get_monthly_dynamics, user_id=current_user.id, year=year
+        ),
+        year=year,
+    )
+
+
+# Ограничение размера ответа: 1000 интервалов — почти 3 года по дням
+MAX_TIMESERIES_BUCKETS = 1000
+_BUCKET_DAYS = {"day": 1, "week": 7, "month": 28, "quarter": 90}
+
+
+@router.get("/timeseries", response_model=List[schemas.TimeSeriesPoint])
+async def get_timeseries(
+    date_from: Optional[date] = Query(
+        None, alias="from", description="Начало периода (по умолчанию год назад)"
+    ),
+    date_to: Optional[date] = Query(
+        None, alias="to", description="Конец периода, не включая (по умолчанию завтра)"
+    ),
+    granularity: Literal["day", "week", "month", "quarter"] = Query("month"),
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_db),
+    data_version: int = Depends(check_not_modified),
 ):
-    results = services.get_monthly_dynamics(db, user_id=current_user.id, year=year)
+    """
+    Траты за произвольный период [from, to) по дням, неделям, месяцам или
+    кварталам. Интервалы без чеков возвращаются с нулями.
+    """
+    date_to = date_to or date.today() + timedelta(days=1)
+    date_from = date_from or date_to - relativedelta(years=1)
 
-    return [
-        {
-            "month": r.month,
-            "receipts_count": r.receipts_count,
-            "total_sum": r.total_sum,
-            "cash_total_sum": r.cash_total_sum,
-            "ecash_total_sum": r.ecash_total_sum,
-        }
-        for r in results
-    ]
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="'from' must be earlier than 'to'")
+    if (date_to - date_from).days / _BUCKET_DAYS[granularity] > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail="Period is too long for this granularity",
+        )
+
+    return await analytics_cache.cached(
+        current_user.id,
+        data_version,
+        "timeseries",
+        List[schemas.TimeSeriesPoint],
+        lambda: db.run(
+            services.get_timeseries,
+            user_id=current_user.id,
+            date_from=date_from,
+            date_to=date_to,
+            granularity=granularity,
+        ),
+        date_from=date_from,
+        date_to=date_to,
+        granularity=granularity,
+    )
 
 
 @router.get("/top-products", response_model=List[schemas.ProductTop])
-def get_top_products(
+async def get_top_products(
     months: int = Query(3, ge=1, le=26),
     limit: int = Query(10, ge=1, le=50),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_db),
+    data_version: int = Depends(check_not_modified),
 ):
-    results = services.get_top_products_by_period(
-        db, user_id=current_user.id, months_back=months, limit=limit
+    return await analytics_cache.cached(
+        current_user.id,
+        data_version,
+        "top-products",
+        List[schemas.ProductTop],
+        lambda: db.run(
+            services.get_top_products_by_period,
+            user_id=current_user.id,
+            months_back=months,
+            limit=limit,
+        ),
+        months=months,
+        limit=limit,
     )
-    return [
-        {
-            "name": r.name,
-            "total_sum": r.total_sum,
-            "total_quantity": r.total_quantity,
-            "measure": r.measure,
-        }
-        for r in results
-    ]
 
 
 @router.get("/store-stats", response_model=List[schemas.StoreStat])
-def get_store_stats(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+async def get_store_stats(
+    current_user: User = Depends(get_current_user),
+    db: Database = Depends(get_db),
+    data_version: int = Depends(check_not_modified),
 ):
-    results = services.get_spending_by_retail_shops(db, user_id=current_user.id)
-    return [
-        {
-            "id": r.id,
-            "retail_name": r.retail_name,
-            "legal_name": r.legal_name,
-            "total_amount": r.total_amount,
-            "receipts_count": r.receipts_count,
-            "receipt_avg": r.receipt_avg,
-        }
-        for r in results
-    ]
+    return await analytics_cache.cached(
+        current_user.id,
+        data_version,
+        "store-stats",
+        List[schemas.StoreStat],
+        lambda: db.run(services.get_spending_by_retail_shops, user_id=current_user.id),
+    )
@@ -1,32 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 from datetime import timedelta
 from .. import crud, schemas, auth
-from ..database import get_db
+from ..database import Database, get_db
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 
 @router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: Database = Depends(get_db)):
     # 1. Проверяем существование пользователя
-    db_user = crud.get_user_by_email(db, email=str(user.email))
+    db_user = await db.run(crud.get_user_by_email, email=str(user.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    # 2. Создаем нового пользователя
-    return crud.create_user(db=db, user=user)
+    # 2. Создаем нового пользователя (хэш считается в отдельном пуле)
+    password_hash = await auth.hash_password_async(user.password)
+    return await db.run(crud.create_user, user=user, password_hash=password_hash)
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(user: schemas.UserLogin, db: Database = Depends(get_db)):
     # 1. Ищем пользователя по email
-    db_user = crud.get_user_by_email(db, email=str(user.email))
+    db_user = await db.run(crud.get_user_by_email, email=str(user.email))
 
-    # 2. Проверяем пароль
-    if not db_user or not auth.verify_password(user.password, db_user.password_hash):
+    # 2. Проверяем пароль (bcrypt медленный — считаем в отдельном пуле)
+    if not db_user or not await auth.verify_password_async(
+        user.password, db_user.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -40,12 +42,19 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
             detail="User account is disabled"
         )
 
-    # 4. Генерация токена
+    # 4. Если сменилась стоимость bcrypt — пересчитываем хэш, пока знаем пароль.
+    # id запоминаем заранее: после коммита атрибуты db_user просрочены
+    user_id = db_user.id
+    if auth.needs_rehash(db_user.password_hash):
+        password_hash = await auth.hash_password_async(user.password)
+        await db.run(crud.set_user_password_hash, user_id, password_hash)
+
+    # 5. Генерация токена
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
 
     # ВАЖНО: Используем db_user.id (так как в модели поле называется 'id')
     access_token = auth.create_access_token(
-        data={"sub": str(db_user.id)},
+        data={"sub": str(user_id)},
         expires_delta=access_token_expires
     )
 
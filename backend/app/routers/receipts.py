@@ -1,55 +1,163 @@
-import json
-from typing import List
-
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+import re
+from datetime import date, datetime, time
+from typing import List, Literal, Optional, Union
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
 from sqlalchemy.orm import Session
 
-from .. import crud, models, schemas
-from ..database import get_db
+from .. import crud, ingestion, jobs, pagination, schemas, search
+from ..database import Database, get_db
 
 # Зависимость для получения текущего юзера из JWT
-from ..dependencies import get_current_user
+from ..dependencies import check_not_modified, get_current_user
 
 router = APIRouter(prefix="/receipts", tags=["receipts"])
 
 
+# Схемы собираются внутри сессии: позиции чека (items) подгружаются лениво,
+# а в асинхронном режиме ленивая загрузка возможна только внутри run_sync
+def _create_receipt(db: Session, receipt_data: dict, user_id: int):
+    receipt = crud.create_receipt_full(db, receipt_data, user_id=user_id)
+    return schemas.Receipt.model_validate(receipt)
+
+
+def _read_receipts(db: Session, user_id: int, skip: int, limit: int, after, view):
+    if view == "summary":
+        rows = crud.get_user_receipt_summaries(
+            db, user_id=user_id, skip=skip, limit=limit, after=after
+        )
+        return [schemas.ReceiptSummary.model_validate(r) for r in rows]
+    receipts = crud.get_user_receipts(
+        db, user_id=user_id, skip=skip, limit=limit, after=after
+    )
+    return [schemas.Receipt.model_validate(r) for r in receipts]
+
+
 @router.post("/", response_model=schemas.Receipt)
-def create_receipt(
+async def create_receipt(
     receipt_data: dict,  # Или schemas.ReceiptCreate если плоский JSON
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
 ):
     """
     Создание чека вручную через передачу JSON-тела запроса.
     """
-    return crud.create_receipt_full(db, receipt_data, user_id=current_user.id)
+    return await db.run(_create_receipt, receipt_data, user_id=current_user.id)
 
 
-@router.get("/", response_model=List[schemas.Receipt])
-def read_receipts(
+@router.get(
+    "/",
+    response_model=Union[List[schemas.Receipt], List[schemas.ReceiptSummary]],
+    dependencies=[Depends(check_not_modified)],
+)
+async def read_receipts(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor из ответа"),
+    view: Literal["full", "summary"] = Query(
+        "full", description="summary — без позиций, с их количеством"
+    ),
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
 ):
     """
     Получение списка чеков текущего пользователя с пагинацией.
+    Следующая страница — по курсору из заголовка X-Next-Cursor.
+    view=summary — только заголовки чеков с названием магазина и количеством
+    позиций (один запрос, для дашборда и списков).
     """
-    receipts = crud.get_user_receipts(
-        db, user_id=current_user.id, skip=skip, limit=limit
+    after = None
+    if cursor is not None:
+        after = tuple(pagination.decode_cursor(cursor, datetime.fromisoformat, int))
+
+    # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+    receipts = await db.run(
+        _read_receipts, current_user.id, skip, limit + 1, after, view
     )
+    if len(receipts) > limit:
+        receipts = receipts[:limit]
+        last = receipts[-1]
+        pagination.set_next_cursor(
+            response, pagination.encode_cursor(last.date_time.isoformat(), last.id)
+        )
     return receipts
 
 
-@router.post("/upload-json")
+def _search_items(db: Session, user_id: int, **params):
+    rows = search.search_items(db, user_id, **params)
+    return [schemas.ItemSearchResult.model_validate(r) for r in rows]
+
+
+@router.get(
+    "/search",
+    response_model=List[schemas.ItemSearchResult],
+    dependencies=[Depends(check_not_modified)],
+)
+async def search_receipt_items(
+    q: str = Query(..., min_length=2, max_length=200, description="Товар или магазин"),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to", description="Не включая"),
+    shop_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """
+    Поиск покупок по названию товара (с учетом словоформ и опечаток) или
+    магазина. Результаты — позиции чеков, от более релевантных к менее.
+    """
+    if not re.search(r"\w", q):
+        raise HTTPException(status_code=400, detail="Empty search query")
+    return await db.run(
+        _search_items,
+        current_user.id,
+        query=q,
+        date_from=date_from and datetime.combine(date_from, time.min),
+        date_to=date_to and datetime.combine(date_to, time.min),
+        shop_id=shop_id,
+        skip=skip,
+        limit=limit,
+    )
+
+
+@router.delete("/{receipt_id}")
+async def delete_receipt(
+    receipt_id: int,
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """
+    Удаление чека текущего пользователя вместе с позициями.
+    """
+    if not await db.run(crud.delete_receipt, receipt_id, user_id=current_user.id):
+        raise HTTPException(status_code=404, detail="Чек не найден")
+    return {"status": "success", "message": "Чек удален"}
+
+
+@router.post(
+    "/upload-json",
+    response_model=schemas.IngestJob,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def upload_json_file(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: schemas.User = Depends(get_current_user),
 ):
     """
     Загрузка файла чека (JSON).
-    Принимает файл, парсит его и сохраняет в базу.
+    Сохраняет файл и ставит его в очередь на разбор; сразу возвращает задачу,
+    прогресс и результаты которой доступны через GET /receipts/jobs/{job_id}.
     """
     if file.filename is None:
         raise HTTPException(status_code=400, detail="Filename is missing")
@@ -57,41 +165,19 @@ async def upload_json_file(
     if not file.filename.endswith(".json"):
         raise HTTPException(status_code=400, detail="Only JSON files are allowed")
 
-    try:
-        # Читаем содержимое файла
-        contents = await file.read()
-        data = json.loads(contents)
-
-        # Если в файле список чеков (ака [{}] )
-        if isinstance(data, list):
-            # Берем первый чек из списка для обработки
-            # TODO: можно сделать цикл
-            receipt_json = data[0]
-        else:
-            receipt_json = data
-
-        # Вызываем CRUD метод для сохранения
-        receipt = crud.create_receipt_full(db, receipt_json, user_id=current_user.id)
-
-        # Получаем данные для ответа
-        ticket_data = (
-            receipt_json.get("ticket", {}).get("document", {}).get("receipt", {})
-        )
+    path = await ingestion.spool_upload(ingestion.aiter_upload_chunks(file))
+    return await jobs.queue.submit(current_user.id, path, filename=file.filename)
 
-        return {
-            "status": "success",
-            "message": "Receipt uploaded successfully",
-            "receipt_id": receipt.id,
-            "external_id": receipt.external_id,
-            "items_processed": len(receipt.items),
-            "items_in_file": len(ticket_data.get("items", [])),
-        }
-
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON format")
-    except Exception as e:
-        # Логируем ошибку для отладки
-        print(f"Error processing file: {e}")
-        raise HTTPException(
-            status_code=500, detail=f"Error processing receipt: {str(e)}"
-        )
+
+@router.get("/jobs/{job_id}", response_model=schemas.IngestJob)
+async def read_upload_job(
+    job_id: str,
+    current_user: schemas.User = Depends(get_current_user),
+):
+    """
+    Статус фоновой загрузки: прогресс и результаты по каждому чеку.
+    """
+    job = await jobs.queue.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
@@ -1,104 +1,121 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 
-from .. import models, schemas, services
-from ..database import get_db
-from ..dependencies import get_current_user
+from .. import cache, crud, pagination, schemas, services
+from ..database import Database, get_db
+from ..dependencies import check_not_modified, get_current_user
 
 router = APIRouter(prefix="/stores", tags=["stores"])
 
 
-# GET /stores?skip=0&limit=100
-@router.get("/", response_model=List[schemas.Shop])
-def read_stores(
+# GET /stores?skip=0&limit=100 | ?cursor=...
+@router.get(
+    "/",
+    response_model=List[schemas.Shop],
+    dependencies=[Depends(check_not_modified)],
+)
+async def read_stores(
+    response: Response,
     sort_by: str = "total_amount",
     descending: bool = True,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    limit: int = Query(100, ge=1, le=500),
+    page: Optional[int] = None,
+    page_size: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor из ответа"),
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
 ):
-    return services.get_spending_by_retail_shops(
-        db, user_id=current_user.id, sort_by=sort_by, descending=descending
+    """
+    Магазины пользователя с тратами. Страницы — по skip/limit, page/page_size
+    или по курсору из заголовка X-Next-Cursor (без OFFSET, для глубоких страниц).
+    Курсор действителен только для той же сортировки.
+    """
+    if sort_by not in services.STORE_SORT_TYPES:
+        sort_by = "total_amount"
+    if page_size is not None:
+        # page/page_size от фронтенда и бота (страницы с 1, 0 — тоже первая)
+        limit, skip = page_size, (max(page or 1, 1) - 1) * page_size
+
+    after = None
+    if cursor is not None:
+        cursor_sort, cursor_descending, value, shop_id = pagination.decode_cursor(
+            cursor, str, bool, services.STORE_SORT_TYPES[sort_by], int
+        )
+        if (cursor_sort, cursor_descending) != (sort_by, descending):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after, skip = (value, shop_id), None
+
+    stores = await db.run(
+        services.get_spending_by_retail_shops,
+        user_id=current_user.id,
+        sort_by=sort_by,
+        descending=descending,
+        offset=skip,
+        limit=limit + 1,
+        after=after,
     )
+    if len(stores) > limit:
+        stores = stores[:limit]
+        pagination.set_next_cursor(
+            response,
+            pagination.encode_cursor(
+                sort_by, descending, *services.store_sort_key(stores[-1], sort_by)
+            ),
+        )
+    return stores
 
 
 # GET /stores/stats
-@router.get("/stats", response_model=List[schemas.StoreStat])
-def get_stores_stats(
-    db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)
+@router.get(
+    "/stats",
+    response_model=List[schemas.StoreStat],
+    dependencies=[Depends(check_not_modified)],
+)
+async def get_stores_stats(
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
 ):
     # Используем метод, который мы уже писали в services
-    return services.get_spending_by_retail_shops(db, user_id=current_user.id)
+    return await db.run(services.get_spending_by_retail_shops, user_id=current_user.id)
 
 
 # POST /stores/
 @router.post("/", response_model=schemas.Shop)
-def create_manual_store(
+async def create_manual_store(
     store_data: dict,  # Фронт шлет кастомный JSON
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
 ):
     # Логика сохранения магазина, созданного вручную на фронте
-    new_shop = models.Shop(
-        retail_name=store_data.get("name"),
-        legal_name=store_data.get("chain_name", "Unknown"),
-        address=store_data.get("address"),
-        category=store_data.get("category"),
-        is_favorite=store_data.get("is_favorite", False),
-        notes=store_data.get("notes"),
-        inn="0000000000",  # Заглушка, если ИНН не пришел с фронта
-    )
-    db.add(new_shop)
-    db.commit()
-    db.refresh(new_shop)
-    return new_shop
+    return await db.run(crud.create_manual_shop, store_data)
 
 
 @router.put("/{store_id}", response_model=schemas.Shop)
-def update_store(
+async def update_store(
     store_id: int,
     store_data: dict,  # Принимаем данные от фронта
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
 ):
-    # 1. Ищем магазин в базе
-    query = select(models.Shop).where(models.Shop.id == store_id)
-    db_shop = db.execute(query).scalar_one_or_none()
-
+    db_shop = await db.run(crud.update_shop, store_id, store_data)
     if not db_shop:
         raise HTTPException(status_code=404, detail="Магазин не найден")
 
-    # 2. Обновляем поля, сопоставляя имена фронтенда с именами бэкенда
-    if "category" in store_data:
-        db_shop.category = store_data["category"]
-    if "is_favorite" in store_data:
-        db_shop.is_favorite = store_data["is_favorite"]
-    if "notes" in store_data:
-        db_shop.notes = store_data["notes"]
-
-    # 3. Сохраняем изменения
-    db.commit()
-    db.refresh(db_shop)
-
+    # Сбрасываем магазин из кеша ID
+    cache.forget_shop(store_id)
     return db_shop
 
 
 @router.delete("/{store_id}")
-def delete_store(
+async def delete_store(
     store_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Database = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
 ):
-    query = select(models.Shop).where(models.Shop.id == store_id)
-    db_shop = db.execute(query).scalar_one_or_none()
-
-    if not db_shop:
+    if not await db.run(crud.delete_shop, store_id):
         raise HTTPException(status_code=404, detail="Магазин не найден")
 
-    db.delete(db_shop)
-    db.commit()
+    cache.forget_shop(store_id)
     return {"status": "success", "message": "Магазин удален"}
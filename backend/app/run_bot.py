@@ -5,11 +5,16 @@ from aiogram import Bot, Dispatcher
 from aiogram.types import BotCommand
 from dotenv import load_dotenv
 
+from app import jobs, metrics
+from app.bot.db import database
 from app.bot.handlers import router
-from app.bot.middleware import DbSessionMiddleware
+from app.bot.middleware import DbSessionMiddleware, UpdateMetricsMiddleware
 
 load_dotenv()
 
+# Порт /metrics бота (Prometheus); не задан — сервер метрик не запускается
+BOT_METRICS_PORT = os.getenv("BOT_METRICS_PORT")
+
 
 async def set_commands(bot: Bot):
     commands = [
@@ -33,8 +38,10 @@ async def main():
     # 2. Регистрация мидлвари
     # Здесь мы не вызываем SessionLocal напрямую,
     # его использует сама мидлварь внутри себя
-    # # Попробуй зарегистрировать именно на message
-    dp.message.outer_middleware(DbSessionMiddleware())
+    # Внутренняя мидлварь: вызывается после фильтров, когда хэндлер уже выбран
+    dp.message.middleware(DbSessionMiddleware())
+    # Внешняя мидлварь апдейтов: время обработки для /metrics
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
 
     # 3. Регистрация роутера с хэндлерами
     dp.include_router(router)
@@ -42,10 +49,21 @@ async def main():
     print("🚀 Бот запущен в режиме Polling...")
     print("Отправь JSON-файл боту для проверки.")
 
+    # 4. Пул воркеров фоновой загрузки чеков
+    await jobs.queue.start()
+
+    metrics_runner = None
+    if BOT_METRICS_PORT:
+        metrics_runner = await metrics.serve("0.0.0.0", int(BOT_METRICS_PORT))
+
     try:
         await dp.start_polling(bot)
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await jobs.queue.stop()
         await bot.session.close()
+        database.close()
 
 
 if __name__ == "__main__":
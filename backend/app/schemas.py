@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
@@ -64,6 +64,8 @@ class Shop(BaseModel):
     total_amount: Optional[int] = None
     receipts_count: Optional[int] = None
     receipt_avg: Optional[float] = None
+    first_visit: Optional[datetime] = None
+    last_visit: Optional[datetime] = None
 
     inn: str
     address: Optional[str] = None
@@ -76,11 +78,13 @@ class StoreStat(BaseModel):
     model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
     id: int
-    retail_name: str
+    retail_name: Optional[str] = None
     legal_name: str
     total_amount: int
     receipts_count: int
     receipt_avg: Optional[float] = 0
+    first_visit: Optional[datetime] = None
+    last_visit: Optional[datetime] = None
 
 
 # --- ЧЕК ---
@@ -114,6 +118,63 @@ class Receipt(ReceiptBase):
     items: List[ReceiptItem]
 
 
+class ReceiptSummary(ReceiptBase):
+    """Чек в списке без позиций (GET /receipts?view=summary)"""
+
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    shop_id: int
+    shop_name: Optional[str] = None
+    shop_legal_name: Optional[str] = None
+    cashier_name: Optional[str] = None
+    items_count: int
+
+
+class ItemSearchResult(BaseModel):
+    """Найденная позиция чека (GET /receipts/search)"""
+
+    model_config = ConfigDict(from_attributes=True)
+    item_id: int
+    receipt_id: int
+    name: str
+    price: int
+    quantity: float
+    sum: int
+    measure: Optional[str] = None
+    date_time: datetime
+    shop_id: int
+    shop_name: Optional[str] = None
+    rank: float
+
+
+class ReceiptUploadResult(BaseModel):
+    """Результат загрузки одного чека из пакета"""
+
+    index: int
+    external_id: Optional[str] = None
+    status: Literal["created", "duplicate", "failed"]
+    receipt_id: Optional[int] = None
+    items_count: int = 0
+    error: Optional[str] = None
+
+
+class IngestJob(BaseModel):
+    """Задача фоновой загрузки файла с чеками"""
+
+    id: str
+    status: Literal["queued", "running", "done", "failed"] = "queued"
+    filename: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    processed: int = 0
+    created: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+    results: List[ReceiptUploadResult] = []
+
+
 # --- ПОЛЬЗОВАТЕЛЬ ---
 class UserBase(BaseModel):
     email: EmailStr
@@ -180,8 +241,34 @@ class MonthlyDynamics(BaseModel):
     cash_total_sum: int
 
 
+class Dashboard(BaseModel):
+    """Главная страница: итоги, текущий месяц, динамика за год и последние чеки"""
+
+    year: int
+    totals: TotalSums
+    current_month: MonthlyDynamics
+    monthly: List[MonthlyDynamics]
+    recent_receipts: List[ReceiptSummary]
+
+
+class TimeSeriesPoint(BaseModel):
+    period_start: date
+    receipts_count: int
+    total_sum: int
+    cash_total_sum: int
+    ecash_total_sum: int
+
+
 class ProductTop(BaseModel):
     name: str
     total_sum: float
     total_quantity: float
     measure: str
+
+
+class SlowQueryLogSettings(BaseModel):
+    """Переключение журнала медленных запросов (PUT /health/slow-queries)"""
+
+    enabled: bool
+    threshold_ms: Optional[float] = Field(None, ge=0, description="Порог, мс")
+    explain: Optional[bool] = Field(None, description="Снимать планы запросов")
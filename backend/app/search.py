@@ -0,0 +1,275 @@
+"""
+Поиск покупок по названиям товаров (и магазинов) в чеках пользователя.
+
+Индексируется справочник товаров (products), а не позиции чеков: названий
+в нем на порядки меньше, позиции находятся по product_id.
+
+PostgreSQL: GIN-индексы по to_tsvector('russian', name) — с морфологией
+("молока" находит "Молоко ...") — и по триграммам pg_trgm для опечаток и
+частей слов. Названия магазинов ищутся по триграммному индексу.
+SQLite: таблица FTS5 products_fts (external content), которую
+поддерживают триггеры на products; слова ищутся по префиксу.
+Названия магазинов пользователя в SQLite сравниваются в Python (casefold):
+LIKE там не учитывает регистр только для латиницы.
+
+Индексы создает первая миграция (alembic upgrade head, migrations/).
+Восстановить недостающие на существующей базе (идемпотентно, из каталога
+backend):
+    python -m app.search
+"""
+
+import re
+from datetime import datetime
+
+from sqlalchemy import (
+    Connection,
+    Float,
+    cast,
+    column,
+    false,
+    func,
+    literal,
+    literal_column,
+    select,
+    table,
+    text,
+    union_all,
+)
+from sqlalchemy.orm import Session
+
+from . import models
+
+FTS_TABLE = "products_fts"
+# Индексы PostgreSQL, которых нет в моделях (см. include_object в migrations/env.py)
+SEARCH_INDEXES = (
+    "ix_products_name_fts",
+    "ix_products_name_trgm",
+    "ix_shops_retail_name_trgm",
+)
+
+_POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_fts ON products "
+    "USING gin (to_tsvector('russian'::regconfig, name))",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products "
+    "USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_shops_retail_name_trgm ON shops "
+    "USING gin (retail_name gin_trgm_ops)",
+)
+
+_SQLITE_TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products
+        BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END""",
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name)
+            VALUES ('delete', old.id, old.name);
+        END""",
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name
+        ON products
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name)
+            VALUES ('delete', old.id, old.name);
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END""",
+}
+
+
+_SQLITE_FTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, content='products', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+def search_index_ddl(dialect: str) -> list[str]:
+    """DDL поисковых индексов для диалекта (IF NOT EXISTS, для миграций)"""
+    if dialect == "postgresql":
+        return list(_POSTGRES_DDL)
+    if dialect == "sqlite":
+        return [_SQLITE_FTS, *_SQLITE_TRIGGERS.values()]
+    return []
+
+
+def ensure_search_index(connection: Connection):
+    """Создает недостающие поисковые индексы (таблицы уже должны существовать)"""
+    dialect = connection.dialect.name
+    existing = set()
+    if dialect == "sqlite":
+        existing = set(
+            connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE name LIKE ?", (f"{FTS_TABLE}%",)
+            ).scalars()
+        )
+    for statement in search_index_ddl(dialect):
+        connection.exec_driver_sql(statement)
+    # Индекс новый или таблицу products пересоздали без триггеров —
+    # заполняем его заново по текущим товарам
+    if dialect == "sqlite" and not {FTS_TABLE, *_SQLITE_TRIGGERS} <= existing:
+        connection.exec_driver_sql(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def _fts_query(query: str) -> str:
+    """Запрос FTS5: все слова, каждое по префиксу ("молок" -> "молок"*)"""
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _product_matches(dialect: str, query: str):
+    """Подзапрос (product_id, rank) товаров, название которых подходит под запрос"""
+    Product = models.Product
+    if dialect == "postgresql":
+        russian = literal_column("'russian'::regconfig")
+        tsvector = func.to_tsvector(russian, Product.name)
+        tsquery = func.websearch_to_tsquery(russian, query)
+        return select(
+            Product.id.label("product_id"),
+            (
+                func.ts_rank(tsvector, tsquery)
+                + func.word_similarity(query, Product.name)
+            )
+            .cast(Float)
+            .label("rank"),
+        ).where(
+            # Морфология или нечеткое совпадение слова (оба — по GIN-индексам)
+            tsvector.op("@@")(tsquery)
+            | literal(query).op("<%")(Product.name)
+        )
+
+    fts = table(FTS_TABLE, column("rowid"))
+    fts_query = _fts_query(query)
+    return select(
+        fts.c.rowid.label("product_id"),
+        # bm25 отрицателен: чем меньше, тем релевантнее
+        cast(-func.bm25(literal_column(FTS_TABLE)), Float).label("rank"),
+    ).where(
+        # В запросе без слов ("%") FTS5 искать нечего: пустой MATCH — ошибка
+        text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=fts_query)
+        if fts_query
+        else false()
+    )
+
+
+def _escape_like(value: str) -> str:
+    """Экранирует спецсимволы LIKE (для escape="\\")"""
+    return re.sub(r"([\\%_])", r"\\\1", value)
+
+
+def _shop_matches(db: Session, dialect: str, user_id: int, query: str):
+    """ID магазинов пользователя, торговое название которых содержит запрос"""
+    Shop, Receipt = models.Shop, models.Receipt
+    if dialect == "postgresql":
+        pattern = f"%{_escape_like(query)}%"
+        return select(Shop.id).where(Shop.retail_name.ilike(pattern, escape="\\"))
+
+    # LIKE и lower() в SQLite без ICU не знают регистра кириллицы, поэтому
+    # названия магазинов пользователя (их немного) сравниваются в Python
+    needle = query.casefold()
+    shops = db.execute(
+        select(Shop.id, Shop.retail_name).where(
+            Shop.id.in_(select(Receipt.shop_id).where(Receipt.user_id == user_id)),
+            Shop.retail_name.is_not(None),
+        )
+    ).all()
+    return [shop_id for shop_id, name in shops if needle in name.casefold()]
+
+
+def search_items(
+    db: Session,
+    user_id: int,
+    query: str,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    shop_id: int | None = None,
+    skip: int = 0,
+    limit: int = 50,
+):
+    """
+    Ищет позиции чеков пользователя по названию товара или магазина.
+
+    Совпадения по товару ранжируются по релевантности (ts_rank и сходство
+    триграмм в PostgreSQL, bm25 в SQLite), позиции из подходящих по названию
+    магазинов идут после них с rank = 0. Внутри одного ранга — от новых к старым.
+
+    Args:
+        query (str): Строка поиска ("молоко", "молоко простоквашино").
+        date_from, date_to: Период чека [date_from, date_to).
+        shop_id (int|None): Только этот магазин.
+        skip, limit: Страница результатов.
+
+    Returns:
+        List[Row]: Строки в формате schemas.ItemSearchResult.
+    """
+    dialect = db.get_bind().dialect.name
+    Item, Receipt, Shop = models.ReceiptItem, models.Receipt, models.Shop
+
+    # Фильтры применяются в каждой ветке, чтобы не тянуть чужие совпадения
+    filters = [Receipt.user_id == user_id]
+    if date_from is not None:
+        filters.append(Receipt.date_time >= date_from)
+    if date_to is not None:
+        filters.append(Receipt.date_time < date_to)
+    if shop_id is not None:
+        filters.append(Receipt.shop_id == shop_id)
+
+    Product = models.Product
+
+    by_product = _product_matches(dialect, query).subquery()
+    hits = union_all(
+        select(Item.id.label("item_id"), by_product.c.rank)
+        .join(Item, Item.product_id == by_product.c.product_id)
+        .join(Receipt, Receipt.id == Item.receipt_id)
+        .where(*filters),
+        select(Item.id, cast(literal(0), Float))
+        .join(Receipt, Receipt.id == Item.receipt_id)
+        .where(
+            Receipt.shop_id.in_(_shop_matches(db, dialect, user_id, query)), *filters
+        ),
+    ).subquery()
+    ranked = (
+        select(hits.c.item_id, func.max(hits.c.rank).label("rank"))
+        .group_by(hits.c.item_id)
+        .subquery()
+    )
+
+    return db.execute(
+        select(
+            Item.id.label("item_id"),
+            Item.receipt_id,
+            Product.name,
+            Item.price,
+            Item.quantity,
+            Item.sum,
+            Item.measure,
+            Receipt.date_time,
+            Receipt.shop_id,
+            Shop.retail_name.label("shop_name"),
+            ranked.c.rank,
+        )
+        .join(Item, Item.id == ranked.c.item_id)
+        .join(Product, Product.id == Item.product_id)
+        .join(Receipt, Receipt.id == Item.receipt_id)
+        .join(Shop, Shop.id == Receipt.shop_id)
+        .order_by(ranked.c.rank.desc(), Receipt.date_time.desc(), Item.id.desc())
+        .offset(skip)
+        .limit(limit)
+    ).all()
+
+
+def main():
+    from .database import engine
+
+    with engine.begin() as connection:
+        ensure_search_index(connection)
+    print(f"search index ready ({engine.dialect.name})")
+
+
+if __name__ == "__main__":
+    main()
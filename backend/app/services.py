@@ -1,66 +1,233 @@
-from datetime import date
+from datetime import date, datetime, time, timedelta
 
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import and_, extract, func, select
+from sqlalchemy import Float, cast, func, select, tuple_
 from sqlalchemy.orm import Session
 
-from . import models
+from . import crud, models
 
 
 def get_user_total_sum(db: Session, user_id: int):
-    """Общая сумма трат пользователя за все время"""
+    """Общая сумма трат пользователя за все время (по месячным агрегатам)"""
     return db.execute(
         select(
-            func.coalesce(func.sum(models.Receipt.total_sum), 0).label("total_sum"),
-            func.coalesce(func.sum(models.Receipt.cash_total_sum), 0).label(
+            func.coalesce(func.sum(models.MonthlySpending.total_sum), 0).label(
+                "total_sum"
+            ),
+            func.coalesce(func.sum(models.MonthlySpending.cash_total_sum), 0).label(
                 "cash_total_sum"
             ),
-            func.coalesce(func.sum(models.Receipt.ecash_total_sum), 0).label(
+            func.coalesce(func.sum(models.MonthlySpending.ecash_total_sum), 0).label(
                 "ecash_total_sum"
             ),
-            func.count(models.Receipt.id).label("receipts_count"),
-        ).where(models.Receipt.user_id == user_id)
+            func.coalesce(func.sum(models.MonthlySpending.receipts_count), 0).label(
+                "receipts_count"
+            ),
+        ).where(models.MonthlySpending.user_id == user_id)
     ).first()
 
 
 def get_monthly_dynamics(db: Session, user_id: int, year: int = 2026):
-    """Динамика трат по месяцам за конкретный год"""
+    """
+    Динамика трат по месяцам за конкретный год.
+    Читает rollup-таблицу (не больше 12 строк по первичному ключу), а не чеки
+    """
     return db.execute(
         select(
-            extract("month", models.Receipt.date_time).label("month"),
-            func.coalesce(func.sum(models.Receipt.total_sum), 0).label("total_sum"),
-            func.coalesce(func.sum(models.Receipt.cash_total_sum), 0).label(
-                "cash_total_sum"
-            ),
-            func.coalesce(func.sum(models.Receipt.ecash_total_sum), 0).label(
+            models.MonthlySpending.month,
+            models.MonthlySpending.total_sum,
+            models.MonthlySpending.cash_total_sum,
+            models.MonthlySpending.ecash_total_sum,
+            models.MonthlySpending.receipts_count,
+        )
+        .where(
+            models.MonthlySpending.user_id == user_id,
+            models.MonthlySpending.year == year,
+            # После удаления всех чеков месяца строка остается с нулями
+            models.MonthlySpending.receipts_count > 0,
+        )
+        .order_by(models.MonthlySpending.month)
+    ).all()
+
+
+# --- ДАШБОРД ---
+_DASHBOARD_SUMS = ("receipts_count", "total_sum", "cash_total_sum", "ecash_total_sum")
+
+
+def get_dashboard(
+    db: Session, user_id: int, year: int, month: int, receipts_limit: int = 50
+) -> dict:
+    """
+    Данные главной страницы за одно обращение к БД (одна сессия, два запроса):
+    все месячные агрегаты пользователя (из них — итоги за все время, динамика
+    за год и текущий месяц) и последние чеки в кратком виде.
+
+    Returns:
+        dict: В формате schemas.Dashboard.
+    """
+    rows = db.execute(
+        select(
+            models.MonthlySpending.year,
+            models.MonthlySpending.month,
+            *(getattr(models.MonthlySpending, field) for field in _DASHBOARD_SUMS),
+        )
+        .where(
+            models.MonthlySpending.user_id == user_id,
+            models.MonthlySpending.receipts_count > 0,
+        )
+        .order_by(models.MonthlySpending.year, models.MonthlySpending.month)
+    ).all()
+
+    totals = dict.fromkeys(_DASHBOARD_SUMS, 0)
+    monthly = []
+    current_month = {"month": month, **totals}
+    for row in rows:
+        sums = {field: row._mapping[field] for field in _DASHBOARD_SUMS}
+        for field, value in sums.items():
+            totals[field] += value
+        if row.year == year:
+            monthly.append({"month": row.month, **sums})
+            if row.month == month:
+                current_month = monthly[-1]
+
+    recent = []
+    if receipts_limit:
+        recent = crud.get_user_receipt_summaries(db, user_id, limit=receipts_limit)
+
+    return {
+        "year": year,
+        "totals": totals,
+        "current_month": current_month,
+        "monthly": monthly,
+        "recent_receipts": recent,
+    }
+
+
+# --- ВРЕМЕННЫЕ РЯДЫ ЗА ПРОИЗВОЛЬНЫЙ ПЕРИОД ---
+
+
+def _bucket_start(day: date, granularity: str) -> date:
+    """Начало интервала (день, неделя с понедельника, месяц, квартал) для даты"""
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+
+
+def _next_bucket(start: date, granularity: str) -> date:
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if granularity == "week":
+        return start + timedelta(weeks=1)
+    return start + relativedelta(months=1 if granularity == "month" else 3)
+
+
+def get_timeseries(
+    db: Session, user_id: int, date_from: date, date_to: date, granularity: str
+) -> list[dict]:
+    """
+    Траты пользователя за период [date_from, date_to) по интервалам.
+
+    Чеки выбираются диапазоном date_time >= from AND date_time < to по индексу
+    (user_id, date_time) и агрегируются в БД по дням; дни собираются в недели,
+    месяцы или кварталы уже в Python. Интервалы без чеков заполняются нулями.
+
+    Returns:
+        List[dict]: По интервалу на элемент, по возрастанию:
+            period_start, receipts_count, total_sum, cash_total_sum, ecash_total_sum.
+    """
+    Receipt = models.Receipt
+    day = func.date(Receipt.date_time)
+    rows = db.execute(
+        select(
+            day.label("day"),
+            func.count(Receipt.id).label("receipts_count"),
+            func.coalesce(func.sum(Receipt.total_sum), 0).label("total_sum"),
+            func.coalesce(func.sum(Receipt.cash_total_sum), 0).label("cash_total_sum"),
+            func.coalesce(func.sum(Receipt.ecash_total_sum), 0).label(
                 "ecash_total_sum"
             ),
-            func.count(models.Receipt.id).label("receipts_count"),
         )
-        .where(models.Receipt.user_id == user_id)
-        .where(extract("year", models.Receipt.date_time) == year)
-        .group_by("month")
-        .order_by("month")
+        .where(
+            Receipt.user_id == user_id,
+            Receipt.date_time >= datetime.combine(date_from, time.min),
+            Receipt.date_time < datetime.combine(date_to, time.min),
+        )
+        .group_by(day)
     ).all()
 
+    # Все интервалы периода, включая пустые
+    buckets: dict[date, dict] = {}
+    start = _bucket_start(date_from, granularity)
+    while start < date_to:
+        buckets[start] = {
+            "period_start": start,
+            "receipts_count": 0,
+            "total_sum": 0,
+            "cash_total_sum": 0,
+            "ecash_total_sum": 0,
+        }
+        start = _next_bucket(start, granularity)
 
-def get_top_products(db: Session, user_id: int, limit: int = 10):
-    """Топ самых покупаемых товаров (по сумме затрат)"""
-    return db.execute(
+    for row in rows:
+        # SQLite возвращает date() строкой, PostgreSQL — датой
+        row_day = date.fromisoformat(row.day) if isinstance(row.day, str) else row.day
+        bucket = buckets[_bucket_start(row_day, granularity)]
+        for field in (
+            "receipts_count",
+            "total_sum",
+            "cash_total_sum",
+            "ecash_total_sum",
+        ):
+            bucket[field] += row._mapping[field]
+
+    return list(buckets.values())
+
+
+def _top_products(db: Session, filters: list, limit: int):
+    """
+    Топ товаров по сумме затрат среди позиций чеков, подходящих под filters.
+
+    Группировка и сортировка — по целочисленному product_id и единице измерения
+    позиции в подзапросе: один товар (например, по одному GTIN) могут продавать
+    в штуках и на вес, и количества в разных единицах не складываются.
+    Названия товаров присоединяются только к limit итоговым строкам.
+    """
+    Item = models.ReceiptItem
+    totals = (
         select(
-            models.ReceiptItem.name,
-            func.sum(models.ReceiptItem.sum).label("total_sum"),
-            func.sum(models.ReceiptItem.quantity).label("total_quantity"),
-            models.ReceiptItem.measure,
+            Item.product_id,
+            Item.measure,
+            func.sum(Item.sum).label("total_sum"),
+            func.sum(Item.quantity).label("total_quantity"),
         )
         .join(models.Receipt)
-        .where(models.Receipt.user_id == user_id)
-        .group_by(models.ReceiptItem.name, models.ReceiptItem.measure)
-        .order_by(func.sum(models.ReceiptItem.sum).desc())
+        .where(*filters)
+        .group_by(Item.product_id, Item.measure)
+        .order_by(func.sum(Item.sum).desc())
         .limit(limit)
+        .subquery()
+    )
+    return db.execute(
+        select(
+            models.Product.name,
+            totals.c.total_sum,
+            totals.c.total_quantity,
+            totals.c.measure,
+        )
+        .join(totals, totals.c.product_id == models.Product.id)
+        .order_by(totals.c.total_sum.desc())
     ).all()
 
 
+def get_top_products(db: Session, user_id: int, limit: int = 10):
+    """Топ самых покупаемых товаров (по сумме затрат)"""
+    return _top_products(db, [models.Receipt.user_id == user_id], limit)
+
+
 # --- СТАТИСТИКА ПО МАГАЗИНАМ (Retail Name) ---
 def get_spending_by_retail_shops(
     db: Session,
@@ -71,11 +238,14 @@ def get_spending_by_retail_shops(
     offset: int | None = None,
     page: int | None = None,
     page_size: int | None = None,
+    after: tuple | None = None,
 ):
     """
     Возвращает статистику расходов пользователя в разрезе торговых точек.
 
-    Функция агрегирует данные по чекам, группируя их по уникальным магазинам (ID + название).
+    Данные берутся из агрегатов shop_spending (пользователь × магазин), которые
+    обновляются вместе с чеками (см. app/rollups.py), поэтому сортировка и
+    пагинация — это просмотр индекса по user_id без GROUP BY по чекам.
     Позволяет получить общую сумму трат, количество визитов и средний чек для каждой точки.
 
     Args:
@@ -97,6 +267,9 @@ def get_spending_by_retail_shops(
         page_size (int|None): Количество записей на страницу.
             Используется совместно с параметром 'page'.
             Приоритет: если задан 'page', то 'offset' и 'limit' игнорируются.
+        after (tuple|None): Курсор — (значение сортировки, ID магазина) последней
+            записи предыдущей страницы, см. store_sort_key. Страница начинается
+            сразу после нее, без OFFSET.
 
     Returns:
         List[Row]: Список объектов Row (строк БД). Каждая строка содержит атрибуты:
@@ -111,6 +284,8 @@ def get_spending_by_retail_shops(
             - total_amount (float): Сумма всех покупок.
             - receipts_count (int): Количество чеков.
             - receipt_avg (float): Средний чек.
+            - first_visit (datetime): Дата первого чека в магазине.
+            - last_visit (datetime): Дата последнего чека в магазине.
 
     Note:
         При использовании пагинации через 'page' и 'page_size':
@@ -130,6 +305,8 @@ def get_spending_by_retail_shops(
         >>>     print(f"{shop.retail_name}: {shop.total_amount} руб. (avg: {shop.receipt_avg})")
     """
     # 1. Определяем базовый запрос
+    spending = models.ShopSpending
+    receipt_avg = cast(spending.total_amount, Float) / spending.receipts_count
     stmt = (
         select(
             models.Shop.id.label("id"),
@@ -140,38 +317,40 @@ def get_spending_by_retail_shops(
             models.Shop.category.label("category"),
             models.Shop.is_favorite.label("is_favorite"),
             models.Shop.notes.label("notes"),
-            func.sum(models.Receipt.total_sum).label("total_amount"),
-            func.count(models.Receipt.id).label("receipts_count"),
-            func.avg(models.Receipt.total_sum).label("receipt_avg"),
+            spending.total_amount.label("total_amount"),
+            spending.receipts_count.label("receipts_count"),
+            receipt_avg.label("receipt_avg"),
+            spending.first_visit.label("first_visit"),
+            spending.last_visit.label("last_visit"),
         )
-        .join(models.Receipt, models.Receipt.shop_id == models.Shop.id)
-        .where(models.Receipt.user_id == user_id)
-        .group_by(models.Shop.id, models.Shop.retail_name, models.Shop.legal_name)
+        .join(models.Shop, models.Shop.id == spending.shop_id)
+        .where(spending.user_id == user_id, spending.receipts_count > 0)
     )
 
-    # 2. Применяем сортировку
-    sort_column = None
+    # 2. Применяем сортировку (ID магазина — для однозначного порядка и курсора)
     if sort_by == "id":
-        sort_column = models.Shop.id
+        sort_column = spending.shop_id
     elif sort_by == "retail_name":
-        sort_column = models.Shop.retail_name
+        sort_column = func.coalesce(models.Shop.retail_name, "")
     elif sort_by == "legal_name":
-        sort_column = models.Shop.legal_name
-    elif sort_by == "total_amount":
-        sort_column = func.sum(models.Receipt.total_sum)
+        sort_column = func.coalesce(models.Shop.legal_name, "")
     elif sort_by == "receipts_count":
-        sort_column = func.count(models.Receipt.id)
+        sort_column = spending.receipts_count
     elif sort_by == "receipt_avg":
-        sort_column = func.avg(models.Receipt.total_sum)
+        sort_column = receipt_avg
     else:
         # По умолчанию сортируем по общей сумме
-        sort_column = func.sum(models.Receipt.total_sum)
+        sort_column = spending.total_amount
+
+    if after is not None:
+        key = tuple_(sort_column, spending.shop_id)
+        stmt = stmt.where(key < tuple_(*after) if descending else key > tuple_(*after))
 
     # Применяем направление сортировки
     if descending:
-        stmt = stmt.order_by(sort_column.desc())
+        stmt = stmt.order_by(sort_column.desc(), spending.shop_id.desc())
     else:
-        stmt = stmt.order_by(sort_column.asc())
+        stmt = stmt.order_by(sort_column.asc(), spending.shop_id.asc())
 
     # 3. Применяем пагинацию
     if page is not None and page_size is not None:
@@ -193,6 +372,27 @@ def get_spending_by_retail_shops(
     return result
 
 
+# Тип значения сортировки в курсоре (для разбора курсора из запроса)
+STORE_SORT_TYPES = {
+    "id": int,
+    "retail_name": str,
+    "legal_name": str,
+    "total_amount": int,
+    "receipts_count": int,
+    "receipt_avg": float,
+}
+
+
+def store_sort_key(row, sort_by: str) -> tuple:
+    """Ключ (значение сортировки, ID) строки get_spending_by_retail_shops для курсора"""
+    if sort_by not in STORE_SORT_TYPES:
+        sort_by = "total_amount"
+    value = row._mapping[sort_by]
+    if sort_by in ("retail_name", "legal_name"):
+        value = value or ""
+    return value, row.id
+
+
 def get_total_retail_shops_count(
     db: Session,
     user_id: int,
@@ -208,10 +408,9 @@ def get_total_retail_shops_count(
     Returns:
         int: Количество уникальных магазинов.
     """
-    stmt = (
-        select(func.count(func.distinct(models.Shop.id)))
-        .join(models.Receipt, models.Receipt.shop_id == models.Shop.id)
-        .where(models.Receipt.user_id == user_id)
+    stmt = select(func.count()).where(
+        models.ShopSpending.user_id == user_id,
+        models.ShopSpending.receipts_count > 0,
     )
 
     result = db.execute(stmt).scalar()
@@ -230,22 +429,12 @@ def get_top_products_by_period(
     # requires 'python-dateutil' library: pip install python-dateutil
     start_date = end_date - relativedelta(months=months_back)
 
-    return db.execute(
-        select(
-            models.ReceiptItem.name,
-            func.sum(models.ReceiptItem.sum).label("total_sum"),
-            func.sum(models.ReceiptItem.quantity).label("total_quantity"),
-            models.ReceiptItem.measure,
-        )
-        .join(models.Receipt)
-        .where(
-            and_(
-                models.Receipt.user_id == user_id,
-                models.Receipt.date_time >= start_date,
-                models.Receipt.date_time <= end_date,
-            )
-        )
-        .group_by(models.ReceiptItem.name, models.ReceiptItem.measure)
-        .order_by(func.sum(models.ReceiptItem.sum).desc())
-        .limit(limit)
-    ).all()
+    return _top_products(
+        db,
+        [
+            models.Receipt.user_id == user_id,
+            models.Receipt.date_time >= start_date,
+            models.Receipt.date_time <= end_date,
+        ],
+        limit,
+    )
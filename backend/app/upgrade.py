@@ -0,0 +1,182 @@
+"""
+Подготовка базы, созданной до миграций, к alembic stamp 0001.
+
+Такую базу (create_all при старте API) помечают первой ревизией, а недостающие
+индексы 0001 создает ревизия 0002. Уникальные индексы магазинов и кассиров, на
+которые опирается INSERT ... ON CONFLICT при загрузке чеков
+(crud.upsert_shops / upsert_cashiers), не создаются, пока в таблицах есть
+дубликаты, поэтому их объединяют до миграций, из каталога backend;
+повторный запуск ничего не меняет:
+    python -m app.upgrade
+    alembic stamp 0001
+    alembic upgrade head
+
+Дубликаты магазинов (один ИНН) и кассиров (один ИНН, а без ИНН — одно имя)
+объединяются: остается запись с меньшим id и ее поля, чеки переводятся на
+нее, статистика магазинов пересчитывается.
+
+Базу до справочника товаров сначала переводят python -m app.products.
+"""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Connection,
+    Table,
+    bindparam,
+    delete,
+    func,
+    insert,
+    inspect,
+    select,
+    update,
+)
+
+from . import models
+from .database import Base, engine
+
+
+def _duplicates(connection: Connection, table: Table, column, where) -> dict:
+    """Дубликаты по column: id лишней записи -> id оставляемой (меньший)"""
+    keep = (
+        select(column, func.min(table.c.id).label("keep_id"))
+        .where(where)
+        .group_by(column)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    rows = connection.execute(
+        select(table.c.id, keep.c.keep_id)
+        .join(keep, column == keep.c[column.key])
+        .where(where, table.c.id != keep.c.keep_id)
+    ).all()
+    return dict(rows)
+
+
+def _repoint_receipts(connection: Connection, column: str, merged: dict):
+    receipts = models.Receipt.__table__
+    connection.execute(
+        update(receipts)
+        .where(receipts.c[column] == bindparam("old_id"))
+        .values({column: bindparam("new_id")}),
+        [{"old_id": old, "new_id": new} for old, new in merged.items()],
+    )
+
+
+def merge_duplicate_shops(connection: Connection) -> int:
+    """Объединяет магазины с одинаковым ИНН; возвращает число удаленных"""
+    shops = models.Shop.__table__
+    receipts = models.Receipt.__table__
+    merged = _duplicates(
+        connection, shops, shops.c.inn, shops.c.inn != models.MANUAL_SHOP_INN
+    )
+    if not merged:
+        return 0
+
+    affected = [*merged, *set(merged.values())]
+    user_ids = connection.scalars(
+        select(receipts.c.user_id).where(receipts.c.shop_id.in_(merged)).distinct()
+    ).all()
+    _repoint_receipts(connection, "shop_id", merged)
+
+    # Статистика по объединенным магазинам — заново по их чекам
+    spending = models.ShopSpending.__table__
+    connection.execute(delete(spending).where(spending.c.shop_id.in_(affected)))
+    connection.execute(
+        insert(spending).from_select(
+            [
+                "user_id",
+                "shop_id",
+                "total_amount",
+                "receipts_count",
+                "first_visit",
+                "last_visit",
+            ],
+            select(
+                receipts.c.user_id,
+                receipts.c.shop_id,
+                func.coalesce(func.sum(receipts.c.total_sum), 0),
+                func.count(receipts.c.id),
+                func.min(receipts.c.date_time),
+                func.max(receipts.c.date_time),
+            )
+            .where(receipts.c.shop_id.in_(set(merged.values())))
+            .group_by(receipts.c.user_id, receipts.c.shop_id),
+        )
+    )
+    # Списки магазинов этих пользователей изменились — новые ETag
+    versions = models.UserDataVersion.__table__
+    if user_ids:
+        connection.execute(
+            update(versions)
+            .where(versions.c.user_id.in_(user_ids))
+            .values(
+                version=versions.c.version + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+
+    connection.execute(delete(shops).where(shops.c.id.in_(merged)))
+    return len(merged)
+
+
+def merge_duplicate_cashiers(connection: Connection) -> int:
+    """Объединяет кассиров с одинаковым ИНН, а без ИНН — с одинаковым именем"""
+    cashiers = models.Cashier.__table__
+    merged = {
+        **_duplicates(
+            connection, cashiers, cashiers.c.inn, cashiers.c.inn.is_not(None)
+        ),
+        **_duplicates(
+            connection,
+            cashiers,
+            cashiers.c.name,
+            cashiers.c.inn.is_(None) & cashiers.c.name.is_not(None),
+        ),
+    }
+    if not merged:
+        return 0
+    _repoint_receipts(connection, "cashier_id", merged)
+    connection.execute(delete(cashiers).where(cashiers.c.id.in_(merged)))
+    return len(merged)
+
+
+def _check_tables(connection: Connection):
+    inspector = inspect(connection)
+    missing = [
+        table.name
+        for table in Base.metadata.sorted_tables
+        if not inspector.has_table(table.name)
+    ]
+    item_columns = (
+        {c["name"] for c in inspector.get_columns("receipt_items")}
+        if "receipt_items" not in missing
+        else set()
+    )
+    if missing or "name" in item_columns:
+        raise RuntimeError(
+            f"Schema is older than the models (missing tables: {missing or '-'}). "
+            "Run python -m app.products, then python -m app.rollups first."
+        )
+
+
+def merge_duplicates(connection: Connection) -> dict:
+    """Все шаги в транзакции connection; возвращает, сколько записей объединено"""
+    _check_tables(connection)
+    return {
+        "merged_shops": merge_duplicate_shops(connection),
+        "merged_cashiers": merge_duplicate_cashiers(connection),
+    }
+
+
+def main():
+    with engine.begin() as connection:
+        result = merge_duplicates(connection)
+    print(
+        f"merged {result['merged_shops']} shops, "
+        f"{result['merged_cashiers']} cashiers"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Бенчмарки и нагрузочные тесты (запуск из каталога backend: python -m benchmarks.<имя>).
+
+Скрипты импортируют app, а app.database создает engine при импорте. Без
+DATABASE_URL это PostgreSQL по умолчанию, и без драйвера (psycopg2) импорт
+падает. Поэтому базу бенчмарка задают через BENCH_DATABASE_URL: пакет
+подставляет ее в DATABASE_URL до импорта app, и ни один скрипт не работает
+с рабочей базой из окружения. Без BENCH_DATABASE_URL используется
+DATABASE_URL, например:
+    BENCH_DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.bench_suite
+"""
+
+import os
+
+if os.getenv("BENCH_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
@@ -0,0 +1,101 @@
+"""
+Бенчмарк: параллельная обработка апдейтов ботом при медленной БД.
+
+Через Dispatcher прогоняются N сообщений /stats от разных пользователей.
+Каждый SQL-запрос искусственно замедляется на --delay секунд (sleep в потоке БД),
+а Telegram API подменен заглушкой без сети. Если бы запросы выполнялись прямо
+в цикле событий, апдейты шли бы строго по очереди: N * queries * delay.
+
+Запуск (из каталога backend):
+    BENCH_DATABASE_URL=sqlite:////tmp/bench_bot.db python -m benchmarks.bench_bot_updates
+
+База очищается (drop_all/create_all) — не запускайте на рабочей БД.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from aiogram import Bot, Dispatcher
+from sqlalchemy import event
+
+from app import crud, models
+from app.bot.db import BotDatabase
+from app.bot.handlers import router
+from app.bot.middleware import DbSessionMiddleware
+from app.database import DATABASE_URL, Base
+from tests.fakes import FakeSession, make_update
+
+from .bench_upsert import load_examples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--updates", type=int, default=40)
+    parser.add_argument("--delay", type=float, default=0.05, help="задержка SQL, с")
+    parser.add_argument("--workers", type=int, default=8, help="BOT_DB_WORKERS")
+    args = parser.parse_args()
+
+    db = BotDatabase(os.getenv("BENCH_DATABASE_URL", DATABASE_URL), args.workers)
+    Base.metadata.drop_all(db.engine)
+    Base.metadata.create_all(db.engine)
+
+    # Пользователи с привязанным Telegram и по чеку у каждого
+    examples = load_examples()
+    with db.session_factory() as session:
+        for n in range(args.updates):
+            user = models.User(
+                email=f"bot{n}@example.com",
+                password_hash="-",
+                telegram_id=str(1000 + n),
+            )
+            session.add(user)
+            session.flush()
+            receipt = dict(examples[n % len(examples)], _id=f"bot-{n}")
+            crud.create_receipts_bulk(session, [receipt], user_id=user.id)
+
+    queries = 0
+
+    @event.listens_for(db.engine, "before_cursor_execute")
+    def slow_query(*_):
+        nonlocal queries
+        queries += 1
+        time.sleep(args.delay)
+
+    bot = Bot(token="42:TEST", session=FakeSession())
+    dp = Dispatcher()
+    dp.message.middleware(DbSessionMiddleware(db))
+    dp.include_router(router)
+
+    # Лаг цикла событий: насколько опаздывает тик, который должен идти каждые 10 мс
+    max_lag = 0.0
+    stop = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_lag
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - started - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(dp.feed_update(bot, make_update(n)) for n in range(args.updates))
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+
+    serial = queries * args.delay
+    print(f"updates:            {args.updates} ({bot.session.sent} replies)")
+    print(f"sql queries:        {queries} x {args.delay * 1000:.0f} ms")
+    print(f"wall time:          {elapsed:.2f} s (serial would be {serial:.2f} s)")
+    print(f"parallelism:        {serial / elapsed:.1f}x with {args.workers} DB threads")
+    print(f"max event loop lag: {max_lag * 1000:.1f} ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""
+Бенчмарк: загрузка главной страницы — три запроса против /analytics/dashboard.
+
+Сравнивает прежний сценарий useDashboardData (параллельно total-sums,
+monthly-dynamics за текущий год и 50 последних чеков view=summary) с одним
+запросом /analytics/dashboard. Приложение вызывается через httpx.ASGITransport;
+кеш аналитики выключен (ANALYTICS_CACHE_BACKEND=off), ETag не отправляется,
+поэтому каждый раз выполняются настоящие запросы к БД.
+
+Запуск (из каталога backend):
+    BENCH_DATABASE_URL=sqlite:////tmp/bench_dashboard.db \\
+        python -m benchmarks.bench_dashboard --receipts 2000 --repeats 200
+
+База очищается (drop_all/create_all) — не запускайте на рабочей БД.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+from .common import percentile
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--receipts", type=int, default=2000, help="чеков в базе")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--output", help="JSON-файл для результатов")
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте app
+    os.environ["ANALYTICS_CACHE_BACKEND"] = "off"
+
+    import httpx
+
+    from app import auth, crud, models
+    from app.database import Base, SessionLocal, engine
+    from app.main import app
+
+    from .bench_upsert import load_examples
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    examples = load_examples()
+    with SessionLocal() as db:
+        user = models.User(email="bench@example.com", password_hash="-")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        batch = [
+            dict(examples[i % len(examples)], _id=f"bench-{i}")
+            for i in range(args.receipts)
+        ]
+        crud.create_receipts_bulk(db, batch, user_id=user_id)
+
+    headers = {
+        "Authorization": f"Bearer {auth.create_access_token({'sub': str(user_id)})}"
+    }
+    year = datetime.now().year
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+
+        async def three_calls():
+            responses = await asyncio.gather(
+                client.get("/analytics/total-sums", headers=headers),
+                client.get(
+                    "/analytics/monthly-dynamics",
+                    params={"year": year},
+                    headers=headers,
+                ),
+                client.get(
+                    "/receipts/",
+                    params={"limit": 50, "view": "summary"},
+                    headers=headers,
+                ),
+            )
+            assert all(r.status_code == 200 for r in responses)
+
+        async def dashboard():
+            response = await client.get("/analytics/dashboard", headers=headers)
+            assert response.status_code == 200
+
+        results = []
+        for name, scenario in (("three calls", three_calls), ("dashboard", dashboard)):
+            await scenario()  # Прогрев: соединения и кеши компиляции SQL
+            latencies = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                await scenario()
+                latencies.append(time.perf_counter() - started)
+            results.append(
+                {
+                    "scenario": name,
+                    "p50_ms": round(statistics.median(latencies) * 1000, 2),
+                    "p95_ms": percentile(latencies, 0.95),
+                }
+            )
+
+    print(f"{args.receipts} receipts, {args.repeats} page loads per scenario")
+    for result in results:
+        print(
+            f"  {result['scenario']:<12} p50 {result['p50_ms']:>8} ms, "
+            f"p95 {result['p95_ms']:>8} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "benchmark": "dashboard",
+                    "database": engine.dialect.name,
+                    "receipts": args.receipts,
+                    "timestamp": datetime.now().isoformat(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""
+Бенчмарк: вход пользователей под нагрузкой.
+
+--concurrency клиентов параллельно выполняют POST /auth/login, а отдельный клиент
+в это время опрашивает /analytics/total-sums. Так видно и пропускную способность
+логина, и то, насколько всплеск логинов замедляет остальные запросы.
+
+Пароли засеваются со стоимостью --seed-rounds. Если она отличается от --rounds
+(BCRYPT_ROUNDS), первый вход каждого пользователя пересчитывает хэш.
+
+Запуск (из каталога backend):
+    BENCH_DATABASE_URL=sqlite:////tmp/bench_login.db \\
+        python -m benchmarks.bench_login --rounds 12 --hash-workers 4
+
+База очищается (drop_all/create_all) — не запускайте на рабочей БД.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+from .common import percentile
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="всего логинов")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument("--seed-rounds", type=int, help="стоимость исходных хэшей")
+    parser.add_argument("--hash-workers", type=int, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--output", help="JSON-файл для результатов")
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте app.auth / app.database
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    if args.hash_workers:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.hash_workers)
+
+    import bcrypt
+    import httpx
+
+    from app import auth, models
+    from app.database import Base, SessionLocal, engine
+    from app.main import app
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    password = "bench-password"
+    seed_hash = bcrypt.hashpw(
+        password.encode(), bcrypt.gensalt(rounds=args.seed_rounds or args.rounds)
+    ).decode()
+    with SessionLocal() as db:
+        db.add_all(
+            models.User(email=f"user{n}@example.com", password_hash=seed_hash)
+            for n in range(args.users)
+        )
+        db.commit()
+
+    login_latencies: list[float] = []
+    probe_latencies: list[float] = []
+    errors = 0
+    counter = iter(range(args.requests))
+    burst_done = asyncio.Event()
+    token = auth.create_access_token({"sub": "1"})
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+
+        async def login_loop():
+            nonlocal errors
+            for n in counter:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/auth/login",
+                    json={
+                        "email": f"user{n % args.users}@example.com",
+                        "password": password,
+                    },
+                )
+                login_latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        async def probe_loop():
+            headers = {"Authorization": f"Bearer {token}"}
+            while not burst_done.is_set():
+                started = time.perf_counter()
+                await client.get("/analytics/total-sums", headers=headers)
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.02)
+
+        probe = asyncio.create_task(probe_loop())
+        started = time.perf_counter()
+        await asyncio.gather(*(login_loop() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        burst_done.set()
+        await probe
+
+    with SessionLocal() as db:
+        hashes = [u.password_hash for u in db.query(models.User)]
+    rehashed = sum(not auth.needs_rehash(h) for h in hashes) if args.seed_rounds else 0
+
+    result = {
+        "rounds": args.rounds,
+        "seed_rounds": args.seed_rounds or args.rounds,
+        "hash_workers": auth.PASSWORD_HASH_WORKERS,
+        "concurrency": args.concurrency,
+        "logins": len(login_latencies),
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(len(login_latencies) / elapsed, 1),
+        "login_p50_ms": round(statistics.median(login_latencies) * 1000, 1),
+        "login_p95_ms": percentile(login_latencies, 0.95),
+        "other_p50_ms": round(statistics.median(probe_latencies) * 1000, 1),
+        "other_p95_ms": percentile(probe_latencies, 0.95),
+        "rehashed_users": rehashed,
+        "errors": errors,
+    }
+    print(
+        f"logins: {result['logins_per_sec']} req/s "
+        f"(p50 {result['login_p50_ms']} ms, p95 {result['login_p95_ms']} ms), "
+        f"other requests during burst: p50 {result['other_p50_ms']} ms, "
+        f"p95 {result['other_p95_ms']} ms, {errors} errors"
+    )
+    if args.seed_rounds:
+        print(f"rehashed to cost {args.rounds}: {rehashed}/{args.users} users")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "benchmark": "login",
+                    "database": engine.dialect.name,
+                    "timestamp": datetime.now().isoformat(),
+                    "results": [result],
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
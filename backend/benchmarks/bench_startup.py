@@ -0,0 +1,183 @@
+"""
+Бенчмарк старта API: время до первого ответа (time-to-first-request).
+
+Каждый прогон — новый процесс:
+    import  — python -c "import app.main" (импорт приложения и зависимостей);
+    first_request — uvicorn app.main:app от запуска процесса до первого
+        ответа 200 на GET /health.
+--importtime N показывает N самых долгих импортов (python -X importtime).
+
+Схема базы при старте не создается (миграции — alembic upgrade head), поэтому
+API должен отвечать на /health и без доступной базы, например:
+    python -m benchmarks.bench_startup \\
+        --database-url postgresql://nobody@127.0.0.1:1/none
+
+Запуск (из каталога backend):
+    python -m benchmarks.bench_startup --runs 10 --output startup.json
+    python -m benchmarks.bench_startup --baseline startup.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+from .common import git_commit, summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_SCRIPT = (
+    "import time; started = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def measure_import(env: dict) -> float:
+    """Время импорта app.main в новом процессе (без запуска интерпретатора)"""
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_first_request(env: dict, port: int, timeout: float) -> float:
+    """От запуска uvicorn до первого ответа 200 на GET /health"""
+    url = f"http://127.0.0.1:{port}/health"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.005)
+        raise TimeoutError(f"no response from {url} in {timeout} s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def slowest_imports(env: dict, limit: int) -> list[dict]:
+    """Самые долгие импорты app.main по суммарному времени (с вложенными)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        imports.append(
+            {"module": module.strip(), "cumulative_ms": int(cumulative) / 1000}
+        )
+    imports.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return imports[:limit]
+
+
+def compare(results: list[dict], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {r["name"]: r for r in baseline["results"]}
+    print(f"vs {baseline_path} (commit {baseline.get('commit')}):")
+    for result in results:
+        old = before.get(result["name"])
+        if old is None or not old["p50_ms"]:
+            continue
+        change = (result["p50_ms"] / old["p50_ms"] - 1) * 100
+        print(
+            f"  {result['name']:<15} p50 {old['p50_ms']:>8} -> "
+            f"{result['p50_ms']:>8} ms ({change:+.1f}%)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60, help="секунд на старт")
+    parser.add_argument("--database-url", help="DATABASE_URL процессов API")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N")
+    parser.add_argument("--output", help="JSON-файл для результатов")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    database_url = args.database_url or os.getenv("BENCH_DATABASE_URL")
+    if database_url:
+        env["DATABASE_URL"] = database_url
+
+    # Первый запуск прогревает кеш байткода и файловый кеш ОС — не учитываем
+    measure_import(env)
+    imports, first_requests = [], []
+    for _ in range(args.runs):
+        imports.append(measure_import(env))
+        first_requests.append(measure_first_request(env, args.port, args.timeout))
+
+    results = [
+        summarize("import", imports),
+        summarize("first_request", first_requests),
+    ]
+    for result in results:
+        print(
+            f"  {result['name']:<15} p50 {result['p50_ms']:>8} ms, "
+            f"min {result['min_ms']:>8} ms, max {result['max_ms']:>8} ms"
+        )
+
+    slowest = slowest_imports(env, args.importtime) if args.importtime else []
+    for row in slowest:
+        print(f"  {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "benchmark": "startup",
+                    "commit": git_commit(),
+                    "timestamp": datetime.now().isoformat(),
+                    "params": vars(args),
+                    "results": results,
+                    "slowest_imports": slowest,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Общие функции бенчмарков: коммит прогона и сводка замеров"""
+
+import math
+import statistics
+import subprocess
+
+
+def git_commit() -> str | None:
+    """Короткий хэш текущего коммита (для сравнения прогонов) или None"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу, в мс (values — в секундах)"""
+    values = sorted(values)
+    return round(values[max(math.ceil(len(values) * q) - 1, 0)] * 1000, 3)
+
+
+def summarize(name: str, timings: list[float]) -> dict:
+    """Сводка замеров в мс: p50, p95, среднее, минимум и максимум"""
+    return {
+        "name": name,
+        "runs": len(timings),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": percentile(timings, 0.95),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+    }
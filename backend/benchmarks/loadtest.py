@@ -0,0 +1,313 @@
+"""
+Нагрузочный тест API: параллельные сценарии пользователей по HTTP.
+
+--vus виртуальных пользователей в течение --duration секунд повторяют
+сценарий, как в браузере:
+    1. POST /auth/login
+    2. GET /analytics/dashboard (повторный показ — с If-None-Match)
+    3. GET /receipts/?view=summary и еще --pages страниц по X-Next-Cursor
+    4. POST /receipts/ — новый чек (с вероятностью --upload-ratio)
+
+По каждому эндпоинту считаются p50/p95/p99, пропускная способность и доля
+ошибок (ответы 4xx/5xx, кроме 304, и сетевые ошибки).
+
+По умолчанию app.main:app вызывается в процессе (httpx.ASGITransport):
+база BENCH_DATABASE_URL очищается (drop_all/create_all) — не запускайте на
+рабочей БД. С --url нагрузка идет на запущенный сервер, например
+    uvicorn app.main:app --workers 4
+В обоих случаях пользователи регистрируются через /auth/register, а история
+(--history чеков на пользователя, benchmarks/synthetic.py) загружается
+через POST /receipts/.
+
+Запуск (из каталога backend):
+    BENCH_DATABASE_URL=sqlite:////tmp/loadtest.db \\
+        python -m benchmarks.loadtest --vus 20 --duration 30 --output run.json
+    python -m benchmarks.loadtest --url http://localhost:8000 --baseline run.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from .common import git_commit, percentile
+
+PASSWORD = "loadtest-password"
+
+
+class Recorder:
+    """Задержки и ошибки по эндпоинтам"""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(dict)
+
+    async def request(self, client, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        statuses = self.statuses[endpoint]
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+        return response
+
+    def report(self, elapsed: float) -> list[dict]:
+        rows = []
+        everything = list(itertools.chain.from_iterable(self.latencies.values()))
+        self.errors["total"] = sum(self.errors.values())
+        for statuses in list(self.statuses.values()):
+            for code, count in statuses.items():
+                total = self.statuses["total"]
+                total[code] = total.get(code, 0) + count
+        for endpoint, latencies in [*self.latencies.items(), ("total", everything)]:
+            errors = self.errors[endpoint]
+            rows.append(
+                {
+                    "endpoint": endpoint,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "error_rate": round(errors / len(latencies), 4) if latencies else 0,
+                    "rps": round(len(latencies) / elapsed, 2),
+                    "p50_ms": percentile(latencies, 0.50),
+                    "p95_ms": percentile(latencies, 0.95),
+                    "p99_ms": percentile(latencies, 0.99),
+                    "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+                    "max_ms": round(max(latencies) * 1000, 2),
+                    "statuses": {
+                        str(code): count
+                        for code, count in sorted(self.statuses[endpoint].items())
+                    },
+                }
+            )
+        return rows
+
+
+async def seed(client, emails: list[str], history: int, new_receipt, concurrency=8):
+    """Регистрирует пользователей и загружает им историю чеков"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def prepare(user: int, email: str):
+        async with semaphore:
+            response = await client.post(
+                "/auth/register", json={"email": email, "password": PASSWORD}
+            )
+            response.raise_for_status()
+            response = await client.post(
+                "/auth/login", json={"email": email, "password": PASSWORD}
+            )
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        for _ in range(history):
+            async with semaphore:
+                response = await client.post(
+                    "/receipts/", json=new_receipt(user), headers=headers
+                )
+                response.raise_for_status()
+
+    await asyncio.gather(*(prepare(n, email) for n, email in enumerate(emails)))
+
+
+async def journey(client, recorder: Recorder, state: dict, args, rng, new_receipt):
+    """Один проход сценария; state — данные виртуального пользователя"""
+    response = await recorder.request(
+        client,
+        "POST /auth/login",
+        "POST",
+        "/auth/login",
+        json={"email": state["email"], "password": PASSWORD},
+    )
+    if response is None or response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    dashboard_headers = dict(headers)
+    if state.get("etag"):
+        dashboard_headers["If-None-Match"] = state["etag"]
+    response = await recorder.request(
+        client,
+        "GET /analytics/dashboard",
+        "GET",
+        "/analytics/dashboard",
+        headers=dashboard_headers,
+    )
+    if response is not None:
+        state["etag"] = response.headers.get("ETag", state.get("etag"))
+
+    params = {"view": "summary", "limit": 50}
+    response = await recorder.request(
+        client, "GET /receipts/", "GET", "/receipts/", params=params, headers=headers
+    )
+    for _ in range(args.pages):
+        cursor = response is not None and response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        response = await recorder.request(
+            client,
+            "GET /receipts/ (next page)",
+            "GET",
+            "/receipts/",
+            params={**params, "cursor": cursor},
+            headers=headers,
+        )
+
+    if rng.random() < args.upload_ratio:
+        await recorder.request(
+            client,
+            "POST /receipts/",
+            "POST",
+            "/receipts/",
+            json=new_receipt(state["user"]),
+            headers=headers,
+        )
+
+
+async def run(client, args, emails: list[str], new_receipt) -> tuple[list[dict], float]:
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+
+    async def virtual_user(vu: int):
+        rng = random.Random(args.seed + vu)
+        user = vu % len(emails)
+        state = {"user": user, "email": emails[user]}
+        while time.monotonic() < deadline:
+            await journey(client, recorder, state, args, rng, new_receipt)
+            if args.think:
+                await asyncio.sleep(rng.uniform(0, 2 * args.think / 1000))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(vu) for vu in range(args.vus)))
+    elapsed = time.perf_counter() - started
+    return recorder.report(elapsed), elapsed
+
+
+def compare(report: list[dict], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {row["endpoint"]: row for row in baseline["endpoints"]}
+    print(f"vs {baseline_path} (commit {baseline.get('commit')}):")
+    for row in report:
+        old = before.get(row["endpoint"])
+        if old is None:
+            continue
+        changes = ", ".join(
+            f"{key} {old[key]} -> {row[key]}"
+            for key in ("p50_ms", "p95_ms", "p99_ms", "rps", "error_rate")
+        )
+        print(f"  {row['endpoint']:<28} {changes}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="адрес запущенного API (без него — в процессе)")
+    parser.add_argument("--vus", type=int, default=20, help="виртуальных пользователей")
+    parser.add_argument("--users", type=int, default=20, help="учетных записей")
+    parser.add_argument("--duration", type=float, default=30, help="секунд нагрузки")
+    parser.add_argument("--history", type=int, default=100, help="чеков на учетку")
+    parser.add_argument("--pages", type=int, default=2, help="страниц после первой")
+    parser.add_argument("--upload-ratio", type=float, default=0.2)
+    parser.add_argument("--think", type=float, default=0, help="пауза, мс (среднее)")
+    parser.add_argument("--rounds", type=int, help="BCRYPT_ROUNDS (в процессе)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON-файл для результатов")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте app
+    if args.rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+    import httpx
+
+    from .synthetic import ReceiptGenerator
+
+    generator = ReceiptGenerator(users=args.users, seed=args.seed)
+    # Уникальные адреса и номера чеков: повторный прогон на том же сервере
+    # не пересекается с прошлыми
+    run_id = uuid.uuid4().hex[:8]
+    emails = [f"load-{run_id}-{n}@example.com" for n in range(args.users)]
+    numbers = itertools.count(int(run_id, 16) * 10**6)
+
+    def new_receipt(user: int) -> dict:
+        return generator.receipt(next(numbers), user)
+
+    limits = httpx.Limits(max_connections=args.vus + 10)
+
+    if args.url:
+        target, database = args.url, None
+        client = httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits)
+        lifespan = None
+    else:
+        from app import search
+        from app.database import DB_MODE, Base, engine
+        from app.main import app
+
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            search.ensure_search_index(connection)
+        target, database = f"asgi ({DB_MODE})", engine.dialect.name
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadtest"
+        )
+        # ASGITransport не отправляет lifespan-события — запускаем сами
+        lifespan = app.router.lifespan_context(app)
+
+    if lifespan is not None:
+        await lifespan.__aenter__()
+    try:
+        async with client:
+            started = time.perf_counter()
+            await seed(client, emails, args.history, new_receipt)
+            print(
+                f"seeded {args.users} users x {args.history} receipts "
+                f"in {time.perf_counter() - started:.1f} s"
+            )
+            report, elapsed = await run(client, args, emails, new_receipt)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    print(f"{target}: {args.vus} VUs for {elapsed:.1f} s")
+    for row in report:
+        print(
+            f"  {row['endpoint']:<28} {row['requests']:>6} req {row['rps']:>8} rps  "
+            f"p50 {row['p50_ms']:>8} p95 {row['p95_ms']:>8} p99 {row['p99_ms']:>8} ms  "
+            f"errors {row['error_rate']:.2%}"
+        )
+    if args.baseline:
+        compare(report, args.baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "benchmark": "loadtest",
+                    "commit": git_commit(),
+                    "target": target,
+                    "database": database,
+                    "timestamp": datetime.now().isoformat(),
+                    "params": vars(args),
+                    "duration_s": round(elapsed, 2),
+                    "endpoints": report,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,259 @@
+"""
+Генератор синтетических чеков в формате выгрузки ФНС (как r_example/*.json).
+
+Чеки детерминированы: одинаковые параметры и seed дают одинаковые данные,
+поэтому результаты бенчмарков сравнимы между коммитами. Генерируются:
+    - пользователи со своими "любимыми" магазинами;
+    - магазины разных сетей (уникальный ИНН — отдельный магазин) и кассиры;
+    - справочник товаров с популярностью по закону Ципфа: штучные,
+      весовые (дробное количество, кг) и маркированные (productType 33,
+      GTIN и код маркировки);
+    - даты чеков за days дней до end.
+
+Example:
+    >>> generator = ReceiptGenerator(users=100, seed=42)
+    >>> for user, receipt in generator.receipts(items=10_000):
+    ...     crud.create_receipt_full(db, receipt, user_ids[user])
+
+Посмотреть пример чека (из каталога backend):
+    python -m benchmarks.synthetic --items 20
+"""
+
+import argparse
+import itertools
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+DEFAULT_END = datetime(2026, 1, 31, 23, 0)
+
+CHAINS = (
+    ('АКЦИОНЕРНОЕ ОБЩЕСТВО "ТАНДЕР"', "Магазин Магнит"),
+    ('ООО "АГРОТОРГ"', "Пятерочка"),
+    ('ООО "ЛЕНТА"', "Лента"),
+    ('ООО "ВКУСВИЛЛ"', "ВкусВилл"),
+    ('АО "ДИКСИ ЮГ"', "Дикси"),
+    ('ООО "ПЕРЕКРЕСТОК"', "Перекресток"),
+    ('ООО "АПТЕКА-А.В.Е"', "Аптека 36,6"),
+    ('ООО "ОЗОН"', "OZON"),
+    ("ИП ИВАНОВ И.И.", "Кафе Хинкалыч"),
+    ('ООО "ДНС РИТЕЙЛ"', "DNS"),
+)
+CITIES = ("Москва г", "Воронеж г", "Белгород г", "Старый Оскол г", "Курск г")
+STREETS = ("Ленина ул", "Советская ул", "Мира пр-кт", "Гагарина ул", "Победы ул")
+FIRST_NAMES = ("Иванова Анна", "Петров Олег", "Сидорова Мария", "Кузнецов Иван")
+
+# (название, единица: "шт"/"кг", цена в копейках за единицу)
+GOODS = (
+    ("Молоко", "шт", 8999),
+    ("Кефир", "шт", 7999),
+    ("Сыр", "кг", 79999),
+    ("Хлеб", "шт", 4999),
+    ("Яблоки", "кг", 12999),
+    ("Бананы", "кг", 14999),
+    ("Картофель", "кг", 4999),
+    ("Куриное филе", "кг", 42999),
+    ("Колбаса", "шт", 29999),
+    ("Вода питьевая", "шт", 5999),
+    ("Сок", "шт", 12999),
+    ("Пиво", "шт", 9999),
+    ("Энергетический напиток", "шт", 11999),
+    ("Шоколад", "шт", 10999),
+    ("Кофе молотый", "шт", 49999),
+    ("Чай черный", "шт", 19999),
+    ("Макароны", "шт", 8999),
+    ("Рис", "шт", 11999),
+    ("Стиральный порошок", "шт", 59999),
+    ("Шампунь", "шт", 39999),
+    ("Пакет", "шт", 999),
+)
+BRANDS = ("ПРОСТОКВАШИНО", "ДОМИК В ДЕРЕВНЕ", "BURN", "ЛЮБИМЫЙ", "SPAR", "КРАСНАЯ ЦЕНА")
+VARIANTS = ("0,5л", "0,9л", "1л", "250г", "400г", "1кг", "3.2%", "б/сах", "Цитрус")
+# Маркированные товарные группы (молочная продукция, вода, пиво, напитки)
+MARKED = {"Молоко", "Кефир", "Сыр", "Вода питьевая", "Пиво", "Энергетический напиток"}
+
+
+class ReceiptGenerator:
+    """
+    Args:
+        users (int): Количество пользователей (в чеках — индекс 0..users-1).
+        shops (int): Количество магазинов.
+        cashiers (int): Количество кассиров (делятся между магазинами).
+        products (int): Размер справочника товаров.
+        days (int): Период чеков — days дней до end.
+        end (datetime): Самый поздний чек.
+        seed (int): Зерно генератора.
+    """
+
+    def __init__(
+        self,
+        users: int = 100,
+        shops: int = 300,
+        cashiers: int = 1500,
+        products: int = 5000,
+        days: int = 730,
+        end: datetime = DEFAULT_END,
+        seed: int = 42,
+    ):
+        self.users = users
+        self.days = days
+        self.end = end
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._shops = [self._shop(n) for n in range(shops)]
+        for n in range(cashiers):
+            cashier = (f"{FIRST_NAMES[n % len(FIRST_NAMES)]} {n}", f"{n:012d}")
+            self._shops[n % shops]["cashiers"].append(cashier)
+        self._products = [self._product(n) for n in range(products)]
+        # Популярность товаров ~ 1/ранг
+        self._product_weights = list(
+            itertools.accumulate(1 / (rank + 1) for rank in range(products))
+        )
+        # Каждый пользователь ходит в 3-15 своих магазинов
+        self._user_shops = [
+            self._rng.sample(self._shops, min(self._rng.randint(3, 15), shops))
+            for _ in range(users)
+        ]
+
+    def _shop(self, n: int) -> dict:
+        rng = self._rng
+        legal_name, retail_name = CHAINS[n % len(CHAINS)]
+        return {
+            "user": legal_name,
+            "userInn": f"{7700000000 + n}  ",
+            "retailPlace": f"{retail_name} {n}",
+            "retailPlaceAddress": (
+                f"{300000 + rng.randint(0, 99999)}, {rng.choice(CITIES)}, "
+                f"{rng.choice(STREETS)}, дом № {rng.randint(1, 200)}"
+            ),
+            "kktRegId": f"{rng.randint(10**15, 10**16 - 1)}    ",
+            "fiscalDriveNumber": str(rng.randint(10**15, 10**16 - 1)),
+            "cashiers": [],
+        }
+
+    def _product(self, n: int) -> dict:
+        rng = self._rng
+        base, measure, price = GOODS[n % len(GOODS)]
+        name = f"{base} {rng.choice(BRANDS)} {rng.choice(VARIANTS)} арт.{n}"
+        weighted = measure == "кг"
+        product = {
+            "name": f"{name} кг" if weighted and rng.random() < 0.5 else name,
+            "price": int(price * rng.uniform(0.5, 2.0)),
+            "weighted": weighted,
+            "gtin": None,
+        }
+        if base in MARKED and not weighted:
+            product["gtin"] = 4600000000000 + n
+        return product
+
+    def _item(self, product: dict) -> dict:
+        rng = self._rng
+        if product["weighted"]:
+            quantity = round(rng.uniform(0.2, 2.5), 3)
+        else:
+            quantity = rng.choices((1, 2, 3, 4), weights=(80, 12, 5, 3))[0]
+        item = {
+            "name": product["name"],
+            "nds": 1,
+            "paymentType": 4,
+            "price": product["price"],
+            "quantity": quantity,
+            "sum": round(product["price"] * quantity),
+            "productType": 1,
+        }
+        if product["gtin"] is not None:
+            sernum = "".join(rng.choices("ABCDEFGHJKLMNPQRSTUVWXYZ0123456789", k=13))
+            item["productType"] = 33
+            item["productCodeData"] = {
+                "gtin": product["gtin"],
+                "rawProductCode": f"01{product['gtin']:014d}21{sernum}",
+                "productIdType": 6,
+                "sernum": sernum,
+            }
+        return item
+
+    def receipt(self, n: int, user: int) -> dict:
+        """Чек номер n пользователя user (индекс)"""
+        rng = self._rng
+        shop = rng.choice(self._user_shops[user])
+        date_time = self.end - timedelta(seconds=rng.randint(0, self.days * 86400))
+        count = min(int(rng.expovariate(1 / 7)) + 1, 60)
+        products = rng.choices(
+            self._products, cum_weights=self._product_weights, k=count
+        )
+        items = [self._item(product) for product in products]
+        total = sum(item["sum"] for item in items)
+        cash = total if rng.random() < 0.15 else 0
+
+        ticket = {
+            "cashTotalSum": cash,
+            "code": 3,
+            "creditSum": 0,
+            "dateTime": date_time.isoformat(),
+            "ecashTotalSum": total - cash,
+            "fiscalDocumentFormatVer": 4,
+            "fiscalDocumentNumber": n % 100000 + 1,
+            "fiscalDriveNumber": shop["fiscalDriveNumber"],
+            "fiscalSign": rng.randint(10**9, 2**32 - 1),
+            "fnsUrl": "www.nalog.gov.ru",
+            "items": items,
+            "kktRegId": shop["kktRegId"],
+            "nds10": total // 11,
+            "nds18": 0,
+            "operationType": 1,
+            "prepaidSum": 0,
+            "provisionSum": 0,
+            "requestNumber": n % 500 + 1,
+            "retailPlace": shop["retailPlace"],
+            "retailPlaceAddress": shop["retailPlaceAddress"],
+            "shiftNumber": n % 400 + 1,
+            "taxationType": 1,
+            "appliedTaxationType": 1,
+            "totalSum": total,
+            "user": shop["user"],
+            "userInn": shop["userInn"],
+        }
+        # Часть касс не передает кассира
+        if shop["cashiers"] and rng.random() < 0.8:
+            ticket["operator"], ticket["operatorInn"] = rng.choice(shop["cashiers"])
+
+        created_at = date_time + timedelta(minutes=rng.randint(1, 600))
+        return {
+            "_id": f"{self.seed:08x}{n:016x}",
+            "createdAt": created_at.replace(tzinfo=timezone.utc).isoformat(),
+            "ticket": {"document": {"receipt": ticket}},
+        }
+
+    def receipts(self, items: int) -> Iterator[tuple[int, dict]]:
+        """
+        Пары (индекс пользователя, чек), пока позиций не наберется items.
+        Чеки распределены между пользователями неравномерно (~1/ранг).
+        """
+        user_weights = list(
+            itertools.accumulate(1 / (rank + 1) for rank in range(self.users))
+        )
+        generated = 0
+        for n in itertools.count():
+            if generated >= items:
+                return
+            user = self._rng.choices(range(self.users), cum_weights=user_weights)[0]
+            receipt = self.receipt(n, user)
+            generated += len(receipt["ticket"]["document"]["receipt"]["items"])
+            yield user, receipt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические чеки ФНС")
+    parser.add_argument("--items", type=int, default=20, help="позиций всего")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generator = ReceiptGenerator(users=args.users, seed=args.seed)
+    receipts = [receipt for _, receipt in generator.receipts(args.items)]
+    print(json.dumps(receipts, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
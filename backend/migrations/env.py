@@ -0,0 +1,77 @@
+"""
+Окружение Alembic: адрес базы — DATABASE_URL приложения (app/database.py),
+целевая схема — модели app/models.py (для alembic revision --autogenerate).
+
+Базу, созданную до миграций (create_all при старте API), помечают первой
+ревизией, а недостающие в ней индексы создает ревизия 0002. Дубликаты
+магазинов и кассиров, из-за которых не создаются уникальные индексы,
+объединяются до stamp, отдельной командой (app/upgrade.py):
+    python -m app.products   # если позиции чеков еще без справочника товаров
+    python -m app.rollups    # если еще нет rollup-таблиц
+    python -m app.upgrade    # объединение дубликатов
+    alembic stamp 0001
+    alembic upgrade head
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+# Импорт регистрирует таблицы моделей в Base.metadata
+from app import models  # noqa: F401
+from app.database import DATABASE_URL, Base
+from app.search import FTS_TABLE, SEARCH_INDEXES
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Поисковые индексы (app/search.py) создаются DDL миграций, а не моделями:
+    без фильтра autogenerate и alembic check предлагают их удалить. В SQLite
+    это таблица FTS5 и ее служебные таблицы (products_fts_data, ...).
+    """
+    if type_ == "table" and name.startswith(FTS_TABLE):
+        return False
+    if type_ == "index" and name in SEARCH_INDEXES:
+        return False
+    return True
+
+
+def run_migrations_offline():
+    """SQL миграций без подключения к базе (alembic upgrade head --sql)"""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # Отдельный engine без пула и метрик приложения: одно соединение на запуск
+    connectable = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # SQLite не умеет большую часть ALTER TABLE — пересоздание таблиц
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,232 @@
+"""initial schema
+
+Таблицы текущих моделей и индексы горячих запросов:
+    - ix_receipts_user_date — чеки пользователя за период и курсорная
+      пагинация списка чеков по (date_time, id);
+    - ix_receipt_items_receipt_id / _product_id — позиции страницы чеков,
+      топ товаров и поиск по справочнику;
+    - ix_shop_spending_user_total / _count — статистика магазинов без GROUP BY;
+    - uq_shops_inn, uq_cashiers_inn, uq_cashiers_name — ключи
+      INSERT ... ON CONFLICT при загрузке чеков;
+    - поисковые индексы по названиям товаров и магазинов (app/search.py).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 12:00:00
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.models import MANUAL_SHOP_INN
+from app.search import FTS_TABLE, search_index_ddl
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _partial(where: str) -> dict:
+    """Условие частичного индекса для обоих диалектов"""
+    return {"postgresql_where": sa.text(where), "sqlite_where": sa.text(where)}
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sa.String(length=255), nullable=False),
+        sa.Column("password_hash", sa.String(length=255), nullable=False),
+        sa.Column("telegram_id", sa.String(length=100), nullable=True),
+        sa.Column("full_name", sa.String(length=255), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_users_email"), "users", ["email"], unique=True)
+    op.create_index(op.f("ix_users_telegram_id"), "users", ["telegram_id"])
+
+    op.create_table(
+        "shops",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("legal_name", sa.String(length=255), nullable=False),
+        sa.Column("inn", sa.String(length=12), nullable=False),
+        sa.Column("retail_name", sa.String(length=255), nullable=True),
+        sa.Column("address", sa.String(length=500), nullable=True),
+        sa.Column("category", sa.String(length=100), nullable=True),
+        sa.Column("is_favorite", sa.Boolean(), nullable=False),
+        sa.Column("notes", sa.String(length=1000), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_shops_inn"), "shops", ["inn"])
+    op.create_index(
+        "uq_shops_inn",
+        "shops",
+        ["inn"],
+        unique=True,
+        **_partial(f"inn <> '{MANUAL_SHOP_INN}'"),
+    )
+
+    op.create_table(
+        "cashiers",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=True),
+        sa.Column("inn", sa.String(length=12), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "uq_cashiers_inn",
+        "cashiers",
+        ["inn"],
+        unique=True,
+        **_partial("inn IS NOT NULL"),
+    )
+    op.create_index(
+        "uq_cashiers_name", "cashiers", ["name"], unique=True, **_partial("inn IS NULL")
+    )
+
+    op.create_table(
+        "receipts",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("external_id", sa.String(length=100), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("date_time", sa.DateTime(), nullable=False),
+        sa.Column("code", sa.Integer(), nullable=False),
+        sa.Column("cash_total_sum", sa.BigInteger(), nullable=False),
+        sa.Column("credit_sum", sa.BigInteger(), nullable=False),
+        sa.Column("ecash_total_sum", sa.BigInteger(), nullable=False),
+        sa.Column("total_sum", sa.BigInteger(), nullable=False),
+        sa.Column("prepaid_sum", sa.BigInteger(), nullable=False),
+        sa.Column("provision_sum", sa.BigInteger(), nullable=False),
+        sa.Column("fiscal_document_format_ver", sa.Integer(), nullable=False),
+        sa.Column("fiscal_drive_number", sa.String(length=20), nullable=False),
+        sa.Column("fiscal_document_number", sa.Integer(), nullable=False),
+        sa.Column("fiscal_sign", sa.BigInteger(), nullable=False),
+        sa.Column("shift_number", sa.Integer(), nullable=True),
+        sa.Column("kkt_reg_id", sa.String(length=20), nullable=False),
+        sa.Column("nds_10", sa.BigInteger(), nullable=True),
+        sa.Column("nds_18", sa.BigInteger(), nullable=True),
+        sa.Column("operation_type", sa.Integer(), nullable=False),
+        sa.Column("request_number", sa.Integer(), nullable=False),
+        sa.Column("taxation_type", sa.Integer(), nullable=True),
+        sa.Column("applied_taxation_type", sa.Integer(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("shop_id", sa.Integer(), nullable=False),
+        sa.Column("cashier_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["cashier_id"], ["cashiers.id"]),
+        sa.ForeignKeyConstraint(["shop_id"], ["shops.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("external_id"),
+    )
+    op.create_index("ix_receipts_user_date", "receipts", ["user_id", "date_time", "id"])
+
+    op.create_table(
+        "products",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(length=520), nullable=False),
+        sa.Column("name", sa.String(length=500), nullable=False),
+        sa.Column("gtin", sa.String(length=20), nullable=True),
+        sa.Column("measure", sa.String(length=20), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("key"),
+    )
+
+    op.create_table(
+        "receipt_items",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("receipt_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("price", sa.BigInteger(), nullable=False),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.Column("sum", sa.BigInteger(), nullable=False),
+        sa.Column("measure", sa.String(length=20), nullable=True),
+        sa.Column("product_type", sa.Integer(), nullable=True),
+        sa.Column("raw_product_code", sa.String(length=500), nullable=True),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"]),
+        sa.ForeignKeyConstraint(["receipt_id"], ["receipts.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_receipt_items_product_id"), "receipt_items", ["product_id"]
+    )
+    op.create_index(
+        op.f("ix_receipt_items_receipt_id"), "receipt_items", ["receipt_id"]
+    )
+
+    op.create_table(
+        "monthly_spending",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Integer(), nullable=False),
+        sa.Column("receipts_count", sa.Integer(), nullable=False),
+        sa.Column("total_sum", sa.BigInteger(), nullable=False),
+        sa.Column("cash_total_sum", sa.BigInteger(), nullable=False),
+        sa.Column("ecash_total_sum", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "year", "month"),
+    )
+
+    op.create_table(
+        "shop_spending",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("shop_id", sa.Integer(), nullable=False),
+        sa.Column("total_amount", sa.BigInteger(), nullable=False),
+        sa.Column("receipts_count", sa.Integer(), nullable=False),
+        sa.Column("first_visit", sa.DateTime(), nullable=True),
+        sa.Column("last_visit", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["shop_id"], ["shops.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "shop_id"),
+    )
+    op.create_index(
+        "ix_shop_spending_user_count",
+        "shop_spending",
+        ["user_id", "receipts_count", "shop_id"],
+    )
+    op.create_index(
+        "ix_shop_spending_user_total",
+        "shop_spending",
+        ["user_id", "total_amount", "shop_id"],
+    )
+
+    op.create_table(
+        "user_data_versions",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+    # Таблица products пустая — индекс FTS5 не нужно перестраивать
+    for statement in search_index_ddl(op.get_context().dialect.name):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    # Индексы PostgreSQL удаляются вместе с таблицами
+    for table in (
+        "user_data_versions",
+        "shop_spending",
+        "monthly_spending",
+        "receipt_items",
+        "products",
+        "receipts",
+        "cashiers",
+        "shops",
+        "users",
+    ):
+        op.drop_table(table)
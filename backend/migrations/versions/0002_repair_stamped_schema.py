@@ -0,0 +1,210 @@
+"""repair stamped schema
+
+Базу, созданную до миграций (create_all при старте API), помечают ревизией
+0001 без изменений (alembic stamp 0001). В ней может не быть индексов первой
+миграции — в том числе уникальных индексов магазинов и кассиров, без которых
+не работает INSERT ... ON CONFLICT при загрузке чеков. Ревизия создает
+индексы 0001 (IF NOT EXISTS) и пересоздает ix_receipts_user_date старого
+вида (без id). На базе, созданной миграцией 0001, ничего не меняет.
+
+Индексы (и поисковые, см. app/search.py) зафиксированы здесь, а не берутся
+из моделей: следующие ревизии меняют модели, а эта должна создавать ровно
+схему 0001.
+
+Дубликаты магазинов и кассиров, из-за которых уникальные индексы не
+создаются, ревизия не объединяет: до alembic stamp запускают
+python -m app.upgrade (см. migrations/env.py).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 21:00:00
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Значение models.MANUAL_SHOP_INN на момент 0001
+_MANUAL_SHOP_INN = "0000000000"
+
+# Дубликаты, которые не дадут создать уникальные индексы 0001
+_DUPLICATES = {
+    "shops": f"SELECT inn FROM shops WHERE inn <> '{_MANUAL_SHOP_INN}' "
+    "GROUP BY inn HAVING count(*) > 1",
+    "cashiers": "SELECT inn FROM cashiers WHERE inn IS NOT NULL "
+    "GROUP BY inn HAVING count(*) > 1 "
+    "UNION ALL SELECT name FROM cashiers WHERE inn IS NULL "
+    "GROUP BY name HAVING count(*) > 1",
+}
+
+# Колонки ix_receipts_user_date в 0001 (раньше индекс был без id)
+_RECEIPTS_INDEX_COLUMNS = ["user_id", "date_time", "id"]
+
+_FTS_TABLE = "products_fts"
+
+# Поисковые индексы 0001 (app/search.py)
+_SEARCH_DDL = {
+    "postgresql": (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_products_name_fts ON products "
+        "USING gin (to_tsvector('russian'::regconfig, name))",
+        "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products "
+        "USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_shops_retail_name_trgm ON shops "
+        "USING gin (retail_name gin_trgm_ops)",
+    ),
+    "sqlite": (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {_FTS_TABLE} USING fts5("
+        "name, content='products', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_FTS_TABLE}_ai AFTER INSERT ON products
+        BEGIN
+            INSERT INTO {_FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END""",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_FTS_TABLE}_ad AFTER DELETE ON products
+        BEGIN
+            INSERT INTO {_FTS_TABLE}({_FTS_TABLE}, rowid, name)
+            VALUES ('delete', old.id, old.name);
+        END""",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {_FTS_TABLE}_au AFTER UPDATE OF name
+        ON products
+        BEGIN
+            INSERT INTO {_FTS_TABLE}({_FTS_TABLE}, rowid, name)
+            VALUES ('delete', old.id, old.name);
+            INSERT INTO {_FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END""",
+    ),
+}
+# Объекты FTS5 в SQLite: таблица и триггеры, которые ее заполняют
+_SQLITE_FTS_OBJECTS = {_FTS_TABLE, *(f"{_FTS_TABLE}_{s}" for s in ("ai", "ad", "au"))}
+
+
+def _partial(where: str) -> dict:
+    """Условие частичного индекса для обоих диалектов"""
+    return {"postgresql_where": sa.text(where), "sqlite_where": sa.text(where)}
+
+
+def _check_duplicates():
+    connection = op.get_bind()
+    for table, query in _DUPLICATES.items():
+        if connection.execute(sa.text(query)).first() is not None:
+            raise RuntimeError(
+                f"Duplicate {table} block the unique indexes of revision 0001. "
+                "Run python -m app.upgrade before alembic stamp 0001."
+            )
+
+
+def _receipts_index_is_outdated() -> bool:
+    indexes = sa.inspect(op.get_bind()).get_indexes("receipts")
+    columns = {index["name"]: index["column_names"] for index in indexes}
+    return columns.get("ix_receipts_user_date", _RECEIPTS_INDEX_COLUMNS) != (
+        _RECEIPTS_INDEX_COLUMNS
+    )
+
+
+def _sqlite_fts_is_complete() -> bool:
+    names = op.get_bind().exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE name LIKE ?", (f"{_FTS_TABLE}%",)
+    )
+    return _SQLITE_FTS_OBJECTS <= set(names.scalars())
+
+
+def _create_search_indexes(offline: bool):
+    dialect = op.get_context().dialect.name
+    # Без подключения не узнать, был ли индекс FTS: заполняем его всегда
+    rebuild = dialect == "sqlite" and (offline or not _sqlite_fts_is_complete())
+    for statement in _SEARCH_DDL.get(dialect, ()):
+        op.execute(statement)
+    if rebuild:
+        op.execute(f"INSERT INTO {_FTS_TABLE}({_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    # Без подключения (alembic upgrade head --sql) базу не проверить: выводятся
+    # только идемпотентные CREATE ... IF NOT EXISTS. Базу со старым
+    # ix_receipts_user_date так не починить — ее обновляют с подключением
+    offline = context.is_offline_mode()
+    if not offline:
+        _check_duplicates()
+
+    op.create_index(
+        "ix_users_email", "users", ["email"], unique=True, if_not_exists=True
+    )
+    op.create_index(
+        "ix_users_telegram_id", "users", ["telegram_id"], if_not_exists=True
+    )
+    op.create_index("ix_shops_inn", "shops", ["inn"], if_not_exists=True)
+    op.create_index(
+        "uq_shops_inn",
+        "shops",
+        ["inn"],
+        unique=True,
+        if_not_exists=True,
+        **_partial(f"inn <> '{_MANUAL_SHOP_INN}'"),
+    )
+    op.create_index(
+        "uq_cashiers_inn",
+        "cashiers",
+        ["inn"],
+        unique=True,
+        if_not_exists=True,
+        **_partial("inn IS NOT NULL"),
+    )
+    op.create_index(
+        "uq_cashiers_name",
+        "cashiers",
+        ["name"],
+        unique=True,
+        if_not_exists=True,
+        **_partial("inn IS NULL"),
+    )
+
+    if not offline and _receipts_index_is_outdated():
+        op.drop_index("ix_receipts_user_date", table_name="receipts")
+    op.create_index(
+        "ix_receipts_user_date",
+        "receipts",
+        _RECEIPTS_INDEX_COLUMNS,
+        if_not_exists=True,
+    )
+
+    op.create_index(
+        "ix_receipt_items_product_id",
+        "receipt_items",
+        ["product_id"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_receipt_items_receipt_id",
+        "receipt_items",
+        ["receipt_id"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_shop_spending_user_count",
+        "shop_spending",
+        ["user_id", "receipts_count", "shop_id"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_shop_spending_user_total",
+        "shop_spending",
+        ["user_id", "total_amount", "shop_id"],
+        if_not_exists=True,
+    )
+
+    _create_search_indexes(offline)
+
+
+def downgrade() -> None:
+    # Индексы соответствуют схеме 0001 — откатывать нечего
+    pass
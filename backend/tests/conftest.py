@@ -0,0 +1,101 @@
+"""
+Общие фикстуры тестов.
+
+Настройки app читаются при импорте, поэтому окружение задается до него:
+тесты работают на временной SQLite-базе с быстрым bcrypt и кешами в памяти.
+"""
+
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="qr2finance-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/test.db"
+os.environ["DB_MODE"] = "sync"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["ANALYTICS_CACHE_BACKEND"] = "memory"
+os.environ["INGEST_QUEUE_BACKEND"] = "memory"
+
+import json  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+import pytest  # noqa: E402
+
+from app import analytics_cache, cache, models, search  # noqa: E402
+from app.database import DATABASE_URL, Base, SessionLocal, engine  # noqa: E402
+
+EXAMPLES_DIR = Path(__file__).resolve().parents[2] / "r_example"
+
+
+@pytest.fixture
+def schema():
+    """Пустая схема базы; после теста таблицы и кеши процесса очищаются"""
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        search.ensure_search_index(connection)
+    yield engine
+    Base.metadata.drop_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {search.FTS_TABLE}")
+    for identity_cache in (
+        cache.shop_ids,
+        cache.cashier_ids,
+        cache.product_ids,
+        cache.auth_users,
+        cache.telegram_users,
+    ):
+        identity_cache.clear()
+    analytics_cache.backend = analytics_cache.InMemoryAnalyticsBackend()
+
+
+@pytest.fixture
+def db(schema):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user(db) -> models.User:
+    user = models.User(email="user@example.com", password_hash="-")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def api(user):
+    """Клиент API с токеном пользователя user"""
+    from fastapi.testclient import TestClient
+
+    from app.auth import create_access_token
+    from app.main import app
+
+    token = create_access_token({"sub": str(user.id)})
+    with TestClient(app, headers={"Authorization": f"Bearer {token}"}) as client:
+        yield client
+
+
+@pytest.fixture
+def example_receipt() -> dict:
+    """Чек из r_example (формат выгрузки ФНС)"""
+    return json.loads((EXAMPLES_DIR / "r1_example.json").read_text("utf-8"))[0]
+
+
+@pytest.fixture(scope="session")
+def bot_dispatcher():
+    """
+    Dispatcher бота с роутером хэндлеров и его BotDatabase на тестовой базе.
+    Роутер подключается только к одному Dispatcher, поэтому он общий.
+    """
+    from aiogram import Dispatcher
+
+    from app.bot.db import BotDatabase
+    from app.bot.handlers import router
+    from app.bot.middleware import DbSessionMiddleware
+
+    bot_db = BotDatabase(DATABASE_URL, workers=8)
+    dp = Dispatcher()
+    dp.message.middleware(DbSessionMiddleware(bot_db))
+    dp.include_router(router)
+    yield dp, bot_db
+    bot_db.close()
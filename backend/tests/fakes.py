@@ -0,0 +1,124 @@
+"""
+Заглушки внешних сервисов для тестов и бенчмарков.
+
+Заглушки redis хранят значения в bytes, как настоящий клиент без decode_responses.
+"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message, Update, User
+
+
+class FakeRedis:
+    """Подмножество redis.Redis, которым пользуется app.analytics_cache"""
+
+    def __init__(self):
+        self._data: dict[str, tuple[float | None, bytes]] = {}
+        self._lock = threading.Lock()
+        self.calls: list[tuple] = []
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            self.calls.append(("get", key))
+            expires_at, value = self._data.get(key, (None, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value, ex: float | None = None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self.calls.append(("set", key))
+            self._data[key] = (None if ex is None else time.monotonic() + ex, value)
+
+
+class FakeAsyncRedis:
+    """Подмножество redis.asyncio.Redis, которым пользуется app.jobs"""
+
+    def __init__(self):
+        self._values: dict[str, bytes] = {}
+        self._lists: dict[str, list[bytes]] = {}
+        self.calls: list[tuple] = []
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    async def set(self, key: str, value, ex: int | None = None):
+        self.calls.append(("set", key))
+        self._values[key] = self._bytes(value)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._values.get(key)
+
+    async def rpush(self, key: str, *values) -> int:
+        self.calls.append(("rpush", key, len(values)))
+        items = self._lists.setdefault(key, [])
+        items.extend(self._bytes(value) for value in values)
+        return len(items)
+
+    async def lrange(self, key: str, start: int, end: int) -> list[bytes]:
+        items = self._lists.get(key, [])
+        return items[start : None if end == -1 else end + 1]
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        return key in self._values or key in self._lists
+
+    async def blpop(self, keys: list[str], timeout: float = 0):
+        deadline = time.monotonic() + timeout
+        while True:
+            for key in keys:
+                if self._lists.get(key):
+                    return key.encode(), self._lists[key].pop(0)
+            if timeout and time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(0.01)
+
+
+class FakeSession(BaseSession):
+    """Сессия Telegram API без сети: на sendMessage отвечает эхом"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+        self.texts: list[str] = []
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, SendMessage):
+            self.sent += 1
+            self.texts.append(method.text)
+            return Message(
+                message_id=self.sent,
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def make_update(n: int, text: str = "/stats") -> Update:
+    """Апдейт с сообщением text от Telegram-пользователя 1000 + n"""
+    user = User(id=1000 + n, is_bot=False, first_name=f"user{n}")
+    return Update(
+        update_id=n,
+        message=Message(
+            message_id=n,
+            date=datetime.now(),
+            chat=Chat(id=user.id, type="private"),
+            from_user=user,
+            text=text,
+        ),
+    )
@@ -0,0 +1,93 @@
+import asyncio
+import copy
+from datetime import date, timedelta
+
+import pytest
+
+from app import analytics_cache, crud, schemas, services
+
+from .fakes import FakeRedis
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache_backend(request, monkeypatch):
+    if request.param == "redis":
+        backend = analytics_cache.RedisAnalyticsBackend(FakeRedis())
+    else:
+        backend = analytics_cache.InMemoryAnalyticsBackend()
+    monkeypatch.setattr(analytics_cache, "backend", backend)
+    return backend
+
+
+def _total_sums(db, user_id: int) -> tuple[schemas.TotalSums, bool]:
+    """
+    Ответ через кеш с версией из базы, как в эндпоинте /analytics/total-sums,
+    и был ли он вычислен заново
+    """
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return services.get_user_total_sum(db, user_id)
+
+    value = asyncio.run(
+        analytics_cache.cached(
+            user_id,
+            crud.get_data_version_number(db, user_id),
+            "total-sums",
+            schemas.TotalSums,
+            compute,
+        )
+    )
+    return value, bool(calls)
+
+
+def test_cache_follows_database_version(db, user, example_receipt, cache_backend):
+    first, computed = _total_sums(db, user.id)
+    assert computed and first.receipts_count == 0
+
+    again, computed = _total_sums(db, user.id)
+    assert not computed and again == first
+
+    # Загрузка чека увеличивает UserDataVersion — старая запись не читается
+    receipt = copy.deepcopy(example_receipt)
+    crud.create_receipts_bulk(db, [receipt], user_id=user.id)
+    assert crud.get_data_version_number(db, user.id) == 1
+
+    updated, computed = _total_sums(db, user.id)
+    assert computed and updated.receipts_count == 1
+    cached, computed = _total_sums(db, user.id)
+    assert not computed and cached == updated
+
+
+def test_redis_backend_stores_json_under_version_key(db, user, monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(
+        analytics_cache, "backend", analytics_cache.RedisAnalyticsBackend(client)
+    )
+
+    _total_sums(db, user.id)
+
+    today = date.today()
+    key = f"analytics:{user.id}:0:{today:%Y%m%d}:total-sums:{{}}"
+    assert ("set", key) in client.calls
+    value, computed = _total_sums(db, user.id)
+    assert not computed and isinstance(value, schemas.TotalSums)
+
+
+def test_entries_expire_with_the_day(db, user, cache_backend, monkeypatch):
+    """Ответы за «последние N дней» пересчитываются на следующий день"""
+    _total_sums(db, user.id)
+    tomorrow = date.today() + timedelta(days=1)
+
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return tomorrow
+
+    monkeypatch.setattr(analytics_cache, "date", Tomorrow)
+
+    _value, computed = _total_sums(db, user.id)
+    assert computed
+    _value, computed = _total_sums(db, user.id)
+    assert not computed
@@ -0,0 +1,36 @@
+import asyncio
+
+from aiogram import Bot
+
+from app import models
+
+from .fakes import FakeSession, make_update
+
+
+def _reply(bot_dispatcher, text: str) -> str:
+    """Прогоняет сообщение от telegram_id 1000 и возвращает текст ответа"""
+    dp, _ = bot_dispatcher
+    bot = Bot(token="42:TEST", session=FakeSession())
+    asyncio.run(dp.feed_update(bot, make_update(0, text)))
+    return bot.session.texts[0]
+
+
+def test_inactive_user_is_rejected(db, bot_dispatcher):
+    db.add(
+        models.User(
+            email="bot@example.com",
+            password_hash="-",
+            telegram_id="1000",
+            is_active=False,
+        )
+    )
+    db.commit()
+
+    assert "деактивирован" in _reply(bot_dispatcher, "/stats")
+
+
+def test_active_user_reaches_handler(db, bot_dispatcher):
+    db.add(models.User(email="bot@example.com", password_hash="-", telegram_id="1000"))
+    db.commit()
+
+    assert "нет чеков" in _reply(bot_dispatcher, "/stats")
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from aiogram import Bot
+from sqlalchemy import event
+
+from app import models
+
+from .fakes import FakeSession, make_update
+
+UPDATES = 8
+DELAY = 0.05  # Задержка каждого SQL-запроса, с
+
+
+def test_slow_queries_do_not_serialize_updates(db, bot_dispatcher):
+    """Апдейты с медленными запросами обрабатываются параллельно"""
+    for n in range(UPDATES):
+        db.add(
+            models.User(
+                email=f"bot{n}@example.com",
+                password_hash="-",
+                telegram_id=str(1000 + n),
+            )
+        )
+    db.commit()
+
+    dp, bot_db = bot_dispatcher
+    queries = 0
+
+    def slow_query(*_):
+        nonlocal queries
+        queries += 1
+        time.sleep(DELAY)
+
+    bot = Bot(token="42:TEST", session=FakeSession())
+
+    async def feed():
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(dp.feed_update(bot, make_update(n)) for n in range(UPDATES))
+        )
+        return time.perf_counter() - started
+
+    event.listen(bot_db.engine, "before_cursor_execute", slow_query)
+    try:
+        elapsed = asyncio.run(feed())
+    finally:
+        event.remove(bot_db.engine, "before_cursor_execute", slow_query)
+
+    assert bot.session.sent == UPDATES
+    assert queries >= 2 * UPDATES
+    assert elapsed < queries * DELAY / 3
@@ -0,0 +1,110 @@
+import copy
+
+from sqlalchemy import event, func, select
+
+from app import cache, crud, models, schemas
+from app.database import engine
+
+
+def _receipt(example: dict, external_id: str) -> dict:
+    receipt = copy.deepcopy(example)
+    receipt["_id"] = external_id
+    return receipt
+
+
+def test_bulk_creates_receipts_and_marks_duplicates(db, user, example_receipt):
+    receipts = [
+        _receipt(example_receipt, "a"),
+        _receipt(example_receipt, "b"),
+        _receipt(example_receipt, "a"),
+    ]
+
+    results = crud.create_receipts_bulk(db, receipts, user_id=user.id)
+
+    assert [r["status"] for r in results] == ["created", "created", "duplicate"]
+    assert results[2]["receipt_id"] == results[0]["receipt_id"]
+    count = db.execute(select(func.count(models.Receipt.id))).scalar()
+    assert count == 2
+
+
+def test_bulk_fails_only_invalid_header(db, user, example_receipt):
+    """Битый заголовок — failed для этого чека, остальные сохраняются"""
+    without_created_at = _receipt(example_receipt, "no-created-at")
+    del without_created_at["createdAt"]
+    without_prepaid = _receipt(example_receipt, "no-prepaid")
+    del without_prepaid["ticket"]["document"]["receipt"]["prepaidSum"]
+    bad_date = _receipt(example_receipt, "bad-date")
+    bad_date["ticket"]["document"]["receipt"]["dateTime"] = "yesterday"
+    receipts = [
+        without_created_at,
+        _receipt(example_receipt, "ok"),
+        without_prepaid,
+        bad_date,
+    ]
+
+    results = crud.create_receipts_bulk(db, receipts, user_id=user.id)
+
+    assert [r["status"] for r in results] == ["failed", "created", "failed", "failed"]
+    assert "createdAt" in results[0]["error"]
+    assert "prepaidSum" in results[2]["error"]
+    external_ids = db.execute(select(models.Receipt.external_id)).scalars().all()
+    assert external_ids == ["ok"]
+
+
+def test_upserts_lock_rows_in_key_order(db):
+    """Строки upsert уходят в порядке ключа независимо от порядка в пакете"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    shops = [
+        schemas.ShopCreate(legal_name=f"ООО {inn}", inn=inn)
+        for inn in ("7700000003", "7700000001", "7700000002")
+    ]
+    cashiers = [
+        schemas.CashierCreate(name=name) for name in ("Сидорова", "Иванова", "Петров")
+    ]
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        crud.upsert_shops(db, shops)
+        crud.upsert_cashiers(db, cashiers)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    def inserted(table: str, values: set) -> list:
+        """Значения values в параметрах INSERT (множественный INSERT — плоский)"""
+        for statement, parameters in statements:
+            if statement.startswith(f"INSERT INTO {table}"):
+                return [value for value in parameters if value in values]
+        raise AssertionError(f"no INSERT INTO {table}")
+
+    inns = {shop.inn for shop in shops}
+    names = {cashier.name for cashier in cashiers}
+    assert inserted("shops", inns) == sorted(inns)
+    assert inserted("cashiers", names) == sorted(names)
+
+
+def test_bulk_retries_with_stale_cached_shop_id(db, user, example_receipt):
+    """Магазин удален в другом процессе: ID из кеша сбрасывается, чек сохраняется"""
+
+    def enable_foreign_keys(connection):
+        connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+
+    inn = crud._shop_data(crud._get_ticket(example_receipt)).inn
+    cache.shop_ids.set(inn, 999_999)
+    event.listen(engine, "begin", enable_foreign_keys)
+    try:
+        results = crud.create_receipts_bulk(
+            db, [_receipt(example_receipt, "a")], user_id=user.id
+        )
+    finally:
+        event.remove(engine, "begin", enable_foreign_keys)
+        db.close()
+        engine.dispose()
+
+    assert results[0]["status"] == "created"
+    shop_id = db.execute(select(models.Shop.id).where(models.Shop.inn == inn)).scalar()
+    receipt = db.get(models.Receipt, results[0]["receipt_id"])
+    assert receipt.shop_id == shop_id
+    assert cache.shop_ids.get(inn) == shop_id
@@ -0,0 +1,117 @@
+import copy
+import io
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+from app import ingestion, models
+from app.database import SessionLocal
+
+from .conftest import EXAMPLES_DIR
+
+
+def _parse(data: bytes, chunk_size: int) -> list[dict]:
+    return list(ingestion.iter_receipts(io.BytesIO(data), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_chunk_boundaries_do_not_change_result(chunk_size):
+    data = (EXAMPLES_DIR / "r1_example.json").read_bytes()
+
+    assert _parse(data, chunk_size) == json.loads(data)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4])
+def test_multibyte_utf8_split_across_chunks(chunk_size):
+    receipts = [{"name": "Молоко 🥛"}, {"name": "Хлеб"}]
+    data = json.dumps(receipts, ensure_ascii=False).encode()
+
+    assert _parse(data, chunk_size) == receipts
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (b'\xef\xbb\xbf[{"a": 1}]', [{"a": 1}]),
+        (b' {"a": 1} \n', [{"a": 1}]),
+        (b"[]", []),
+        (b" [ ] ", []),
+        (b'[{"a": 1}, {"b": 2}]', [{"a": 1}, {"b": 2}]),
+    ],
+    ids=["bom", "single-object", "empty", "empty-spaces", "two"],
+)
+def test_document_shapes(data, expected):
+    for chunk_size in (1, 3, len(data)):
+        assert _parse(data, chunk_size) == expected
+
+
+def test_single_object_is_not_array():
+    parser = ingestion.ReceiptStreamParser()
+    assert parser.feed(b'{"a": 1}') == [{"a": 1}]
+    parser.close()
+    assert parser.is_array is False and parser.count == 1
+
+
+@pytest.mark.parametrize(
+    "data, message, pos",
+    [
+        (b'[{"a":1}]  x', "Extra data", 11),
+        (b'{"a":1} {"b":2}', "Extra data", 8),
+        (b'[{"a":1} {"b":2}]', "Expecting ',' delimiter", 9),
+        (b'[{"a":1},]', "Expecting value", 9),
+        (b'[{"a":1}', "Unexpected end of file", 8),
+        (b"", "Expecting value", 0),
+        (b'"text"', "Expecting '[' or '{'", 0),
+        (b'[{"a":1},\n {"b":}]', "Expecting value", 16),
+    ],
+)
+def test_errors_report_stable_file_position(data, message, pos):
+    """Позиция ошибки — от начала файла и не зависит от размера кусков"""
+    for chunk_size in (1, 2, 3, 5, len(data) or 1):
+        with pytest.raises(json.JSONDecodeError) as error:
+            _parse(data, chunk_size)
+        assert error.value.msg == message
+        assert error.value.pos == pos, chunk_size
+
+
+def test_error_line_and_column_span_chunks():
+    data = b'[\n  {"a": 1},\n  {"b": }\n]'
+    for chunk_size in (1, 4, len(data)):
+        with pytest.raises(json.JSONDecodeError) as error:
+            _parse(data, chunk_size)
+        assert (error.value.lineno, error.value.colno) == (3, 9)
+
+
+class _RecordingFile(io.BytesIO):
+    """Файл, который при каждом чтении запоминает число чеков в базе"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.counts: list[int] = []
+
+    def read(self, size=-1):
+        with SessionLocal() as db:
+            self.counts.append(db.scalar(select(func.count(models.Receipt.id))))
+        return super().read(size)
+
+
+def test_batches_are_committed_before_stream_ends(db, user, example_receipt):
+    receipts = []
+    for n in range(10):
+        receipt = copy.deepcopy(example_receipt)
+        receipt["_id"] = f"r{n}"
+        receipts.append(receipt)
+    f = _RecordingFile(json.dumps(receipts).encode())
+
+    index = 0
+    batches = ingestion.iter_batches(
+        ingestion.iter_receipts(f, chunk_size=256), batch_size=3
+    )
+    for batch in batches:
+        ingestion.ingest_batch(db, batch, user.id, index)
+        index += len(batch)
+
+    # Файл еще читался, когда в базе уже были первые пачки
+    assert {3, 6, 9} <= set(f.counts)
+    assert db.scalar(select(func.count(models.Receipt.id))) == 10
@@ -0,0 +1,120 @@
+import asyncio
+import copy
+import json
+import os
+
+import pytest
+
+from app import crud, jobs, schemas
+from app.database import SessionLocal
+
+from .fakes import FakeAsyncRedis
+
+
+def _write_receipts(tmp_path, example: dict, external_ids: list[str]) -> str:
+    receipts = []
+    for external_id in external_ids:
+        receipt = copy.deepcopy(example)
+        receipt["_id"] = external_id
+        receipts.append(receipt)
+    path = tmp_path / "receipts.json"
+    path.write_text(json.dumps(receipts), "utf-8")
+    return str(path)
+
+
+def _run_job(backend, user_id: int, path: str) -> jobs.Job:
+    async def run():
+        queue = jobs.JobQueue(backend, workers=1, batch_size=2)
+        await queue.start()
+        try:
+            job = await queue.submit(user_id, path, filename="receipts.json")
+            return await asyncio.wait_for(queue.wait(job.id, 0.01), 10)
+        finally:
+            await queue.stop()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("redis", [False, True], ids=["memory", "redis"])
+def test_job_ingests_file_in_batches(db, user, example_receipt, tmp_path, redis):
+    client = FakeAsyncRedis() if redis else None
+    backend = jobs.RedisJobBackend(client) if redis else jobs.InMemoryJobBackend()
+    path = _write_receipts(tmp_path, example_receipt, ["a", "b", "a", "c", "d"])
+
+    job = _run_job(backend, user.id, path)
+
+    assert job.status == "done", job.error
+    assert (job.processed, job.created, job.duplicates, job.failed) == (5, 4, 1, 0)
+    assert [r.index for r in job.results] == [0, 1, 2, 3, 4]
+    assert [r.status for r in job.results] == [
+        "created",
+        "created",
+        "duplicate",
+        "created",
+        "created",
+    ]
+    assert not os.path.exists(path)
+
+
+def test_job_survives_concurrent_upload_of_same_receipts(
+    db, user, example_receipt, tmp_path, monkeypatch
+):
+    """Гонка с параллельной загрузкой после проверки дубликатов не валит задачу"""
+    path = _write_receipts(tmp_path, example_receipt, ["a", "b", "c", "d", "e"])
+    create_receipts_bulk, upsert_shops = crud.create_receipts_bulk, crud.upsert_shops
+    batches, raced = [], []
+
+    def recording_create_receipts_bulk(session, batch, user_id):
+        batches.append([receipt["_id"] for receipt in batch])
+        return create_receipts_bulk(session, batch, user_id=user_id)
+
+    def racing_upsert_shops(session, shops):
+        # Во второй пачке чек "c" сохраняет другая загрузка — уже после
+        # проверки дубликатов, но до вставки
+        if len(batches) == 2 and not raced:
+            raced.append("c")
+            with SessionLocal() as other:
+                create_receipts_bulk(
+                    other, [{**example_receipt, "_id": "c"}], user_id=user.id
+                )
+        return upsert_shops(session, shops)
+
+    monkeypatch.setattr(crud, "create_receipts_bulk", recording_create_receipts_bulk)
+    monkeypatch.setattr(crud, "upsert_shops", racing_upsert_shops)
+
+    job = _run_job(jobs.InMemoryJobBackend(), user.id, path)
+
+    assert job.status == "done", job.error
+    assert batches == [["a", "b"], ["c", "d"], ["c", "d"], ["e"]]
+    assert (job.processed, job.created, job.duplicates, job.failed) == (5, 4, 1, 0)
+    assert [r.status for r in job.results] == [
+        "created",
+        "created",
+        "duplicate",
+        "created",
+        "created",
+    ]
+
+
+def test_redis_backend_appends_results_per_batch(db, user, example_receipt, tmp_path):
+    """Каждая пачка дописывает только свои результаты, а не весь список"""
+    client = FakeAsyncRedis()
+    path = _write_receipts(tmp_path, example_receipt, ["a", "b", "c", "d", "e"])
+
+    job = _run_job(jobs.RedisJobBackend(client), user.id, path)
+
+    results_key = f"ingest:results:{job.id}"
+    pushes = [call[2] for call in client.calls if call[:2] == ("rpush", results_key)]
+    assert pushes == [2, 2, 1]
+    stored = json.loads(client._values[f"ingest:job:{job.id}"])
+    assert "results" not in stored
+    assert len(job.results) == 5
+    assert all(isinstance(r, schemas.ReceiptUploadResult) for r in job.results)
+
+
+def test_memory_backend_refuses_several_workers(monkeypatch):
+    monkeypatch.setattr(jobs, "INGEST_QUEUE_BACKEND", "memory")
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+
+    with pytest.raises(RuntimeError, match="INGEST_QUEUE_BACKEND=redis"):
+        asyncio.run(jobs.JobQueue().start())
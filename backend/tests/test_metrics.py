@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import text
+
+from app import metrics
+from app.main import app
+
+
+def _samples(text: str) -> dict:
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+def test_metrics_endpoint_reports_routes_and_pool(schema):
+    with TestClient(app) as client:
+        client.get("/health")
+        client.get("/receipts/123")  # 401 до запросов к БД
+        client.get("/no-such-page")
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    samples = _samples(response.text)
+    count = "http_request_duration_seconds_count"
+    assert samples[
+        (count, (("method", "GET"), ("route", "/health"), ("status", "200")))
+    ]
+    assert (
+        count,
+        (("method", "GET"), ("route", "<unmatched>"), ("status", "404")),
+    ) in samples
+    # В обработке только сам запрос /metrics
+    assert samples[("http_requests_in_flight", ())] == 1
+    assert (
+        "db_pool_connections",
+        (("engine", "sync"), ("state", "checked_out")),
+    ) in samples
+
+
+def test_pool_events_count_checkouts(db):
+    def value(name: str) -> float:
+        return REGISTRY.get_sample_value(name, {"engine": "sync"}) or 0
+
+    checkouts = value("db_pool_checkouts_total")
+    waits = value("db_pool_checkout_wait_seconds_count")
+    db.execute(text("SELECT 1"))
+    db.commit()
+
+    assert value("db_pool_checkouts_total") == checkouts + 1
+    assert value("db_pool_checkout_wait_seconds_count") == waits + 1
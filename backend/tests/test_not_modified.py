@@ -0,0 +1,78 @@
+import copy
+
+import pytest
+
+from app import crud
+
+
+def _receipt(example: dict, external_id: str) -> dict:
+    receipt = copy.deepcopy(example)
+    receipt["_id"] = external_id
+    return receipt
+
+
+@pytest.fixture
+def receipt_ids(db, user, example_receipt) -> list[int]:
+    receipts = [_receipt(example_receipt, "a"), _receipt(example_receipt, "b")]
+    results = crud.create_receipts_bulk(db, receipts, user_id=user.id)
+    return [result["receipt_id"] for result in results]
+
+
+def _etag(api, path: str = "/receipts/") -> str:
+    response = api.get(path)
+    assert response.status_code == 200, response.text
+    return response.headers["ETag"]
+
+
+@pytest.mark.parametrize("path", ["/receipts/", "/stores/", "/analytics/total-sums"])
+def test_matching_etag_returns_304(api, receipt_ids, path):
+    etag = _etag(api, path)
+
+    response = api.get(path, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.content
+
+
+def test_etag_matches_weakly_and_in_list(api, receipt_ids):
+    etag = _etag(api)
+    strong = etag.removeprefix("W/")
+
+    for header in (strong, f'"other", {etag}'):
+        response = api.get("/receipts/", headers={"If-None-Match": header})
+        assert response.status_code == 304
+
+
+def test_etag_changes_after_receipt_delete(api, receipt_ids):
+    etag = _etag(api)
+
+    assert api.delete(f"/receipts/{receipt_ids[0]}").status_code == 200
+
+    response = api.get("/receipts/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [receipt["id"] for receipt in response.json()] == receipt_ids[1:]
+
+
+def test_etag_changes_after_ingest(api, db, user, example_receipt, receipt_ids):
+    etag = _etag(api)
+
+    crud.create_receipts_bulk(db, [_receipt(example_receipt, "c")], user_id=user.id)
+
+    response = api.get("/receipts/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 3
+
+
+def test_etag_changes_after_shop_update(api, receipt_ids):
+    etag = _etag(api, "/stores/")
+    shop_id = api.get("/stores/").json()[0]["id"]
+
+    response = api.put(f"/stores/{shop_id}", json={"notes": "у дома"})
+    assert response.status_code == 200
+
+    response = api.get("/stores/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,100 @@
+import copy
+
+import pytest
+
+from app import crud, pagination, services
+
+
+def _receipt(example: dict, external_id: str, **fields) -> dict:
+    receipt = copy.deepcopy(example)
+    receipt["_id"] = external_id
+    receipt["ticket"]["document"]["receipt"].update(fields)
+    return receipt
+
+
+@pytest.fixture
+def receipts(db, user, example_receipt):
+    """Чеки с совпадающими датами и магазины с совпадающими суммами и названиями"""
+    dates = ["2026-01-17T17:34:00"] * 3 + ["2026-01-18T10:00:00"] * 2
+    dates += ["2025-12-31T23:59:00", "2026-01-05T08:00:00"]
+    shops = [
+        ("7700000001", "Магнит", 10000),
+        ("7700000002", "Пятерочка", 10000),
+        ("7700000003", "Магнит", 25000),
+        ("7700000004", "Лента", 5000),
+        ("7700000002", "Пятерочка", 15000),
+        ("7700000005", "Пятерочка", 25000),
+        ("7700000006", "Азбука вкуса", 25000),
+    ]
+    data = [
+        _receipt(
+            example_receipt,
+            f"r{n}",
+            dateTime=date_time,
+            userInn=inn,
+            retailPlace=name,
+            totalSum=total,
+        )
+        for n, (date_time, (inn, name, total)) in enumerate(zip(dates, shops))
+    ]
+    crud.create_receipts_bulk(db, data, user_id=user.id)
+
+
+def _walk(api, path: str, **params) -> list[dict]:
+    """Все страницы списка по курсорам из X-Next-Cursor"""
+    items, cursor = [], None
+    while True:
+        query = dict(params, limit=2)
+        if cursor is not None:
+            query["cursor"] = cursor
+        response = api.get(path, params=query)
+        assert response.status_code == 200, response.text
+        items.extend(response.json())
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return items
+
+
+def test_receipt_pages_match_unpaged_list(api, receipts):
+    unpaged = api.get("/receipts/", params={"limit": 500}).json()
+
+    assert len(unpaged) == 7
+    for view in ("full", "summary"):
+        expected = api.get("/receipts/", params={"limit": 500, "view": view}).json()
+        assert _walk(api, "/receipts/", view=view) == expected
+
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("sort_by", list(services.STORE_SORT_TYPES))
+def test_store_pages_match_unpaged_list(api, receipts, sort_by, descending):
+    params = {"sort_by": sort_by, "descending": descending}
+    unpaged = api.get("/stores/", params={**params, "limit": 500}).json()
+
+    assert len(unpaged) == 6
+    assert _walk(api, "/stores/", **params) == unpaged
+
+
+@pytest.mark.parametrize("path", ["/receipts/", "/stores/"])
+@pytest.mark.parametrize(
+    "cursor",
+    ["not-base64!", pagination.encode_cursor("x"), pagination.encode_cursor(1, 2, 3)],
+    ids=["garbage", "short", "long"],
+)
+def test_malformed_cursor_is_rejected(api, receipts, path, cursor):
+    response = api.get(path, params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize(
+    "replay", [{"sort_by": "receipts_count"}, {"descending": False}]
+)
+def test_store_cursor_is_bound_to_its_sort(api, receipts, replay):
+    params = {"sort_by": "total_amount", "descending": True, "limit": 2}
+    cursor = api.get("/stores/", params=params).headers[pagination.NEXT_CURSOR_HEADER]
+
+    response = api.get("/stores/", params={**params, **replay, "cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app import models, profiler
+
+SECRET = "secret-password-hash"
+
+
+@pytest.fixture
+def slow_log(tmp_path):
+    """Журнал всех запросов (порог 0) в JSONL-файл"""
+    path = tmp_path / "slow.jsonl"
+    settings = dict(profiler._settings)
+    profiler.enable(threshold_ms=0, log_file=str(path), explain=True)
+    yield path
+    profiler.disable()
+    profiler.flush()
+    profiler._settings.update(settings)
+
+
+def _records(path) -> list[dict]:
+    profiler.flush()
+    return [json.loads(line) for line in path.read_text("utf-8").splitlines()]
+
+
+def test_sensitive_parameters_are_redacted(db, slow_log):
+    db.add(models.User(email="user@example.com", password_hash=SECRET))
+    db.commit()
+    db.execute(select(models.User.id).where(models.User.password_hash == SECRET))
+    db.execute(
+        select(models.User.id).where(
+            models.User.id.in_([1, 2, 3]), models.User.password_hash == SECRET
+        )
+    )
+
+    records = _records(slow_log)
+
+    assert SECRET not in slow_log.read_text("utf-8")
+    insert = next(r for r in records if r["statement"].startswith("INSERT"))
+    assert "user@example.com" in insert["parameters"]
+    assert profiler.REDACTED in insert["parameters"]
+    lookups = [r for r in records if "password_hash =" in r["statement"]]
+    assert [r["parameters"] for r in lookups] == [[profiler.REDACTED], "***"]
+    assert all(r["plan"] is None for r in lookups)
+
+
+def test_other_parameters_and_plans_are_kept(db, user, slow_log):
+    db.execute(select(models.User.id).where(models.User.email == user.email))
+
+    [record] = [r for r in _records(slow_log) if "users.email =" in r["statement"]]
+
+    assert record["parameters"] == [user.email]
+    assert record["plan"]
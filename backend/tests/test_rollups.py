@@ -0,0 +1,152 @@
+import copy
+import json
+
+import pytest
+from sqlalchemy import extract, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import crud, models, rollups
+
+from .conftest import EXAMPLES_DIR
+
+
+def _examples() -> list[dict]:
+    """Чеки из r_example и их копии месяцем раньше: по два визита в каждый магазин"""
+    receipts = []
+    for path in sorted(EXAMPLES_DIR.glob("*.json")):
+        data = json.loads(path.read_text("utf-8"))
+        receipts.extend(data if isinstance(data, list) else [data])
+    for receipt in list(receipts):
+        earlier = copy.deepcopy(receipt)
+        document = earlier["ticket"]["document"]["receipt"]
+        document["dateTime"] = document["dateTime"].replace("2026-01", "2025-12")
+        receipts.append(earlier)
+    return receipts
+
+
+def _monthly_from_receipts(db) -> set[tuple]:
+    Receipt = models.Receipt
+    year = extract("year", Receipt.date_time)
+    month = extract("month", Receipt.date_time)
+    rows = db.execute(
+        select(
+            Receipt.user_id,
+            year,
+            month,
+            func.count(Receipt.id),
+            *(func.sum(getattr(Receipt, f)) for f in rollups.SUM_FIELDS),
+        ).group_by(Receipt.user_id, year, month)
+    ).all()
+    return {(user_id, int(y), int(m), *rest) for user_id, y, m, *rest in rows}
+
+
+def _monthly_rollup(db) -> set[tuple]:
+    MonthlySpending = models.MonthlySpending
+    rows = db.execute(
+        select(
+            MonthlySpending.user_id,
+            MonthlySpending.year,
+            MonthlySpending.month,
+            MonthlySpending.receipts_count,
+            *(getattr(MonthlySpending, f) for f in rollups.SUM_FIELDS),
+        ).where(MonthlySpending.receipts_count > 0)
+    ).all()
+    return set(map(tuple, rows))
+
+
+def _shops_from_receipts(db) -> set[tuple]:
+    Receipt = models.Receipt
+    rows = db.execute(
+        select(
+            Receipt.user_id,
+            Receipt.shop_id,
+            func.sum(Receipt.total_sum),
+            func.count(Receipt.id),
+            func.min(Receipt.date_time),
+            func.max(Receipt.date_time),
+        )
+        .where(Receipt.shop_id.is_not(None))
+        .group_by(Receipt.user_id, Receipt.shop_id)
+    ).all()
+    return set(map(tuple, rows))
+
+
+def _shop_rollup(db) -> set[tuple]:
+    ShopSpending = models.ShopSpending
+    rows = db.execute(
+        select(
+            ShopSpending.user_id,
+            ShopSpending.shop_id,
+            ShopSpending.total_amount,
+            ShopSpending.receipts_count,
+            ShopSpending.first_visit,
+            ShopSpending.last_visit,
+        ).where(ShopSpending.receipts_count > 0)
+    ).all()
+    return set(map(tuple, rows))
+
+
+def _assert_rollups_match(db):
+    db.expire_all()
+    assert _monthly_rollup(db) == _monthly_from_receipts(db)
+    assert _shop_rollup(db) == _shops_from_receipts(db)
+
+
+@pytest.fixture
+def ingested(db, user) -> models.User:
+    """Все чеки из r_example у двух пользователей, пачками по несколько штук"""
+    other = models.User(email="other@example.com", password_hash="-")
+    db.add(other)
+    db.commit()
+
+    examples = _examples()
+    for owner in (user, other):
+        receipts = [
+            dict(receipt, _id=f"{owner.id}-{n}") for n, receipt in enumerate(examples)
+        ]
+        for start in range(0, len(receipts), 3):
+            crud.create_receipts_bulk(db, receipts[start : start + 3], user_id=owner.id)
+    return user
+
+
+def test_rollups_match_receipts_after_bulk_ingest(db, ingested):
+    assert db.scalar(select(func.count(models.Receipt.id))) > 0
+    _assert_rollups_match(db)
+
+
+def test_rollups_match_receipts_after_receipt_delete(db, ingested):
+    # Самый ранний визит в магазин, где есть и другой: пересчитывается first_visit
+    receipt = db.execute(
+        select(models.Receipt)
+        .where(models.Receipt.user_id == ingested.id)
+        .order_by(models.Receipt.date_time)
+        .limit(1)
+    ).scalar_one()
+
+    assert crud.delete_receipt(db, receipt.id, user_id=ingested.id)
+
+    _assert_rollups_match(db)
+
+
+def test_rollups_match_receipts_after_shop_delete(db, ingested):
+    manual_shop = crud.create_manual_shop(db, {"name": "Рынок"})
+
+    assert crud.delete_shop(db, manual_shop.id)
+
+    _assert_rollups_match(db)
+
+
+def test_shop_with_receipts_is_not_deleted_from_rollups(db, ingested):
+    """Магазин с чеками удалить нельзя — и его агрегаты остаются на месте"""
+    shop_id = db.scalar(select(models.Receipt.shop_id).limit(1))
+
+    with pytest.raises(IntegrityError):
+        crud.delete_shop(db, shop_id)
+    db.rollback()
+
+    _assert_rollups_match(db)
+    assert db.scalar(
+        select(func.count())
+        .select_from(models.ShopSpending)
+        .where(models.ShopSpending.shop_id == shop_id)
+    )
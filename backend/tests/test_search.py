@@ -0,0 +1,41 @@
+import copy
+
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql
+
+from app import crud, models, search
+
+
+def _receipt_in_shop(db, user, example_receipt, retail_name: str):
+    receipt = copy.deepcopy(example_receipt)
+    [result] = crud.create_receipts_bulk(db, [receipt], user_id=user.id)
+    db.execute(
+        update(models.Shop)
+        .where(models.Shop.id == models.Receipt.shop_id)
+        .where(models.Receipt.id == result["receipt_id"])
+        .values(retail_name=retail_name)
+    )
+    db.commit()
+
+
+def test_shop_name_match_ignores_cyrillic_case(db, user, example_receipt):
+    _receipt_in_shop(db, user, example_receipt, "ВкусВилл")
+
+    items = search.search_items(db, user.id, "вкусвилл")
+
+    assert items and {item.shop_name for item in items} == {"ВкусВилл"}
+
+
+def test_shop_name_match_is_literal(db, user, example_receipt):
+    _receipt_in_shop(db, user, example_receipt, "ВкусВилл")
+
+    assert search.search_items(db, user.id, "%") == []
+    assert search.search_items(db, user.id, "_") == []
+
+
+def test_postgres_shop_pattern_is_escaped(db):
+    query = search._shop_matches(db, "postgresql", 1, "50%_off")
+
+    compiled = query.compile(dialect=postgresql.dialect())
+    assert "ESCAPE" in str(compiled)
+    assert list(compiled.params.values()) == ["%50\\%\\_off%"]
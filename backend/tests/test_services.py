@@ -0,0 +1,22 @@
+import copy
+
+from app import crud, services
+
+
+def test_top_products_split_by_item_measure(db, user, example_receipt):
+    """Один товар в штуках и на вес — две строки, количества не складываются"""
+    by_piece = copy.deepcopy(example_receipt)
+    by_piece["_id"] = "by-piece"
+    by_weight = copy.deepcopy(example_receipt)
+    by_weight["_id"] = "by-weight"
+    item = by_weight["ticket"]["document"]["receipt"]["items"][0]
+    item["quantity"] = 0.5
+    crud.create_receipts_bulk(db, [by_piece, by_weight], user_id=user.id)
+
+    name = item["name"]
+    top = [row for row in services.get_top_products(db, user.id) if row.name == name]
+
+    assert sorted((row.measure, row.total_quantity) for row in top) == [
+        ("кг", 0.5),
+        ("шт", 1),
+    ]
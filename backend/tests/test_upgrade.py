@@ -0,0 +1,143 @@
+import io
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func, inspect, select
+
+from app import crud, models, search, upgrade
+from app.database import engine
+
+_DROPPED = (
+    "uq_shops_inn",
+    "uq_cashiers_inn",
+    "uq_cashiers_name",
+    "ix_users_telegram_id",
+)
+
+
+def _degrade(connection):
+    """
+    Схема как на базе до индексов: без уникальных и поисковых индексов
+    и со старым индексом чеков
+    """
+    for name in (*_DROPPED, "ix_receipts_user_date"):
+        connection.exec_driver_sql(f"DROP INDEX {name}")
+    connection.exec_driver_sql(
+        "CREATE INDEX ix_receipts_user_date ON receipts (user_id, date_time)"
+    )
+    for suffix in ("ai", "ad", "au"):
+        connection.exec_driver_sql(f"DROP TRIGGER {search.FTS_TABLE}_{suffix}")
+    connection.exec_driver_sql(f"DROP TABLE {search.FTS_TABLE}")
+
+
+def _indexes(table: str) -> dict:
+    return {
+        index["name"]: index["column_names"]
+        for index in inspect(engine).get_indexes(table)
+    }
+
+
+def _add_duplicates(db, receipt: models.Receipt) -> tuple[models.Shop, models.Cashier]:
+    """Дубликаты магазина чека и кассиров; чек переводится на копии"""
+    shop = receipt.shop
+    shop_copy = models.Shop(legal_name=shop.legal_name, inn=shop.inn)
+    cashier = models.Cashier(name="Иванова", inn="123456789012")
+    cashier_copy = models.Cashier(name="Иванова А.", inn="123456789012")
+    unnamed = [models.Cashier(name="Кассир"), models.Cashier(name="Кассир")]
+    db.add_all([shop_copy, cashier, cashier_copy, *unnamed])
+    db.flush()
+    receipt.shop_id, receipt.cashier_id = shop_copy.id, cashier_copy.id
+    db.commit()
+    return shop, cashier
+
+
+def _alembic_config(**kwargs):
+    from alembic.config import Config
+
+    # Без файла alembic.ini: его настройки логирования перенастроили бы pytest
+    config = Config(**kwargs)
+    config.set_main_option(
+        "script_location", str(Path(__file__).resolve().parents[1] / "migrations")
+    )
+    return config
+
+
+@pytest.fixture
+def alembic_config(schema):
+    yield _alembic_config()
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE IF EXISTS alembic_version")
+
+
+def test_merge_duplicates(db, user, example_receipt):
+    results = crud.create_receipts_bulk(db, [example_receipt], user_id=user.id)
+    receipt = db.get(models.Receipt, results[0]["receipt_id"])
+    with engine.begin() as connection:
+        _degrade(connection)
+    shop, cashier = _add_duplicates(db, receipt)
+
+    with engine.begin() as connection:
+        result = upgrade.merge_duplicates(connection)
+
+    assert result == {"merged_shops": 1, "merged_cashiers": 2}
+    db.expire_all()
+    assert (receipt.shop_id, receipt.cashier_id) == (shop.id, cashier.id)
+    spending = db.execute(select(models.ShopSpending)).scalars().all()
+    assert [(s.shop_id, s.receipts_count) for s in spending] == [(shop.id, 1)]
+
+    # Повторный запуск ничего не меняет
+    with engine.begin() as connection:
+        again = upgrade.merge_duplicates(connection)
+    assert again == {"merged_shops": 0, "merged_cashiers": 0}
+
+
+def test_stamped_database_is_repaired_by_migrations(
+    db, user, example_receipt, alembic_config
+):
+    """python -m app.upgrade, alembic stamp 0001 && alembic upgrade head"""
+    from alembic import command
+
+    results = crud.create_receipts_bulk(db, [example_receipt], user_id=user.id)
+    receipt = db.get(models.Receipt, results[0]["receipt_id"])
+    with engine.begin() as connection:
+        _degrade(connection)
+    _add_duplicates(db, receipt)
+
+    command.stamp(alembic_config, "0001")
+    # Дубликаты не объединены — ревизия 0002 объясняет, что запустить
+    with pytest.raises(RuntimeError, match="python -m app.upgrade"):
+        command.upgrade(alembic_config, "head")
+
+    with engine.begin() as connection:
+        upgrade.merge_duplicates(connection)
+    command.upgrade(alembic_config, "head")
+
+    for name in _DROPPED:
+        assert name in {
+            **_indexes("shops"),
+            **_indexes("cashiers"),
+            **_indexes("users"),
+        }
+    assert _indexes("receipts")["ix_receipts_user_date"] == [
+        "user_id",
+        "date_time",
+        "id",
+    ]
+    # Поисковый индекс заполнен уже загруженными товарами
+    assert search.search_items(db, user.id, "яблоки")
+    # Загрузка снова работает
+    example_receipt["_id"] = "after-upgrade"
+    crud.create_receipt_full(db, example_receipt, user.id)
+    assert db.execute(select(func.count(models.Shop.id))).scalar() == 1
+
+
+def test_migrations_render_offline():
+    """alembic upgrade head --sql: SQL без подключения к базе"""
+    from alembic import command
+
+    output = io.StringIO()
+    command.upgrade(_alembic_config(output_buffer=output), "head", sql=True)
+
+    sql = output.getvalue()
+    assert "CREATE UNIQUE INDEX IF NOT EXISTS uq_shops_inn" in sql
+    assert "UPDATE alembic_version SET version_num='0002'" in sql
@@ -1,5 +1,5 @@
 import { useState, useEffect, useCallback } from "react";
-import { analyticsAPI, receiptsAPI } from "../services/api";
+import { analyticsAPI } from "../services/api";
 import { kopecksToRubles } from "../utils/format";
 
 export const useDashboardData = () => {
@@ -17,25 +17,13 @@ export const useDashboardData = () => {
 
   const fetchDashboardData = useCallback(async () => {
     try {
-      // Используем total-sums для общей статистики и monthly-dynamics для месячной
-      const [totalSumsRes, monthlyStatsRes, receiptsRes] =
-        await Promise.allSettled([
-          analyticsAPI.getTotalSums(),
-          analyticsAPI.getMonthlyDynamics(new Date().getFullYear()),
-          receiptsAPI.getReceipts(0, 50),
-        ]);
+      // Итоги, текущий месяц и последние чеки — одним запросом
+      const { data: dashboard } = await analyticsAPI.getDashboard(50);
+      const totalSums = dashboard.totals;
+      const currentMonthData = dashboard.current_month;
+      const receipts = dashboard.recent_receipts;
 
-      const totalSums =
-        totalSumsRes.status === "fulfilled" ? totalSumsRes.value?.data : null;
-      const monthlyStats =
-        monthlyStatsRes.status === "fulfilled"
-          ? monthlyStatsRes.value?.data
-          : null;
-      const receipts =
-        receiptsRes.status === "fulfilled" ? receiptsRes.value?.data : [];
-
-      console.log("Dashboard - Total sums:", totalSums);
-      console.log("Dashboard - Monthly stats:", monthlyStats);
+      console.log("Dashboard:", dashboard);
 
       // Обрабатываем общую статистику
       let processedStats = {
@@ -46,24 +34,15 @@ export const useDashboardData = () => {
         month: "все время",
       };
 
-      // Если хотим показывать статистику за текущий месяц, а не общую
-      if (monthlyStats && Array.isArray(monthlyStats)) {
-        const currentMonth = new Date().getMonth() + 1;
-        const currentMonthData = monthlyStats.find(
-          (item) => item.month === currentMonth,
-        );
-
-        if (currentMonthData) {
-          processedStats = {
-            receipts_count: currentMonthData.receipts_count || 0,
-            total_sum_rub: kopecksToRubles(currentMonthData.total_sum || 0),
-            cash_sum_rub: kopecksToRubles(currentMonthData.cash_total_sum || 0),
-            ecash_sum_rub: kopecksToRubles(
-              currentMonthData.ecash_total_sum || 0,
-            ),
-            month: `${new Date().getFullYear()}-${String(currentMonth).padStart(2, "0")}`,
-          };
-        }
+      // Если в текущем месяце есть чеки, показываем статистику за него
+      if (currentMonthData?.receipts_count) {
+        processedStats = {
+          receipts_count: currentMonthData.receipts_count || 0,
+          total_sum_rub: kopecksToRubles(currentMonthData.total_sum || 0),
+          cash_sum_rub: kopecksToRubles(currentMonthData.cash_total_sum || 0),
+          ecash_sum_rub: kopecksToRubles(currentMonthData.ecash_total_sum || 0),
+          month: `${dashboard.year}-${String(currentMonthData.month).padStart(2, "0")}`,
+        };
       }
 
       setData((prev) => ({
@@ -77,10 +56,10 @@ export const useDashboardData = () => {
             ...receipt,
             total_sum_rub: kopecksToRubles(receipt.total_sum || 0),
             cash_total_sum: kopecksToRubles(receipt.cash_total_sum || 0),
-            shop_name: receipt.shop?.retail_name || "Неизвестный магазин",
-            shop_chain: receipt.shop?.legal_name || "",
-            cashier_name: receipt.cashier?.name || "",
-            items_count: receipt.items?.length || 0,
+            shop_name: receipt.shop_name || "Неизвестный магазин",
+            shop_chain: receipt.shop_legal_name || "",
+            cashier_name: receipt.cashier_name || "",
+            items_count: receipt.items_count || 0,
             date_time: receipt.date_time || new Date().toISOString(),
             id: receipt.id || receipt.external_id || Math.random().toString(),
           }))
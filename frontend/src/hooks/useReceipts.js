@@ -2,6 +2,8 @@ import { useState, useEffect, useCallback } from "react";
 import { receiptsAPI } from "../services/api";
 import { kopecksToRubles } from "../utils/format";
 
+const JOB_POLL_INTERVAL = 1000; // мс между проверками статуса загрузки
+
 export const useReceipts = () => {
   const [receipts, setReceipts] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -50,13 +52,24 @@ export const useReceipts = () => {
     setError(null);
 
     try {
-      await receiptsAPI.uploadReceipt(file);
+      const response = await receiptsAPI.uploadReceipt(file);
+
+      // Файл разбирается в фоне — ждем завершения задачи
+      let job = response.data;
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL));
+        job = (await receiptsAPI.getUploadJob(job.id)).data;
+      }
+      if (job.status === "failed") {
+        throw new Error(job.error || "Ошибка при загрузке файла");
+      }
+
       await fetchReceipts(); // Обновляем список после загрузки
-      return { success: true };
+      return { success: true, job };
     } catch (err) {
       console.error("Upload error:", err);
       const errorMessage =
-        err.response?.data?.detail || "Ошибка при загрузке файла";
+        err.response?.data?.detail || err.message || "Ошибка при загрузке файла";
       setError(errorMessage);
       return { success: false, error: errorMessage };
     } finally {
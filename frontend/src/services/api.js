@@ -64,8 +64,10 @@ export const userAPI = {
 };
 
 export const receiptsAPI = {
-  getReceipts: (skip = 0, limit = 100) =>
-    api.get("/receipts", { params: { skip, limit } }),
+  // cursor — заголовок X-Next-Cursor предыдущего ответа (следующая страница)
+  // view: "summary" — чеки без позиций, с shop_name и items_count
+  getReceipts: (skip = 0, limit = 100, cursor = undefined, view = undefined) =>
+    api.get("/receipts", { params: { skip, limit, cursor, view } }),
   uploadReceipt: (file) => {
     const formData = new FormData();
     formData.append("file", file);
@@ -73,10 +75,18 @@ export const receiptsAPI = {
       headers: { "Content-Type": "multipart/form-data" },
     });
   },
+  // Статус фоновой загрузки файла
+  getUploadJob: (jobId) => api.get(`/receipts/jobs/${jobId}`),
   createReceipt: (receiptData) => api.post("/receipts/", receiptData),
 };
 
 export const analyticsAPI = {
+  // Все данные главной страницы одним запросом
+  getDashboard: (receiptsLimit = 50) =>
+    api.get("/analytics/dashboard", {
+      params: { receipts_limit: receiptsLimit },
+    }),
+
   // Общая статистика за всё время
   getTotalSums: () => api.get("/analytics/total-sums"),
 
@@ -106,9 +116,9 @@ export const analyticsAPI = {
 };
 
 export const storesAPI = {
-  getStores: ({ page, page_size, sort_by, descending }) =>
+  getStores: ({ page, page_size, sort_by, descending, cursor }) =>
     api.get("/stores/", {
-      params: { page, page_size, sort_by, descending },
+      params: { page, page_size, sort_by, descending, cursor },
     }),
 
   getStoreStats: () => api.get("/stores/stats"),